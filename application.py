@@ -1,10 +1,23 @@
-from flask import Flask, render_template, request, redirect, url_for
+from flask import Flask, render_template, request, redirect, url_for, jsonify, g, has_request_context, before_render_template, template_rendered, \
+    send_from_directory
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.inspection import inspect
-from src.configure_db import Top_Ten_Beers, User_Combinations, User_Predictions
-import pandas as pd
+from src.configure_db import Top_Ten_Beers, User_Combinations, User_Predictions, fetch_columns, replace_user_rows
+from src.recommendation_index import records_to_dicts, build_pair_index, pair_key, lookup_many, parse_selection
+from src.similarity_model import load_similarity_models, score_selection, score_selections, item_rows
+from src.prediction_cache import PredictionCache
+from src.model_store import ModelStore, latest_version
+from src.metrics import Histogram, COUNT_BUCKETS, render
+from src.render_static import static_page_path, static_version_dir
+from werkzeug.security import safe_join
+from werkzeug.exceptions import NotFound
+from collections import defaultdict
+from functools import partial
+import sqlalchemy as sql
+import urllib.parse
 import traceback
 import logging
+import time
+import os
 
 logging.basicConfig(level=logging.DEBUG, format='%(name)s - %(levelname)s - %(asctime)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -15,16 +28,202 @@ app.config.from_pyfile('flask_config.py')
 
 db = SQLAlchemy(app)
 
-beertype = ''
+beercolumns = ['Pkey', 'Beer_ID', 'Beer_Name', 'ABV', 'Type', 'Style', 'Brewery']
+apicolumns = ['Beer_ID', 'Beer_Name', 'ABV', 'Style', 'Brewery', 'score']
+onlineseparator = ':'  # joins the type and beers of a selection into the ID its recommendations are written through under
 
-def query_to_list(rset):
-    """Converts SQLAlchemy query to list"""
-    result = []
-    for obj in rset:
-        instance = inspect(obj)
-        items = instance.attrs.items()
-        result.append([x.value for _,x in items])
-    return instance.attrs.keys(), result
+request_latency = Histogram('beerapp_request_latency_seconds', 'Time to handle a request.', ('route', 'method', 'status'))
+request_queries = Histogram('beerapp_request_db_queries', 'DB queries run while handling a request.', ('route',), COUNT_BUCKETS)
+request_db_time = Histogram('beerapp_request_db_seconds', 'Time spent in DB queries while handling a request.', ('route',))
+template_render_time = Histogram('beerapp_template_render_seconds', 'Time to render a template.', ('template',))
+index_build_time = Histogram('beerapp_index_build_seconds', 'Time to turn fetched rows into the recommendation index.')
+
+def load_recommendations():
+    """Loads the pair-to-recommendation index from the DB.
+    Returns:
+        pair_index {dict} -- dictionary of pair key: list of ranked prediction rows
+    """
+    with app.app_context():
+        combinationrows = records_to_dicts(*fetch_columns(db.session, User_Combinations, ['Type', 'ID', 'Beer_ID']))
+        predrows = records_to_dicts(*fetch_columns(db.session, User_Predictions, beercolumns + ['score', 'ID']))
+        db.session.remove()
+    for row in predrows: #pseudo-user IDs never hold the separator of selections written through by persist_selection
+        row['source'] = 'online' if onlineseparator in row['ID'] else 'precomputed'
+    with index_build_time.time():
+        pair_index = build_pair_index(combinationrows, predrows)
+    logger.info("Loaded recommendation index with %d beer pairs", len(pair_index))
+    return pair_index
+
+def compute_selections(similarity_models, keys):
+    """Scores selections missing from the precomputed index against the similarity models, one call per type.
+    Returns:
+        results {list} -- ranked recommendation rows for each key, in order, or None if a key cannot be scored
+    """
+    bytype = defaultdict(list)
+    for position, key in enumerate(keys):
+        if key[0] in similarity_models:
+            bytype[key[0]].append(position)
+    results = [None] * len(keys)
+    for beertype, positions in bytype.items():
+        model = similarity_models[beertype]
+        try:
+            scored = score_selections(model, [list(keys[p][1:]) for p in positions], app.config['NUM_RECOMMENDATIONS'])
+        except ValueError: #some selection has unknown beers, score one at a time
+            scored = []
+            for p in positions:
+                try:
+                    scored.append(score_selection(model, list(keys[p][1:]), app.config['NUM_RECOMMENDATIONS']))
+                except ValueError:
+                    scored.append(None)
+        for p, preds in zip(positions, scored):
+            results[p] = [dict(row, source='online') for row in preds] if preds is not None else None
+    logger.debug("Scored %d selections online", len(keys))
+    return results
+
+def persist_selection(similarity_models, key, preds):
+    """Writes recommendations computed on demand through to the user_combinations and user_predictions tables,
+    so they are part of the precomputed index the next time it is loaded. Rows already written for the selection are
+    replaced, so app processes persisting the same selection do not duplicate them."""
+    beertype, beer_ids = key[0], list(key[1:])
+    user_id = beertype + onlineseparator + '-'.join(str(i) for i in beer_ids)
+    combinations = [User_Combinations(ID=user_id, **dict(row, Type=beertype)) for row in item_rows(similarity_models[beertype], beer_ids)]
+    predictions = [User_Predictions(ID=user_id, **{name: row[name] for name in apicolumns}, Type=beertype) for row in preds]
+    replace_user_rows(db.session, user_id, combinations, predictions)
+    logger.debug("Persisted recommendations for %s", user_id)
+
+def model_version():
+    """Finds the version of recommendations to serve: the latest similarity model version and the last top ten row
+    written by configure_db.py, which replaces the tables with every load of new predictions and gives the new rows
+    keys above the old ones."""
+    with app.app_context():
+        last_top10 = db.session.query(sql.func.max(Top_Ten_Beers.Pkey)).scalar()
+        db.session.remove()
+    return latest_version(similarity_dir), last_top10
+
+def load_artifact(version):
+    """Builds everything the app serves recommendations from for one version: the precomputed pair index, the
+    similarity models joined with the item tables saved with them, and a prediction cache of its own.
+    Returns:
+        artifact {dict} -- dictionary with pair_index, similarity_models and prediction_cache
+    """
+    simversion = version[0]
+    similarity_models = load_similarity_models(similarity_dir if simversion is None else os.path.join(similarity_dir, simversion))
+    if app.config['LAZY_PREDICTIONS']:
+        persist = partial(persist_selection, similarity_models) if app.config['PREDICTION_WRITE_THROUGH'] else None
+        prediction_cache = PredictionCache(partial(compute_selections, similarity_models), app.config['PREDICTION_CACHE_SIZE'], persist)
+    else:
+        prediction_cache = None
+    return {'pair_index': load_recommendations(), 'similarity_models': similarity_models, 'prediction_cache': prediction_cache}
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    """Starts timing a DB query"""
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    """Adds a finished DB query to the totals of the request that ran it"""
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    if has_request_context() and 'db_queries' in g:
+        g.db_queries += 1
+        g.db_time += elapsed
+
+def before_template(sender, template, context, **extra):
+    """Starts timing a template render"""
+    if has_request_context():
+        g.render_start = time.perf_counter()
+
+def after_template(sender, template, context, **extra):
+    """Records the time taken to render a template"""
+    if has_request_context() and 'render_start' in g:
+        template_render_time.observe(time.perf_counter() - g.render_start, template=template.name)
+
+with app.app_context():
+    sql.event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    sql.event.listen(db.engine, 'after_cursor_execute', after_cursor_execute)
+before_render_template.connect(before_template, app)
+template_rendered.connect(after_template, app)
+
+@app.before_request
+def start_request_metrics():
+    """Starts timing a request and counting its DB queries"""
+    g.request_start = time.perf_counter()
+    g.db_queries = 0
+    g.db_time = 0.0
+
+@app.after_request
+def record_request_metrics(response):
+    """Records the latency, DB query count and DB time of a request"""
+    if 'request_start' in g:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        request_latency.observe(time.perf_counter() - g.request_start, route=route, method=request.method, status=response.status_code)
+        request_queries.observe(g.db_queries, route=route)
+        request_db_time.observe(g.db_time, route=route)
+    return response
+
+similarity_dir = os.path.join(app.root_path, app.config['SIMILARITY_MODEL_DIR'])
+model_store = ModelStore(load_artifact, model_version, app.config['MODEL_RELOAD_INTERVAL']).start()
+
+def recommend_many(artifact, selections):
+    """Finds ranked recommendations for many selections. Precomputed pairs come from the index, any other selection
+    is scored online against its type's similarity model, through the prediction cache if it is enabled.
+    Returns:
+        results {list} -- ranked recommendation rows for each selection, in order, or None if a selection cannot be scored
+    """
+    results = lookup_many(artifact['pair_index'], selections)
+    misses = [position for position, preds in enumerate(results) if preds is None]
+    if misses:
+        keys = [pair_key(selections[p]['type'], selections[p]['beers']) for p in misses]
+        if artifact['prediction_cache'] is not None:
+            computed = artifact['prediction_cache'].get_many(keys)
+        else:
+            computed = compute_selections(artifact['similarity_models'], keys)
+        for p, preds in zip(misses, computed):
+            results[p] = preds
+    return results
+
+def recommend(artifact, beertype, beer_ids):
+    """Finds ranked recommendations for one selection of beers, see recommend_many.
+    Returns:
+        preds {list} -- ranked recommendation rows, or None if the selection cannot be scored
+    """
+    return recommend_many(artifact, [{'type': beertype, 'beers': beer_ids}])[0]
+
+static_dir = os.path.join(app.root_path, app.config['STATIC_PAGES_DIR']) if app.config['STATIC_PAGES_DIR'] else None
+
+def static_page(version, beertype, beer_ids=None):
+    """Finds the page pre-rendered by src/render_static.py for a beer type, or for a selection of beers of that type,
+    from a model version, the one the request is served from. After a new version is swapped in, pages are rendered
+    by the app until they are pre-rendered again, and so are pages removed while they are being sent. The page is
+    sent straight from disk, or handed to the web server with X-Accel-Redirect if STATIC_PAGES_ACCEL_PREFIX is set.
+    Returns:
+        response -- response serving the page, or None if there is no pre-rendered page
+    """
+    if static_dir is None:
+        return None
+    relpath = '{}/{}'.format(static_version_dir(version), static_page_path(beertype, beer_ids))
+    path = safe_join(static_dir, relpath)
+    if path is None or not os.path.isfile(path):
+        return None
+    if app.config['STATIC_PAGES_ACCEL_PREFIX']:
+        return '', 200, {'X-Accel-Redirect': app.config['STATIC_PAGES_ACCEL_PREFIX'] + urllib.parse.quote(relpath),
+                         'Content-Type': 'text/html; charset=utf-8'}
+    try:
+        return send_from_directory(static_dir, relpath, mimetype='text/html')
+    except NotFound: #removed by a render since it was found
+        return None
+
+def recommender_page(beertype):
+    """Renders the page listing the top ten beers of a type, queried from DB
+    Returns: rendered beerapp/templates/recommender.html template
+    """
+    listbeers = records_to_dicts(*fetch_columns(db.session, Top_Ten_Beers, beercolumns, order_by='Pkey', Type=beertype))
+    logger.debug("Top ten beers query accessed")
+    return render_template('recommender.html', beertype=beertype, listbeers=listbeers)
+
+def results_page(beertype, preds):
+    """Renders the page listing ranked recommendations
+    Returns: rendered beerapp/templates/results.html template
+    """
+    return render_template('results.html', beertype=beertype, preds=preds)
 
 @app.route('/')
 def intro_page():
@@ -36,15 +235,15 @@ def intro_page():
 
 @app.route('/recommender', methods=['POST'])
 def add_entry():
-    """View that process a POST with beer type input and displays top ten beers for this type, queried from DB.
+    """View that process a POST with beer type input and displays top ten beers for this type, pre-rendered or queried from DB.
     Returns: rendered beerapp/templates/recommender.html template
     """
-    global beertype 
     beertype = request.form['beertype']
+    page = static_page(model_store.current_version, beertype)
+    if page is not None:
+        return page
     try:
-        listbeers = db.session.query(Top_Ten_Beers).filter_by(Type=beertype)
-        logger.debug("Top ten beers query accessed")
-        return render_template('recommender.html', beertype=beertype, listbeers=listbeers)
+        return recommender_page(beertype)
     except:
         traceback.print_exc()
         logger.warning("Not able to display beers, error page returned")
@@ -52,47 +251,75 @@ def add_entry():
 
 @app.route('/results', methods=['POST'])
 def get_results():
-    """View that process a POST with beer choice input and displays recommendations, queried from DB.
+    """View that process a POST with beer type and two or three beer choices and displays recommendations, pre-rendered, looked up in the
+    recommendation index or scored online. The type and chosen Beer_IDs travel with the form, so no state is shared between requests.
     Returns: rendered beerapp/templates/results.html template
     """
     try:
-        firstbeer = int(request.form['beerchoice1'])
-        secondbeer = int(request.form['beerchoice2'])
+        beertype = request.form['beertype']
+        beer_ids = [int(request.form['beerchoice1']), int(request.form['beerchoice2'])]
+        if request.form.get('beerchoice3'):
+            beer_ids.append(int(request.form['beerchoice3']))
     except:
         traceback.print_exc()
         logger.warning("Not able to display recommendations, error page returned")
         return render_template('error-noselection.html')
-    try:
-        listbeers = db.session.query(Top_Ten_Beers).filter_by(Type=beertype)
-        logger.debug("Top Ten Beers Query Accessed")
-    except:
-        traceback.print_exc()
-        logger.warning("Not able to display recommendations, error page returned")
-    if firstbeer==secondbeer:
+    if len(set(beer_ids)) < len(beer_ids):
         return render_template('error-samebeers.html')
-    names, data = query_to_list(listbeers)
-    top10df = pd.DataFrame.from_records(data, columns=names)
-    usercomb = top10df.iloc[[firstbeer, secondbeer],:]
-    try:
-        allcomb = db.session.query(User_Combinations).filter_by(Type=beertype)
-        logger.debug("Recommendation Query Accessed")
-    except:
-        traceback.print_exc()
-        logger.warning("Not able to display recommendations, error page returned")
-    names, data = query_to_list(allcomb)
-    allcombdf = pd.DataFrame.from_records(data, columns=names)
-    probablerows = allcombdf[allcombdf['Beer_ID'].isin(usercomb['Beer_ID'].values)]
-    realrows = probablerows.groupby(['ID']).count()
-    ID = realrows[realrows['Beer_ID']==2].index[0]
+    version, artifact = model_store.served #one read, so the page and the recommendations are of the same version
+    page = static_page(version, beertype, beer_ids)
+    if page is not None:
+        return page
     try:
-        preds = db.session.query(User_Predictions).filter_by(Type=beertype, ID=ID)
-        logger.debug("Recommendation Results Query Accessed")
-        return render_template('results.html', beertype=beertype, preds=preds)
+        preds = recommend(artifact, beertype, beer_ids)
+        if preds is None:
+            raise KeyError('No recommendations for this selection of beers.')
+        logger.debug("Recommendations found")
+        return results_page(beertype, preds)
     except:
         traceback.print_exc()
         logger.warning("Not able to display beers, error page returned")
         return render_template('error-noselection.html')
 
+@app.route('/api/recommendations', methods=['POST'])
+def batch_recommendations():
+    """JSON view that resolves many beer selections in one POST. Expects a body of the form
+    {"requests": [{"type": "Stout", "beers": [Beer_ID, Beer_ID]}, ...]}.
+    Each recommendation's source tells what its score is: 'precomputed' for the trained predictions, whose score is
+    the engine's estimate, and 'online' for selections scored against the similarity model, whose score is a sum of
+    similarities. Scores of different sources are not comparable.
+    Returns: JSON with one entry per request, in order, holding the ranked recommendations or an error
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get('requests'), list):
+        logger.warning("Batch request without a list of requests")
+        return jsonify({'error': 'Body must be JSON of the form {"requests": [{"type": ..., "beers": [...]}]}'}), 400
+    selections = payload['requests']
+    if len(selections) > app.config['MAX_BATCH_REQUESTS']:
+        return jsonify({'error': 'At most {} requests per batch'.format(app.config['MAX_BATCH_REQUESTS'])}), 400
+    try:
+        selections = [parse_selection(s) for s in selections]
+    except ValueError:
+        logger.warning("Batch request with a malformed selection")
+        return jsonify({'error': 'Each request needs a "type" and a list of two or more different integer "beers"'}), 400
+    results = []
+    for selection, preds in zip(selections, recommend_many(model_store.current, selections)):
+        if preds is None:
+            results.append(dict(selection, error='No recommendations for this selection'))
+        else:
+            recommendations = [dict({name: row[name] for name in apicolumns}, rank=rank, source=row['source']) for rank, row in enumerate(preds, 1)]
+            results.append(dict(selection, recommendations=recommendations))
+    logger.debug("Resolved batch of %d requests", len(results))
+    return jsonify({'results': results})
+
+@app.route('/metrics')
+def metrics():
+    """View that exposes request, DB, template and index build metrics in the Prometheus text format
+    Returns: metrics text
+    """
+    text = render([request_latency, request_queries, request_db_time, template_render_time, index_build_time])
+    return text, 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
 if __name__ == "__main__":
 
     app.run(host = '0.0.0.0', use_reloader=True, port=3000)
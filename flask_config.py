@@ -4,8 +4,17 @@ DEBUG = True
 APP_NAME = "beerapp"
 
 
-SQLALCHEMY_ECHO = True  # If true, SQL for queries made will be printed
+SQLALCHEMY_ECHO = False  # If true, SQL for queries made will be printed. Query counts and times are always at /metrics
 MAX_ROWS_SHOW = 100
+MAX_BATCH_REQUESTS = 1000  # Largest number of selections accepted by /api/recommendations
+NUM_RECOMMENDATIONS = 10  # Recommendations shown per selection
+SIMILARITY_MODEL_DIR = 'models/similarity'  # Item-item similarity models written by train_model.py, used for selections not precomputed
+LAZY_PREDICTIONS = True  # Cache selections scored on demand, computing each one once even under concurrent requests
+PREDICTION_CACHE_SIZE = 4096  # Most selections kept in the cache
+PREDICTION_WRITE_THROUGH = False  # If true, selections scored on demand are also written to the user_predictions table
+MODEL_RELOAD_INTERVAL = 60  # Seconds between checks for new predictions or similarity models to swap in; 0 turns this off
+STATIC_PAGES_DIR = None  # Pages pre-rendered by src/render_static.py to serve instead of rendering them, e.g. 'static_pages'
+STATIC_PAGES_ACCEL_PREFIX = None  # If set, e.g. '/static_pages/', pages are handed to nginx with X-Accel-Redirect to this internal location
 
 conn_type = "mysql+pymysql"  
 user = os.environ.get('MYSQL_USER')
@@ -20,3 +29,5 @@ if localorRDS == 'local':
 elif localorRDS == 'RDS':
     SQLALCHEMY_DATABASE_URI = "{}://{}:{}@{}:{}/{}".\
     format(conn_type, user, password, host, port, DATABASE_NAME)
+if os.environ.get('SQLALCHEMY_DATABASE_URI'):  # Overrides the DB above, e.g. with the synthetic DB built by src/benchmark_app.py
+    SQLALCHEMY_DATABASE_URI = os.environ['SQLALCHEMY_DATABASE_URI']
@@ -0,0 +1,218 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import combinations
+from datetime import datetime
+try:
+    import configure_db as cdb
+except:
+    import src.configure_db as cdb
+import urllib.request
+import urllib.error
+import urllib.parse
+import numpy as np
+import threading
+import argparse
+import logging
+import json
+import time
+import yaml
+import sys
+import os
+
+logger = logging.getLogger(__name__)
+
+def synthetic_tables(ntypes=4, topn=10, npreds=10, seed=423):
+    """Creates synthetic top ten, combination and prediction rows shaped like the output of train_model.py
+
+    Arguments:
+        ntypes {int} -- number of beer types (default: {4})
+        topn {int} -- number of top beers shown per type; every pair of them gets predictions (default: {10})
+        npreds {int} -- number of predictions per pair (default: {10})
+        seed {int} -- random seed (default: {423})
+
+    Returns:
+        top10rows {list} -- list of dictionaries, rows of the top_ten_beers table
+        combinationrows {list} -- list of dictionaries, rows of the user_combinations table
+        predrows {list} -- list of dictionaries, rows of the user_predictions table
+    """
+    rng = np.random.RandomState(seed)
+    top10rows, combinationrows, predrows = [], [], []
+    poolsize = topn + 2 * npreds #beers per type that can be recommended
+    for t in range(ntypes):
+        beertype = 'Type{}'.format(t)
+        beers = [{'Beer_ID': t * poolsize + i, 'Beer_Name': 'Beer {}'.format(t * poolsize + i), 'ABV': round(rng.uniform(3, 12), 1),
+                  'Type': beertype, 'Style': 'Style {}'.format(rng.randint(5)), 'Brewery': 'Brewery {}'.format(rng.randint(50))}
+                 for i in range(poolsize)]
+        top10rows.extend(beers[:topn])
+        for user, pair in enumerate(combinations(beers[:topn], 2), 1):
+            user_id = '{}{}'.format(beertype, user)
+            combinationrows.extend(dict(beer, ID=user_id) for beer in pair)
+            chosen = rng.choice(np.arange(topn, poolsize), npreds, replace=False)
+            scores = np.sort(rng.uniform(1, 5, npreds))[::-1]
+            predrows.extend(dict(beers[i], score=float(s), ID=user_id) for i, s in zip(chosen, scores))
+    return top10rows, combinationrows, predrows
+
+def build_synthetic_db(engine_string, ntypes=4, topn=10, npreds=10, seed=423):
+    """Creates a database of synthetic recommendations for benchmarking the app, replacing any tables already there
+
+    Arguments:
+        engine_string {str} -- SQLAlchemy connection string of the database to create
+        ntypes {int} -- number of beer types (default: {4})
+        topn {int} -- number of top beers shown per type (default: {10})
+        npreds {int} -- number of predictions per pair (default: {10})
+        seed {int} -- random seed (default: {423})
+
+    Returns:
+        top10rows {list} -- list of dictionaries, rows of the top_ten_beers table
+        combinationrows {list} -- list of dictionaries, rows of the user_combinations table
+    """
+    top10rows, combinationrows, predrows = synthetic_tables(ntypes, topn, npreds, seed)
+    engine = cdb.create_connection(SQLITELOCALENGINE=engine_string) if engine_string.startswith('sqlite') \
+        else cdb.sql.create_engine(engine_string)
+    cdb.Base.metadata.drop_all(engine)
+    cdb.Base.metadata.create_all(engine)
+    with engine.begin() as conn: #bulk inserts, one statement per table
+        conn.execute(cdb.Top_Ten_Beers.__table__.insert(), top10rows)
+        conn.execute(cdb.User_Combinations.__table__.insert(), combinationrows)
+        conn.execute(cdb.User_Predictions.__table__.insert(), predrows)
+    logger.info("Built synthetic DB with %d top beers, %d combination rows and %d prediction rows",
+                len(top10rows), len(combinationrows), len(predrows))
+    return top10rows, combinationrows
+
+def route_requests(top10rows, combinationrows):
+    """Creates the requests a user session makes against each route, cycling through every type and pair
+
+    Arguments:
+        top10rows {list} -- list of dictionaries, rows of the top_ten_beers table
+        combinationrows {list} -- list of dictionaries, rows of the user_combinations table
+
+    Returns:
+        requests {dict} -- dictionary of route: list of (method, form data) tuples
+    """
+    beertypes = sorted(set(row['Type'] for row in top10rows))
+    pairs = {}
+    for row in combinationrows:
+        pairs.setdefault((row['Type'], row['ID']), []).append(row['Beer_ID'])
+    results = [('POST', {'beertype': beertype, 'beerchoice1': str(a), 'beerchoice2': str(b)})
+               for (beertype, _), (a, b) in sorted(pairs.items())]
+    return {'/': [('GET', None)],
+            '/recommender': [('POST', {'beertype': beertype}) for beertype in beertypes],
+            '/results': results}
+
+def latency_summary(latencies, seconds, errors=0):
+    """Summarizes the latencies of a benchmark run
+
+    Arguments:
+        latencies {list} -- seconds taken by each request
+        seconds {float} -- wall clock seconds taken by the whole run
+        errors {int} -- number of requests that did not return 200 (default: {0})
+
+    Returns:
+        summary {dict} -- request count, errors, throughput in requests per second and latency percentiles in milliseconds
+    """
+    if len(latencies) == 0:
+        raise ValueError('No requests were timed.')
+    p50, p95, p99 = np.percentile(np.asarray(latencies) * 1000, [50, 95, 99])
+    return {'requests': len(latencies), 'errors': errors, 'seconds': seconds, 'throughput': len(latencies) / seconds,
+            'mean_ms': float(np.mean(latencies) * 1000), 'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99)}
+
+def bench_test_client(app, route, requests, nrequests):
+    """Sends requests one at a time through Flask's test client, which measures the app without any network or server
+
+    Arguments:
+        app {flask.Flask} -- app to benchmark
+        route {str} -- route to benchmark
+        requests {list} -- list of (method, form data) tuples for one route, cycled through
+        nrequests {int} -- number of requests to send
+
+    Returns:
+        summary {dict} -- output of latency_summary
+    """
+    client = app.test_client()
+    latencies, errors = [], 0
+    start = time.perf_counter()
+    for i in range(nrequests):
+        method, data = requests[i % len(requests)]
+        sent = time.perf_counter()
+        response = client.open(route, method=method, data=data)
+        latencies.append(time.perf_counter() - sent)
+        errors += response.status_code != 200
+    return latency_summary(latencies, time.perf_counter() - start, errors)
+
+def bench_http(url, requests, nrequests, threads=8):
+    """Sends requests over HTTP from several threads at once
+
+    Arguments:
+        url {str} -- URL of the route to benchmark
+        requests {list} -- list of (method, form data) tuples for one route, cycled through
+        nrequests {int} -- number of requests to send
+        threads {int} -- number of concurrent clients (default: {8})
+
+    Returns:
+        summary {dict} -- output of latency_summary
+    """
+    def send(i):
+        method, data = requests[i % len(requests)]
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        sent = time.perf_counter()
+        try:
+            with urllib.request.urlopen(urllib.request.Request(url, data=body, method=method)) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        return time.perf_counter() - sent, status
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        timed = list(pool.map(send, range(nrequests)))
+    return latency_summary([latency for latency, _ in timed], time.perf_counter() - start,
+                           sum(status != 200 for _, status in timed))
+
+def run_benchmark(args):
+    """Builds a synthetic DB, points the app at it and benchmarks each route through the test client and over HTTP
+
+    Arguments:
+        args {argparse.Namespace} -- Script arguments
+
+    Raises:
+        ValueError: "Path to yaml config file must be provided through --config" if args.config not specified
+    """
+    if args.config is not None:
+        with open(args.config, "r") as f:
+            config = yaml.safe_load(f)
+        config = config['benchmark_app']
+    else:
+        raise ValueError("Path to yaml config file must be provided through --config")
+    engine_string = 'sqlite:///' + os.path.abspath(args.db)
+    top10rows, combinationrows = build_synthetic_db(engine_string, **config['build_synthetic_db'])
+    os.environ['SQLALCHEMY_DATABASE_URI'] = engine_string #read by flask_config.py when the app is imported
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from application import app
+    for name in ['', 'werkzeug']: #per-request logs would dominate the timings
+        logging.getLogger(name).setLevel(config['log_level'])
+    logger.setLevel(logging.INFO)
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    params = config['run_benchmark']
+    results = []
+    for route, requests in route_requests(top10rows, combinationrows).items():
+        for client, summary in [('test_client', bench_test_client(app, route, requests, params['nrequests'])),
+                                ('http', bench_http('http://127.0.0.1:{}{}'.format(server.server_port, route), requests,
+                                                    params['nrequests'], params['threads']))]:
+            results.append(dict(summary, route=route, client=client))
+            logger.info("%s %s: %.0f req/s, p50 %.2f ms, p95 %.2f ms, p99 %.2f ms", client, route, summary['throughput'],
+                        summary['p50_ms'], summary['p95_ms'], summary['p99_ms'])
+    server.shutdown()
+    with open(args.output, 'w') as f:
+        json.dump({'timestamp': datetime.utcnow().isoformat(), 'config': config, 'results': results}, f, indent=2)
+    logger.info("Saved benchmark results to %s", args.output)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(name)s - %(levelname)s - %(asctime)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Benchmark the app's routes against a synthetic DB")
+    parser.add_argument('--config', default='src/config.yml', help='config.yml')
+    parser.add_argument('--db', default='data/benchmark.db', help='path of the synthetic SQLite DB to build')
+    parser.add_argument('--output', default='data/benchmark.json', help='path of the JSON results')
+    args = parser.parse_args()
+
+    run_benchmark(args)
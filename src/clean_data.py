@@ -120,6 +120,8 @@ def run_clean(args):
         ValueError: "Path to yaml config file must be provided through --config" if args.config not specified
         ValueError: "Path to CSV for input data must be provided through --input" if args.input not specified
         ValueError: "Path to CSV for output data must be provided through --output" if args.output not specified
+
+    If args.output_pending is specified, the reviews removed by refine_data are also saved there.
     """
     if args.config is not None:
         with open(args.config, "r") as f:
@@ -135,8 +137,13 @@ def run_clean(args):
     data = omit_values(data, **config['omit_values'])
     data = aggregated_category_column(data, **config['aggregated_category_column'])
     data = select_rename_features(data, **config['select_rename_features'])
+    unrefined = data
     data = refine_data(data, **config['refine_data'])
     logger.info('Cleaned Data')
+    if getattr(args, 'output_pending', None) is not None: #reviews of items with too few reviews, for update_model.py
+        idcolname = config['refine_data'].get('idcolname', 'Beer_ID')
+        pending = unrefined[~unrefined[idcolname].isin(data[idcolname])]
+        pending.to_csv(args.output_pending, index=False)
     if args.output is not None:
         data.to_csv(args.output, index=False)
     else:
@@ -149,6 +156,7 @@ if __name__ == "__main__":
     parser.add_argument('--config', default='config.yml')
     parser.add_argument('--input', default='data/beer_reviews.csv')
     parser.add_argument('--output', default='data/cleaned_beer_reviews.csv')
+    parser.add_argument('--output_pending', default=None, help='CSV of the reviews of beers with too few reviews')
     args = parser.parse_args()
     
     run_clean(args)
@@ -4,11 +4,13 @@ from sqlalchemy import Column, Integer, String, Float, MetaData
 import sqlalchemy as sql
 import logging
 import sys
+import numpy as np
 import pandas as pd
 import argparse
 import yaml
 import sqlite3
 Base = declarative_base()  
+logger = logging.getLogger(__name__)
 
 class Top_Ten_Beers(Base):
     """Schema for Top Ten Beers Table """
@@ -102,49 +104,158 @@ def get_session(engine):
     session = Session()
     return session
 
-def persist_top10beers(session, records):
+def fetch_columns(session, model, colnames, order_by=None, **filters):
+    """Fetches columns of a table with a column-projected Core select. Rows come back as plain tuples,
+    without ORM objects being created or inspected.
+
+    Arguments:
+        session -- SQLAlchemy session, connection or engine
+        model -- table class, e.g. Top_Ten_Beers
+        colnames {list} -- names of columns to select
+        order_by {str} -- name of column to order rows by (default: {None})
+        **filters -- column name: value pairs rows must equal
+
+    Returns:
+        colnames {list} -- names of selected columns
+        rows {list} -- list of tuples, one per row, in the order of colnames
+    """
+    table = model.__table__
+    try:
+        stmt = sql.select([table.c[name] for name in colnames])
+        for name, value in filters.items():
+            stmt = stmt.where(table.c[name] == value)
+        if order_by is not None:
+            stmt = stmt.order_by(table.c[order_by])
+    except KeyError:
+        raise KeyError('Column names are incorrect.')
+    rows = [tuple(row) for row in session.execute(stmt).fetchall()]
+    return list(colnames), rows
+
+def fetch_arrays(session, model, colnames, order_by=None, **filters):
+    """Fetches columns of a table as NumPy arrays, for bulk readers
+
+    Arguments:
+        session -- SQLAlchemy session, connection or engine
+        model -- table class, e.g. Top_Ten_Beers
+        colnames {list} -- names of columns to select
+        order_by {str} -- name of column to order rows by (default: {None})
+        **filters -- column name: value pairs rows must equal
+
+    Returns:
+        arrays {dict} -- dictionary of column name: np.ndarray of column values
+    """
+    colnames, rows = fetch_columns(session, model, colnames, order_by, **filters)
+    if len(rows) == 0:
+        return {name: np.array([]) for name in colnames}
+    return {name: np.array(values) for name, values in zip(colnames, zip(*rows))}
+
+def persist_top10beers(session, records, start=None):
     """Adds score records to tweet_score table in SQL database
     
     Arguments:
         session {[session]} -- SQL database session
         records {[type]} -- list of dictionaries containing tweetid and score
+        start {int} -- primary key of the first record, numbered by the database if not given (default: {None})
     """
     numrec = 0 #keeps track of number of records added to db
     for index, i in records.iterrows():
         beer = Top_Ten_Beers(Beer_ID=i['Beer_ID'], Beer_Name=i['Beer_Name'], ABV=i['ABV'], Type=i['Type'], Style=i['Style'], Brewery=i['Brewery']) 
+        if start is not None:
+            beer.Pkey = start + numrec
         session.add(beer) #add record
         numrec = numrec + 1 #keeps track of number of records added to db
     logger.info("Added {} records to SQL database".format(numrec))
 
-def persist_usercombinations(session, records):
+def persist_usercombinations(session, records, start=None):
     """Adds score records to tweet_score table in SQL database
     
     Arguments:
         session {[session]} -- SQL database session
         records {[type]} -- list of dictionaries containing tweetid and score
+        start {int} -- primary key of the first record, numbered by the database if not given (default: {None})
     """
     numrec = 0 #keeps track of number of records added to db
     for index, i in records.iterrows():
         beer = User_Combinations(Beer_ID=i['Beer_ID'], Beer_Name=i['Beer_Name'], ABV=i['ABV'], Type=i['Type'], Style=i['Style'], Brewery=i['Brewery'], ID=i['ID']) 
+        if start is not None:
+            beer.Pkey = start + numrec
         session.add(beer) #add record
         numrec = numrec + 1 #keeps track of number of records added to db
     logger.info("Added {} records to SQL database".format(numrec))
 
-def persist_userpredictions(session, records):
+def persist_userpredictions(session, records, start=None):
     """Adds score records to tweet_score table in SQL database
     
     Arguments:
         session {[session]} -- SQL database session
         records {[type]} -- list of dictionaries containing tweetid and score
+        start {int} -- primary key of the first record, numbered by the database if not given (default: {None})
     """
     numrec = 0 #keeps track of number of records added to db
     for index, i in records.iterrows():
         beer = User_Predictions(Beer_ID=i['Beer_ID'], score=i['score'], Beer_Name=i['Beer_Name'], ABV=i['ABV'], Type=i['Type'], Style=i['Style'], Brewery=i['Brewery'], ID=i['ID']) 
+        if start is not None:
+            beer.Pkey = start + numrec
         session.add(beer) #add record
         numrec = numrec + 1 #keeps track of number of records added to db
     logger.info("Added {} records to SQL database".format(numrec))
 
 
+def replace_rows(session, model, persist, records):
+    """Replaces every row of a table with records, without committing. The new rows get primary keys above any
+    the table had, so the last key written always identifies the latest load.
+
+    Arguments:
+        session {[session]} -- SQL database session
+        model -- table class, e.g. Top_Ten_Beers
+        persist {function} -- function adding the records, e.g. persist_top10beers
+        records {pd.DataFrame} -- rows to load
+    """
+    start = (session.query(sql.func.max(model.Pkey)).scalar() or 0) + 1
+    session.query(model).delete(synchronize_session=False)
+    persist(session, records, start)
+
+def load_tables(session, top10_data, combinations_data, pred_data):
+    """Replaces the top ten beers, user combinations and user predictions tables with one load of new predictions,
+    in a single transaction. The app keys its recommendations by the last top ten row, and pseudo-user IDs repeat
+    across loads, so loads replace the rows instead of adding to them.
+
+    Arguments:
+        session {[session]} -- SQL database session
+        top10_data {pd.DataFrame} -- top ten beers of each type
+        combinations_data {pd.DataFrame} -- beers chosen by each pseudo-user
+        pred_data {pd.DataFrame} -- predictions of each pseudo-user
+    """
+    try:
+        replace_rows(session, User_Predictions, persist_userpredictions, pred_data.fillna(value=0))
+        replace_rows(session, User_Combinations, persist_usercombinations, combinations_data.fillna(value=0))
+        replace_rows(session, Top_Ten_Beers, persist_top10beers, top10_data.fillna(value=0))
+        session.commit()
+    except:
+        session.rollback()
+        raise
+    logger.info("Persisted {} prediction, {} top10beers and {} combination records.".format(len(pred_data.index),
+                len(top10_data.index), len(combinations_data.index)))
+
+def replace_user_rows(session, user_id, combinations, predictions):
+    """Replaces the user_combinations and user_predictions rows of one pseudo-user in a single transaction, so a
+    selection persisted again, e.g. by another app process, keeps one copy of its rows.
+
+    Arguments:
+        session {[session]} -- SQL database session
+        user_id {str} -- pseudo-user ID of the rows
+        combinations {list} -- User_Combinations rows of the pseudo-user
+        predictions {list} -- User_Predictions rows of the pseudo-user
+    """
+    try:
+        session.query(User_Combinations).filter(User_Combinations.ID == user_id).delete(synchronize_session=False)
+        session.query(User_Predictions).filter(User_Predictions.ID == user_id).delete(synchronize_session=False)
+        session.add_all(combinations + predictions)
+        session.commit()
+    except:
+        session.rollback()
+        raise
+
 def configure(args):
     """Runs script to run scoring
     
@@ -163,55 +274,32 @@ def configure(args):
         config = config['configure_db']
     else:
         raise ValueError("Path to yaml config file must be provided through --config")
-    if args.rds:
-        engine = create_db(rds=True, **config['rds'])
-    else:
-        engine = create_db(rds=False, **config['sqlite'])
-    session = get_session(engine)
 
     if args.input_preds is not None:
         pred_data = pd.read_csv(args.input_preds)
     else:
         raise ValueError("Path to CSV for input preds must be provided through --input_preds")
-        pred_data = pred_data.fillna(value=0)
-        try:
-            persist_userpredictions(session, pred_data)
-            session.commit()
-        except Exception as e:
-            logger.error(e)
-            sys.exit(1)
-        finally:
-            logger.info("Persisted {} prediction records.".format(len(pred_data.index)))
-    
     if args.input_top10rows is not None:
         top10_data = pd.read_csv(args.input_top10rows)
     else:
         raise ValueError("Path to CSV for input top10 data must be provided through --input_top10rows")
-        top10_data = top10_data.fillna(value=0)
-        print(top10_data)
-        try:
-            persist_top10beers(session, top10_data)
-            session.commit()
-        except Exception as e:
-            logger.error(e)
-            sys.exit(1)
-        finally:
-            logger.info("Persisted {} top10beers records.".format(len(top10_data.index)))
-    
     if args.input_combinations is not None:
         combinations_data = pd.read_csv(args.input_combinations)
     else:
         raise ValueError("Path to CSV for input combination data must be provided through --input_combinations")
-        combinations_data = combinations_data.fillna(value=0)
-        try:
-            persist_usercombinations(session, combinations_data)
-            session.commit()
-        except Exception as e:
-            logger.error(e)
-            sys.exit(1)
-        finally:
-            logger.info("Persisted {} combination records.".format(len(combinations_data.index)))
-            session.close()
+
+    if args.rds:
+        engine = create_db(rds=True, **config['rds'])
+    else:
+        engine = create_db(rds=False, **config['sqlite'])
+    session = get_session(engine)
+    try:
+        load_tables(session, top10_data, combinations_data, pred_data)
+    except Exception as e:
+        logger.error(e)
+        sys.exit(1)
+    finally:
+        session.close()
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.DEBUG, format='%(name)s - %(levelname)s - %(asctime)s - %(message)s')
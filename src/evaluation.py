@@ -0,0 +1,136 @@
+import pandas as pd
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+def prediction_arrays(predictions):
+    """Converts predictions to the columnar arrays the ranking metrics take
+
+    Arguments:
+        predictions {list} -- (user, item, true rating, estimate, details) tuples, e.g. surprise.Prediction objects
+
+    Returns:
+        uids {np.ndarray} -- integer code of each prediction's user, numbered in order of first appearance
+        estimates {np.ndarray} -- estimated rating of each prediction
+        ratings {np.ndarray} -- true rating of each prediction
+    """
+    uids, _ = pd.factorize([p[0] for p in predictions])
+    estimates = np.fromiter((p[3] for p in predictions), dtype=np.float64, count=len(predictions))
+    ratings = np.fromiter((p[2] for p in predictions), dtype=np.float64, count=len(predictions))
+    return uids, estimates, ratings
+
+def rank_by_user(uids, values):
+    """Sorts predictions by user, then by value descending. Ties keep the order of the predictions, as a stable sort would.
+
+    Arguments:
+        uids {np.ndarray} -- integer code of each prediction's user
+        values {np.ndarray} -- value to rank each user's predictions by
+
+    Returns:
+        order {np.ndarray} -- positions of the predictions in sorted order
+        starts {np.ndarray} -- position in order of each user's first prediction, one per user in ascending code order
+        ranks {np.ndarray} -- rank of each sorted prediction within its user, from 0
+    """
+    uids = np.asarray(uids)
+    if len(uids) == 0:
+        raise ValueError('No predictions to rank.')
+        logger.error('Predictions must not be empty.')
+    order = np.lexsort((np.arange(len(uids)), -np.asarray(values), uids)) #last key sorts first
+    sorted_uids = uids[order]
+    starts = np.flatnonzero(np.r_[True, sorted_uids[1:] != sorted_uids[:-1]])
+    ranks = np.arange(len(uids)) - np.repeat(starts, np.diff(np.r_[starts, len(uids)]))
+    return order, starts, ranks
+
+def ratio(numerator, denominator):
+    """Divides per-user counts, giving 1 where the denominator is 0"""
+    out = np.ones(len(numerator))
+    np.divide(numerator, denominator, out=out, where=denominator != 0)
+    return out
+
+def precision_recall_at_k(uids, estimates, ratings, k=10, threshold=3, ranking=None):
+    """Computes precision and recall at k of each user, the same as score_model.precision_recall_at_k
+
+    Arguments:
+        uids {np.ndarray} -- integer code of each prediction's user
+        estimates {np.ndarray} -- estimated rating of each prediction
+        ratings {np.ndarray} -- true rating of each prediction
+        k {int} -- number of top estimates per user to consider (default: {10})
+        threshold {float} -- ratings at or above it are relevant, estimates at or above it are recommended (default: {3})
+        ranking {tuple} -- output of rank_by_user for the estimates, computed if not given (default: {None})
+
+    Returns:
+        precisions {np.ndarray} -- precision at k of each user, in ascending code order
+        recalls {np.ndarray} -- recall at k of each user, in ascending code order
+    """
+    order, starts, ranks = ranking if ranking is not None else rank_by_user(uids, estimates)
+    relevant = np.asarray(ratings)[order] >= threshold
+    recommended = (ranks < k) & (np.asarray(estimates)[order] >= threshold)
+    n_rel = np.add.reduceat(relevant.astype(np.int64), starts)
+    n_rec_k = np.add.reduceat(recommended.astype(np.int64), starts)
+    n_rel_and_rec_k = np.add.reduceat((relevant & recommended).astype(np.int64), starts)
+    return ratio(n_rel_and_rec_k, n_rec_k), ratio(n_rel_and_rec_k, n_rel)
+
+def ndcg_at_k(uids, estimates, ratings, k=10, ranking=None, ideal_ranking=None):
+    """Computes the normalized discounted cumulative gain at k of each user, with the true ratings as gains:
+    the gain of the top k estimates discounted by the log of their rank, over that of the top k true ratings
+
+    Arguments:
+        uids {np.ndarray} -- integer code of each prediction's user
+        estimates {np.ndarray} -- estimated rating of each prediction
+        ratings {np.ndarray} -- true rating of each prediction
+        k {int} -- number of top estimates per user to consider (default: {10})
+        ranking {tuple} -- output of rank_by_user for the estimates, computed if not given (default: {None})
+        ideal_ranking {tuple} -- output of rank_by_user for the true ratings, computed if not given (default: {None})
+
+    Returns:
+        ndcgs {np.ndarray} -- NDCG at k of each user, in ascending code order, 1 if all their true ratings are 0
+    """
+    ratings = np.asarray(ratings, dtype=np.float64)
+    order, starts, ranks = ranking if ranking is not None else rank_by_user(uids, estimates)
+    dcg = np.add.reduceat(np.where(ranks < k, ratings[order] / np.log2(ranks + 2), 0), starts)
+    order, starts, ranks = ideal_ranking if ideal_ranking is not None else rank_by_user(uids, ratings) #best possible ranking
+    idcg = np.add.reduceat(np.where(ranks < k, ratings[order] / np.log2(ranks + 2), 0), starts)
+    return ratio(dcg, idcg)
+
+def average_precision(uids, estimates, ratings, threshold=3, ranking=None):
+    """Computes the average precision of each user: the precision at the rank of each relevant prediction, ranked by
+    estimate, averaged over the user's relevant predictions
+
+    Arguments:
+        uids {np.ndarray} -- integer code of each prediction's user
+        estimates {np.ndarray} -- estimated rating of each prediction
+        ratings {np.ndarray} -- true rating of each prediction
+        threshold {float} -- ratings at or above it are relevant (default: {3})
+        ranking {tuple} -- output of rank_by_user for the estimates, computed if not given (default: {None})
+
+    Returns:
+        precisions {np.ndarray} -- average precision of each user, in ascending code order, 1 if they have no relevant predictions
+    """
+    order, starts, ranks = ranking if ranking is not None else rank_by_user(uids, estimates)
+    relevant = np.asarray(ratings)[order] >= threshold
+    hits = np.cumsum(relevant)
+    before = np.r_[0, hits[starts[1:] - 1]] #relevant predictions of earlier users
+    hits = hits - np.repeat(before, np.diff(np.r_[starts, len(hits)]))
+    n_rel = np.add.reduceat(relevant.astype(np.int64), starts)
+    return ratio(np.add.reduceat(np.where(relevant, hits / (ranks + 1), 0), starts), n_rel)
+
+def ranking_metrics(uids, estimates, ratings, k=10, threshold=3):
+    """Averages precision at k, recall at k, NDCG at k and average precision over users, sorting the predictions
+    once by estimate and once by true rating for all four
+
+    Arguments:
+        uids {np.ndarray} -- integer code of each prediction's user
+        estimates {np.ndarray} -- estimated rating of each prediction
+        ratings {np.ndarray} -- true rating of each prediction
+        k {int} -- number of top estimates per user to consider (default: {10})
+        threshold {float} -- relevance and recommendation threshold (default: {3})
+
+    Returns:
+        metrics {dict} -- mean precision, recall, ndcg and map over users
+    """
+    ranking = rank_by_user(uids, estimates)
+    precisions, recalls = precision_recall_at_k(uids, estimates, ratings, k, threshold, ranking)
+    ndcgs = ndcg_at_k(uids, estimates, ratings, k, ranking, rank_by_user(uids, ratings))
+    return {'precision': precisions.mean(), 'recall': recalls.mean(), 'ndcg': ndcgs.mean(),
+            'map': average_precision(uids, estimates, ratings, threshold, ranking).mean()}
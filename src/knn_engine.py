@@ -0,0 +1,336 @@
+from surprise import Prediction
+from scipy import sparse
+try:
+    import similarity_model as sim
+except:
+    import src.similarity_model as sim
+import numpy as np
+import pandas as pd
+import logging
+import json
+import os
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = 'knn' #subdirectory of a model version holding the fitted model of each category
+MODEL_FORMAT = 1 #version of the layout written by save_model
+
+class IncrementalKNN:
+    """User-based KNN with mean squared difference similarity that is fit once on a dataset and then folds in new users
+    one at a time. Folding in a user gives the same estimates as refitting Surprise's KNNBasic (default similarity
+    options) on the dataset plus that user's ratings, but only computes the new user's similarity row: similarities
+    between users already in the data never enter a new user's estimates.
+
+    Arguments:
+        k {int} -- most neighbors used in an estimate (default: {40})
+        min_k {int} -- fewest neighbors for an estimate, otherwise the global mean is used (default: {1})
+        min_support {int} -- fewest common items for a non-zero similarity (default: {1})
+        rating_scale {tuple} -- estimates are clipped to this range (default: {(1, 5)})
+    """
+
+    def __init__(self, k=40, min_k=1, min_support=1, rating_scale=(1, 5)):
+        self.k = k
+        self.min_k = min_k
+        self.min_support = min_support
+        self.rating_scale = rating_scale
+
+    def fit(self, df):
+        """Indexes a ratings dataset the way Surprise builds a trainset from it: users and items numbered in order of
+        first appearance, each item's ratings in row order.
+
+        Arguments:
+            df {pd.DataFrame} -- ratings with user, item and rating columns, in that order
+
+        Returns:
+            self {IncrementalKNN} -- fitted model
+        """
+        user_codes, self.user_ids = pd.factorize(df.iloc[:, 0])
+        item_codes, self.item_ids = pd.factorize(df.iloc[:, 1])
+        ratings = df.iloc[:, 2].values.astype(np.float64)
+        order = np.argsort(item_codes, kind='stable') #ratings grouped by item, in row order
+        self._users, self._items, self._ratings = user_codes[order], item_codes[order], ratings[order]
+        self._user_ratings = ratings[np.argsort(user_codes, kind='stable')] #ratings grouped by user, for the global mean
+        logger.debug('Fit incremental KNN on %d ratings of %d items by %d users', len(ratings), len(self.item_ids), len(self.user_ids))
+        return self
+
+    def fold_in(self, user_rows, implicit_rating=None):
+        """Estimates every item's rating for one new user
+
+        Arguments:
+            user_rows {pd.DataFrame} -- the new user's ratings with user, item and rating columns, in that order
+            implicit_rating {float} -- if given, the user also rates every item missing from user_rows with this rating, as if
+                                       those rows followed in the order items first appear in the data (default: {None})
+
+        Returns:
+            model {FoldedUser} -- estimates for the new user, with a Surprise-like test method
+        """
+        user_ids = user_rows.iloc[:, 0].unique()
+        if len(user_ids) != 1 or self.user_ids.isin(user_ids).any():
+            raise ValueError('User rows must be for one user that is not in the data.')
+        chosen = self.item_ids.get_indexer(user_rows.iloc[:, 1])
+        if (chosen < 0).any() or len(np.unique(chosen)) < len(chosen):
+            raise ValueError('User ratings must be for distinct items in the data.')
+        user_ratings = user_rows.iloc[:, 2].values.astype(np.float64)
+        rating = np.full(len(self.item_ids), np.nan if implicit_rating is None else float(implicit_rating))
+        rating[chosen] = user_ratings
+        if implicit_rating is not None:
+            chosen, user_ratings = np.arange(len(self.item_ids)), rating #the user now rates every item, in item order
+        # similarity row: sums over common items in item order, as Surprise accumulates them
+        common = ~np.isnan(rating[self._items])
+        sq_diff = np.bincount(self._users[common], weights=(self._ratings[common] - rating[self._items[common]]) ** 2,
+                              minlength=len(self.user_ids))
+        freq = np.bincount(self._users[common], minlength=len(self.user_ids))
+        similarity = np.zeros(len(self.user_ids))
+        supported = freq >= self.min_support
+        similarity[supported] = 1 / (sq_diff[supported] / freq[supported] + 1)
+        # each item's neighbors: its raters in row order, then the new user with similarity 1
+        items = np.concatenate([self._items, np.sort(chosen)])
+        sims = np.concatenate([similarity[self._users], np.ones(len(chosen))])
+        ratings = np.concatenate([self._ratings, rating[np.sort(chosen)]])
+        order = np.lexsort((np.arange(len(items)), -sims, items)) #most similar first, ties in neighbor order
+        items, sims, ratings = items[order], sims[order], ratings[order]
+        rank = np.arange(len(items)) - np.searchsorted(items, items)
+        keep = (rank < self.k) & (sims > 0)
+        sum_sim = np.bincount(items[keep], weights=sims[keep], minlength=len(self.item_ids))
+        sum_ratings = np.bincount(items[keep], weights=sims[keep] * ratings[keep], minlength=len(self.item_ids))
+        actual_k = np.bincount(items[keep], minlength=len(self.item_ids))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            estimates = sum_ratings / sum_sim
+        global_mean = np.mean(np.concatenate([self._user_ratings, user_ratings]))
+        return FoldedUser(self, user_ids[0], estimates, actual_k, global_mean)
+
+class FoldedUser:
+    """Estimates for one user folded into an IncrementalKNN, see IncrementalKNN.fold_in"""
+
+    def __init__(self, base, user_id, estimates, actual_k, global_mean):
+        self.base = base
+        self.user_id = user_id
+        self.estimates = estimates
+        self.actual_k = actual_k
+        self.global_mean = global_mean
+
+    def estimate_items(self, item_ids):
+        """Estimates the user's ratings of many items at once, as test does
+
+        Arguments:
+            item_ids {list} -- raw item ids
+
+        Returns:
+            estimates {np.ndarray} -- clipped estimate of each item, the global mean for unknown items or too few neighbors
+        """
+        positions = self.base.item_ids.get_indexer(item_ids)
+        possible = positions >= 0
+        possible[possible] = self.actual_k[positions[possible]] >= self.base.min_k
+        estimates = np.full(len(positions), self.global_mean, dtype=np.float64)
+        estimates[possible] = self.estimates[positions[possible]]
+        return np.clip(estimates, *self.base.rating_scale)
+
+    def test(self, testset):
+        """Predicts ratings the way Surprise's test method does
+
+        Arguments:
+            testset {list} -- list of (user, item, rating) tuples, output of train_model.build_testset
+
+        Returns:
+            predictions {list} -- list of surprise.Prediction objects
+        """
+        positions = self.base.item_ids.get_indexer([iid for (_, iid, _) in testset])
+        lower_bound, higher_bound = self.base.rating_scale
+        predictions = []
+        for (uid, iid, r_ui), position in zip(testset, positions):
+            if uid != self.user_id or position < 0:
+                est, details = self.global_mean, {'was_impossible': True, 'reason': 'User and/or item is unknown.'}
+            elif self.actual_k[position] < self.base.min_k:
+                est, details = self.global_mean, {'was_impossible': True, 'reason': 'Not enough neighbors.'}
+            else:
+                est, details = self.estimates[position], {'actual_k': int(self.actual_k[position]), 'was_impossible': False}
+            est = min(higher_bound, est)
+            est = max(lower_bound, est)
+            predictions.append(Prediction(uid, iid, r_ui, est, details))
+        return predictions
+
+class ItemKNN:
+    """Item-item KNN: a sparse float32 similarity matrix holding each item's k nearest neighbors, built once from the
+    user by item rating matrix a block of items at a time, so memory grows with the number of items times k. A user is
+    scored against every item with one product of their ratings and the matrix, which for a pseudo-user who chose two
+    items is the sum of those two items' rows.
+
+    Arguments:
+        k {int} -- most neighbors kept per item (default: {50})
+        method {str} -- similarity, 'cosine' or 'pearson' (default: {'cosine'})
+        block_size {int} -- number of items whose similarities are computed at once while fitting (default: {1000})
+    """
+
+    def __init__(self, k=50, method='cosine', block_size=1000):
+        self.k = k
+        self.method = method
+        self.block_size = block_size
+
+    def fit(self, df):
+        """Builds the top-k item-item similarity matrix of a ratings dataset
+
+        Arguments:
+            df {pd.DataFrame} -- ratings with user, item and rating columns, in that order
+
+        Returns:
+            self {ItemKNN} -- fitted model
+        """
+        matrix, item_ids = sim.rating_matrix(df, *df.columns[:3])
+        self.item_ids = pd.Index(item_ids)
+        self.similarity = sim.top_k_item_similarity(matrix, self.k, self.method, self.block_size)
+        logger.debug('Fit item KNN on %d items with %d neighbor pairs', len(item_ids), self.similarity.nnz)
+        return self
+
+    def refit(self, df, previous, items):
+        """Refits the model on a ratings dataset that differs from the one it was fit on only in the ratings of some items.
+        Only the neighbors of items that share a rater with a changed item, before or after, are recomputed: the
+        similarities of any other pair of items are unchanged. Gives the same model as fit(df).
+
+        Arguments:
+            df {pd.DataFrame} -- new ratings with user, item and rating columns, in that order
+            previous {pd.DataFrame} -- ratings the model was fit on, with the same columns
+            items {list} -- ids of the items whose ratings changed
+
+        Returns:
+            refit_ids {np.ndarray} -- ids of the items whose neighbors were recomputed
+        """
+        matrix, item_ids = sim.rating_matrix(df, *df.columns[:3])
+        if not np.array_equal(item_ids, self.item_ids.values):
+            raise ValueError('New ratings must be for the same items, fit the model instead.')
+        changed = self.item_ids.get_indexer(items)
+        changed = changed[changed >= 0]
+        rows = set(changed)
+        for ratings in [matrix, sim.rating_matrix(previous, *previous.columns[:3])[0]]:
+            rows.update((ratings[:, changed].T @ ratings).nonzero()[1]) #items sharing a rater with a changed item
+        rows = np.array(sorted(rows), dtype=np.intp)
+        self.similarity = sim.update_top_k_item_similarity(self.similarity, matrix, rows, self.k, self.method, self.block_size)
+        logger.debug('Refit item KNN neighbors of %d of %d items', len(rows), len(item_ids))
+        return self.item_ids.values[rows]
+
+    def fold_in(self, user_rows, implicit_rating=None):
+        """Scores every item for one user
+
+        Arguments:
+            user_rows {pd.DataFrame} -- the user's ratings with user, item and rating columns, in that order
+            implicit_rating {float} -- if given, the user also rates every item missing from user_rows with this rating.
+                                       An implicit rating of 0 scores the same as no rating (default: {None})
+
+        Returns:
+            model {ItemScores} -- scores for the user, with a Surprise-like test method
+        """
+        user_ids = user_rows.iloc[:, 0].unique()
+        if len(user_ids) != 1:
+            raise ValueError('User rows must be for one user.')
+        positions = self.item_ids.get_indexer(user_rows.iloc[:, 1])
+        if (positions < 0).any():
+            raise ValueError('User ratings must be for items in the data.')
+        ratings = sparse.csr_matrix((user_rows.iloc[:, 2].values.astype(np.float32), ([0] * len(positions), positions)),
+                                    shape=(1, len(self.item_ids)))
+        scores = np.asarray((ratings @ self.similarity).todense()).ravel() #sum of the rated items' neighbor rows
+        if implicit_rating:
+            unrated = np.ones(len(self.item_ids), dtype=np.float32)
+            unrated[positions] = 0
+            scores += implicit_rating * (self.similarity.T @ unrated)
+        return ItemScores(self, user_ids[0], scores)
+
+class ItemScores:
+    """Scores for one user of an ItemKNN, see ItemKNN.fold_in"""
+
+    def __init__(self, base, user_id, scores):
+        self.base = base
+        self.user_id = user_id
+        self.scores = scores
+
+    def estimate_items(self, item_ids):
+        """Scores many items for the user at once, as test does
+
+        Arguments:
+            item_ids {list} -- raw item ids
+
+        Returns:
+            estimates {np.ndarray} -- score of each item, 0 for unknown items
+        """
+        positions = self.base.item_ids.get_indexer(item_ids)
+        estimates = np.zeros(len(positions), dtype=np.float64)
+        estimates[positions >= 0] = self.scores[positions[positions >= 0]]
+        return estimates
+
+    def test(self, testset):
+        """Scores (user, item) pairs, returning them like Surprise's test method. Unknown users and items score 0.
+
+        Arguments:
+            testset {list} -- list of (user, item, rating) tuples, output of train_model.build_testset
+
+        Returns:
+            predictions {list} -- list of surprise.Prediction objects
+        """
+        positions = self.base.item_ids.get_indexer([iid for (_, iid, _) in testset])
+        predictions = []
+        for (uid, iid, r_ui), position in zip(testset, positions):
+            if uid != self.user_id or position < 0:
+                predictions.append(Prediction(uid, iid, r_ui, 0.0, {'was_impossible': True, 'reason': 'User and/or item is unknown.'}))
+            else:
+                predictions.append(Prediction(uid, iid, r_ui, float(self.scores[position]), {'was_impossible': False}))
+        return predictions
+
+def save_model(model, directory):
+    """Saves a fitted IncrementalKNN or ItemKNN to a directory: one .npy file per array, including the raw IDs whose
+    positions are the inner IDs, and a model.json holding the model's class, parameters and the format version.
+    model.json is written last, so a directory without it is incomplete.
+
+    Arguments:
+        model {IncrementalKNN or ItemKNN} -- fitted model
+        directory {str} -- directory to save to
+    """
+    if isinstance(model, IncrementalKNN):
+        params = {'k': model.k, 'min_k': model.min_k, 'min_support': model.min_support, 'rating_scale': list(model.rating_scale)}
+        arrays = {'user_ids': model.user_ids.values, 'item_ids': model.item_ids.values, 'users': model._users,
+                  'items': model._items, 'ratings': model._ratings, 'user_ratings': model._user_ratings}
+    elif isinstance(model, ItemKNN):
+        params = {'k': model.k, 'method': model.method, 'shape': list(model.similarity.shape)}
+        arrays = {'item_ids': model.item_ids.values, 'similarity_data': model.similarity.data,
+                  'similarity_indices': model.similarity.indices, 'similarity_indptr': model.similarity.indptr}
+    else:
+        raise ValueError('Model must be an IncrementalKNN or ItemKNN.')
+    os.makedirs(directory, exist_ok=True)
+    for name, values in arrays.items():
+        values = np.asarray(values)
+        np.save(os.path.join(directory, name + '.npy'), values.astype(str) if values.dtype == object else values) #no pickles
+    with open(os.path.join(directory, 'model.json'), 'w') as f:
+        json.dump({'format': MODEL_FORMAT, 'model': type(model).__name__, 'params': params, 'arrays': sorted(arrays)}, f)
+    logger.info('Saved %s to %s', type(model).__name__, directory)
+
+def load_model(directory, mmap_mode='r'):
+    """Loads a model saved by save_model without refitting it. With mmap_mode, arrays are memory-mapped, so processes
+    loading the same model share one copy of it in memory.
+
+    Arguments:
+        directory {str} -- directory the model was saved in
+        mmap_mode {str} -- mmap_mode of np.load, or None to read the arrays into memory (default: {'r'})
+
+    Returns:
+        model {IncrementalKNN or ItemKNN} -- fitted model
+    """
+    try:
+        with open(os.path.join(directory, 'model.json')) as f:
+            saved = json.load(f)
+    except:
+        raise ValueError('No saved model in {}.'.format(directory))
+    if saved.get('format') != MODEL_FORMAT:
+        raise ValueError('Saved model format {} is not supported.'.format(saved.get('format')))
+    arrays = {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode, allow_pickle=False)
+              for name in saved['arrays']}
+    params = saved['params']
+    if saved['model'] == 'IncrementalKNN':
+        model = IncrementalKNN(params['k'], params['min_k'], params['min_support'], tuple(params['rating_scale']))
+        model.user_ids, model.item_ids = pd.Index(arrays['user_ids']), pd.Index(arrays['item_ids'])
+        model._users, model._items, model._ratings = arrays['users'], arrays['items'], arrays['ratings']
+        model._user_ratings = arrays['user_ratings']
+    elif saved['model'] == 'ItemKNN':
+        model = ItemKNN(params['k'], params['method'])
+        model.item_ids = pd.Index(arrays['item_ids'])
+        model.similarity = sparse.csr_matrix((arrays['similarity_data'], arrays['similarity_indices'], arrays['similarity_indptr']),
+                                             shape=tuple(params['shape']))
+    else:
+        raise ValueError('Saved model must be an IncrementalKNN or ItemKNN.')
+    return model
@@ -0,0 +1,90 @@
+from contextlib import contextmanager
+from bisect import bisect_left
+import threading
+import time
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+class Histogram:
+    """Prometheus-style histogram: cumulative bucket counts, sum and count for each set of label values
+
+    Arguments:
+        name {str} -- metric name
+        description {str} -- help text
+        labelnames {tuple} -- names of the labels observations are split by (default: {()})
+        buckets {tuple} -- sorted upper bounds of the buckets (default: {LATENCY_BUCKETS})
+    """
+
+    def __init__(self, name, description, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        """Records one observation
+
+        Arguments:
+            value {float} -- observed value
+            **labels -- value of each label in labelnames
+        """
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        position = bisect_left(self.buckets, value) #first bucket with upper bound >= value
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Context manager that observes the seconds spent in its block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        """Renders the histogram in the Prometheus text exposition format
+
+        Returns:
+            lines {list} -- lines of text
+        """
+        lines = ['# HELP {} {}'.format(self.name, self.description), '# TYPE {} histogram'.format(self.name)]
+        with self._lock:
+            series = sorted((key, [list(s[0]), s[1], s[2]]) for key, s in self._series.items())
+        for key, (counts, total, count) in series:
+            labels = ['{}="{}"'.format(name, escape(value)) for name, value in zip(self.labelnames, key)]
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                lines.append('{}_bucket{{{}}} {}'.format(self.name, ','.join(labels + ['le="{}"'.format(le)]), cumulative))
+            suffix = '{' + ','.join(labels) + '}' if labels else ''
+            lines.append('{}_sum{} {}'.format(self.name, suffix, repr(float(total))))
+            lines.append('{}_count{} {}'.format(self.name, suffix, count))
+        return lines
+
+def escape(value):
+    """Escapes a label value for the Prometheus text format"""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def render(histograms):
+    """Renders several histograms in the Prometheus text exposition format
+
+    Arguments:
+        histograms {list} -- list of Histogram objects
+
+    Returns:
+        text {str} -- metrics text, ending in a newline
+    """
+    lines = []
+    for histogram in histograms:
+        lines.extend(histogram.render())
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,135 @@
+from datetime import datetime
+import threading
+import shutil
+import logging
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+def new_version():
+    """Creates a version name for a model artifact. Version names sort in the order they were created.
+
+    Returns:
+        version {str} -- UTC timestamp of the form YYYYmmddTHHMMSSffffff
+    """
+    return datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+
+def latest_version(directory):
+    """Finds the latest version saved in a directory of versioned artifacts. Hidden entries, such as
+    versions still being written, are ignored.
+
+    Arguments:
+        directory {str} -- directory holding one subdirectory per version
+
+    Returns:
+        version {str} -- name of the latest version, or None if there are none
+    """
+    if directory is None or not os.path.isdir(directory):
+        return None
+    versions = [name for name in os.listdir(directory)
+                if not name.startswith('.') and os.path.isdir(os.path.join(directory, name))]
+    return max(versions) if versions else None
+
+def staging_path(directory, version):
+    """Path to write a new version to before it is published with publish_version"""
+    return os.path.join(directory, '.' + version + '.tmp')
+
+def publish_version(directory, version, keep=2):
+    """Makes a fully written version visible to readers in one atomic rename, then removes older versions
+
+    Arguments:
+        directory {str} -- directory holding one subdirectory per version
+        version {str} -- version written to staging_path(directory, version)
+        keep {int} -- number of latest versions to keep, see prune_versions (default: {2})
+
+    Returns:
+        path {str} -- path of the published version
+    """
+    path = os.path.join(directory, version)
+    os.rename(staging_path(directory, version), path)
+    logger.info('Published model version %s', path)
+    prune_versions(directory, keep)
+    return path
+
+def prune_versions(directory, keep=2):
+    """Removes all but the latest versions of a directory of versioned artifacts. With the default, the previous
+    version is kept for app processes that have not swapped in the latest one yet. Staged versions are not removed.
+
+    Arguments:
+        directory {str} -- directory holding one subdirectory per version
+        keep {int} -- number of latest versions to keep (default: {2})
+
+    Returns:
+        removed {list} -- names of the removed versions
+    """
+    versions = sorted(name for name in os.listdir(directory)
+                      if not name.startswith('.') and os.path.isdir(os.path.join(directory, name)))
+    removed = versions[:-keep] if keep > 0 else versions
+    for name in removed:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+    if removed:
+        logger.info('Removed %d old model versions from %s', len(removed), directory)
+    return removed
+
+class ModelStore:
+    """Holds the artifact the app serves from and swaps in new versions without a restart. A background thread
+    polls for a new version, builds it and replaces `served`, a (version, artifact) tuple, with a single assignment.
+    Requests that read `served` before the swap finish on the old artifact. A request that needs both the version and
+    the artifact reads `served` once, so it never gets the version of one artifact with another.
+
+    Arguments:
+        load {function} -- called with a version, returns the artifact built for it
+        version {function} -- returns the version that should be served, cheaply
+        interval {float} -- seconds between checks for a new version; 0 turns off watching (default: {60})
+    """
+
+    def __init__(self, load, version, interval=60):
+        self.load = load
+        self.version = version
+        self.interval = interval
+        self.served = (None, None)
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def current(self):
+        """Artifact being served"""
+        return self.served[1]
+
+    @property
+    def current_version(self):
+        """Version of the artifact being served"""
+        return self.served[0]
+
+    def refresh(self):
+        """Builds and swaps in the latest version if it differs from the one being served
+
+        Returns:
+            swapped {bool} -- True if a new version was swapped in
+        """
+        with self._refresh_lock:
+            version = self.version()
+            if self.current is not None and version == self.current_version:
+                return False
+            artifact = self.load(version) #built while the old artifact keeps serving
+            self.served = (version, artifact)
+        logger.info('Serving model version %s', version)
+        return True
+
+    def start(self):
+        """Loads the first version and, if an interval is set, starts watching for new ones"""
+        self.refresh()
+        if self.interval and self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name='model-store-watcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def _watch(self):
+        """Polls for new versions until the process exits"""
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception('Could not load new model version, still serving %s', self.current_version)
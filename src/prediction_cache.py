@@ -0,0 +1,113 @@
+from collections import OrderedDict
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+class PredictionCache:
+    """Bounded LRU cache of recommendations computed on demand. Concurrent requests for a key that is being
+    computed wait for that one computation instead of starting their own.
+
+    Arguments:
+        compute_many {function} -- called with a list of keys, returns a list with the ranked recommendations for each key,
+                                   or None for keys that cannot be computed
+        maxsize {int} -- most keys kept in the cache (default: {1024})
+        persist {function} -- called with a key and its recommendations after each computation, e.g. to write them
+                              through to the DB (default: {None})
+    """
+
+    def __init__(self, compute_many, maxsize=1024, persist=None):
+        self.compute_many = compute_many
+        self.maxsize = maxsize
+        self.persist = persist
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def __contains__(self, key):
+        return key in self._cache
+
+    def get(self, key):
+        """Returns the recommendations for a key, computing them if they are not cached
+
+        Arguments:
+            key {tuple} -- cache key, e.g. the output of recommendation_index.pair_key
+
+        Returns:
+            preds {list} -- ranked recommendations, or None if they cannot be computed
+        """
+        return self.get_many([key])[0]
+
+    def get_many(self, keys):
+        """Returns the recommendations for many keys. Keys that are neither cached nor being computed by another request
+        are computed together in one call to compute_many.
+
+        Arguments:
+            keys {list} -- list of cache keys
+
+        Returns:
+            results {list} -- ranked recommendations for each key, in order, or None if they cannot be computed
+        """
+        results = [None] * len(keys)
+        owned, waiting = OrderedDict(), []
+        with self._lock:
+            for position, key in enumerate(keys):
+                if key in self._cache:
+                    self._cache.move_to_end(key) #mark as most recently used
+                    self.hits += 1
+                    results[position] = self._cache[key]
+                elif key in owned:
+                    owned[key].append(position)
+                elif key in self._pending: #another request is computing this key
+                    waiting.append((position, self._pending[key]))
+                else: #this request computes this key
+                    self._pending[key] = {'done': threading.Event(), 'value': None, 'error': None}
+                    owned[key] = [position]
+                    self.misses += 1
+        if owned:
+            values = self._compute_owned(list(owned))
+            for value, positions in zip(values, owned.values()):
+                for position in positions:
+                    results[position] = value
+        for position, pending in waiting:
+            pending['done'].wait()
+            if pending['error'] is not None:
+                raise pending['error']
+            results[position] = pending['value']
+        return results
+
+    def _compute_owned(self, keys):
+        """Computes keys this request registered as pending, stores them and wakes up requests waiting on them.
+        Returns the computed values, in the order of keys."""
+        pendings = [self._pending[key] for key in keys]
+        try:
+            values = self.compute_many(keys)
+        except Exception as e:
+            with self._lock:
+                for key, pending in zip(keys, pendings):
+                    pending['error'] = e
+                    del self._pending[key]
+                    pending['done'].set()
+            raise
+        with self._lock:
+            for key, pending, value in zip(keys, pendings, values):
+                pending['value'] = value
+                if value is not None:
+                    self._cache[key] = value
+                    if len(self._cache) > self.maxsize:
+                        self._cache.popitem(last=False) #evict least recently used
+                del self._pending[key]
+                pending['done'].set()
+        if self.persist is not None:
+            for key, value in zip(keys, values):
+                if value is not None:
+                    try:
+                        self.persist(key, value)
+                    except Exception:
+                        logger.exception('Could not persist recommendations for %s', key)
+        return values
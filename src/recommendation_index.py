@@ -0,0 +1,107 @@
+from collections import defaultdict
+import logging
+
+logger = logging.getLogger(__name__)
+
+def pair_key(beertype, beer_ids):
+    """Creates the lookup key for a selection of beers of one type. The key does not depend on the order the beers were chosen in.
+
+    Arguments:
+        beertype {str} -- Beer type of the selection
+        beer_ids {list} -- Beer IDs chosen by the user
+
+    Returns:
+        key {tuple} -- (beertype, beer_id_a, beer_id_b, ...) with beer IDs sorted
+    """
+    return (beertype,) + tuple(sorted(int(i) for i in beer_ids))
+
+def parse_selection(selection, typecolname='type', beercolname='beers'):
+    """Validates a selection of beers sent to the API: a beer type and a list of two or more distinct integer Beer IDs
+
+    Arguments:
+        selection {dict} -- selection as sent, e.g. {"type": "Stout", "beers": [12, 3]}
+        typecolname {str} -- key of the beer type (default: {'type'})
+        beercolname {str} -- key of the chosen beer IDs (default: {'beers'})
+
+    Raises:
+        ValueError: if the selection is not a dictionary, has no type, or its beers are not a list of 2+ distinct integers
+
+    Returns:
+        selection {dict} -- dictionary of the beer type as a string and the list of beer IDs
+    """
+    if not isinstance(selection, dict) or typecolname not in selection:
+        raise ValueError('A selection needs a "{}".'.format(typecolname))
+    beer_ids = selection.get(beercolname)
+    if not isinstance(beer_ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in beer_ids):
+        raise ValueError('The "{}" of a selection must be a list of integer Beer IDs.'.format(beercolname))
+    if len(beer_ids) < 2 or len(set(beer_ids)) < len(beer_ids):
+        raise ValueError('A selection needs two or more different beers.')
+    return {typecolname: str(selection[typecolname]), beercolname: beer_ids}
+
+def records_to_dicts(names, data):
+    """Converts column names and a list of rows to a list of dictionaries
+
+    Arguments:
+        names {list} -- column names
+        data {list} -- list of rows, each row a list of values in the order of names
+
+    Returns:
+        records {list} -- list of dictionaries keyed by column name
+    """
+    names = list(names)
+    return [dict(zip(names, row)) for row in data]
+
+def build_pair_index(combinationrows, predrows, typecolname='Type', idcolname='Beer_ID', usercolname='ID', orderby='Pkey'):
+    """Builds an index from a selection of beers straight to its ranked recommendations
+
+    Arguments:
+        combinationrows {list} -- list of dictionaries, rows of the User_Combinations table
+        predrows {list} -- list of dictionaries, rows of the User_Predictions table
+        typecolname {str} -- name of type column (default: {'Type'})
+        idcolname {str} -- name of item id column (default: {'Beer_ID'})
+        usercolname {str} -- name of pseudo-user id column (default: {'ID'})
+        orderby {str} -- name of column giving rank order (default: {'Pkey'})
+
+    Returns:
+        index {dict} -- dictionary of pair_key: list of prediction rows sorted by rank
+    """
+    chosen = defaultdict(list)
+    for row in combinationrows:
+        chosen[(row[typecolname], row[usercolname])].append(row[idcolname]) #beers chosen by each pseudo-user
+    preds = defaultdict(list)
+    for row in sorted(predrows, key=lambda r: r[orderby]):
+        preds[(row[typecolname], row[usercolname])].append(row) #ranked predictions for each pseudo-user
+    index = {}
+    for (beertype, user_id), beer_ids in chosen.items():
+        if (beertype, user_id) in preds:
+            index[pair_key(beertype, beer_ids)] = preds[(beertype, user_id)]
+        else:
+            logger.warning('No predictions found for pseudo-user %s of type %s', user_id, beertype)
+    return index
+
+def lookup_pair(index, beertype, beer_ids):
+    """Finds the ranked recommendations for a selection of beers
+
+    Arguments:
+        index {dict} -- output of build_pair_index
+        beertype {str} -- Beer type of the selection
+        beer_ids {list} -- Beer IDs chosen by the user
+
+    Returns:
+        preds {list} -- ranked prediction rows, or None if the selection is not in the index
+    """
+    return index.get(pair_key(beertype, beer_ids))
+
+def lookup_many(index, selections, typecolname='type', beercolname='beers'):
+    """Resolves many selections against the index, one lookup each
+
+    Arguments:
+        index {dict} -- output of build_pair_index
+        selections {list} -- list of dictionaries, each with a beer type and a list of chosen beer IDs
+        typecolname {str} -- key of the beer type in each selection (default: {'type'})
+        beercolname {str} -- key of the chosen beer IDs in each selection (default: {'beers'})
+
+    Returns:
+        results {list} -- ranked prediction rows for each selection, in input order, or None if a selection is not in the index
+    """
+    return [lookup_pair(index, selection[typecolname], selection[beercolname]) for selection in selections]
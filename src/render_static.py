@@ -0,0 +1,109 @@
+import urllib.parse
+import argparse
+import logging
+import shutil
+import sys
+import os
+
+logger = logging.getLogger(__name__)
+
+def static_page_path(beertype, beer_ids=None):
+    """Path of the pre-rendered page for a beer type, or for a selection of beers of that type, relative to the pages directory.
+    The path does not depend on the order the beers were chosen in.
+
+    Arguments:
+        beertype {str} -- Beer type
+        beer_ids {list} -- Beer IDs chosen by the user, or None for the page listing the type's top ten beers (default: {None})
+
+    Returns:
+        path {str} -- relative path of the page
+    """
+    typename = urllib.parse.quote(beertype, safe='') #no separators or spaces in file names
+    if beer_ids is None:
+        return 'recommender/{}.html'.format(typename)
+    return 'results/{}/{}.html'.format(typename, '-'.join(str(i) for i in sorted(int(i) for i in beer_ids)))
+
+def static_version_dir(version):
+    """Name of the subdirectory of the pages directory holding the pages of a model version
+
+    Arguments:
+        version {tuple} -- version served by the app's model store, see application.model_version
+
+    Returns:
+        name {str} -- directory name, with no separators
+    """
+    return urllib.parse.quote('-'.join(str(part) for part in version), safe='')
+
+def write_page(directory, relpath, html):
+    """Writes a page to a path relative to a directory, creating subdirectories as needed
+
+    Arguments:
+        directory {str} -- pages directory
+        relpath {str} -- output of static_page_path
+        html {str} -- page contents
+    """
+    path = os.path.join(directory, relpath)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(html)
+
+def render_static_pages(pair_keys, render_recommender, render_results, directory, version):
+    """Renders the top ten page of every type and the results page of every precomputed selection into the
+    subdirectory of a directory named for the model version they were rendered from, so the app never serves pages
+    of another version. Pages are written to a staging directory that is then renamed into place. The pages of the
+    previous version are kept until the next render, for app processes that have not swapped in this version yet,
+    and those of older versions are removed.
+
+    Arguments:
+        pair_keys {iterable} -- keys of the recommendation index, (beertype, beer_id_a, beer_id_b, ...)
+        render_recommender {function} -- called with a beer type, returns the top ten page
+        render_results {function} -- called with a pair key, returns the results page
+        directory {str} -- directory to write the pages to
+        version {tuple} -- model version the pages are rendered from
+
+    Returns:
+        npages {int} -- number of pages written
+    """
+    versiondir = static_version_dir(version)
+    path = os.path.join(directory, versiondir)
+    staging, old = path + '.tmp', path + '.old'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    pair_keys = sorted(pair_keys)
+    beertypes = sorted(set(key[0] for key in pair_keys))
+    for beertype in beertypes:
+        write_page(staging, static_page_path(beertype), render_recommender(beertype))
+    for key in pair_keys:
+        write_page(staging, static_page_path(key[0], key[1:]), render_results(key))
+    if os.path.isdir(path):
+        os.rename(path, old)
+    os.rename(staging, path) #the app falls back to rendering pages itself while none are there
+    others = [name for name in os.listdir(directory) if name != versiondir]
+    leftovers = [name for name in others if name.endswith(('.tmp', '.old'))]
+    versions = sorted(set(others) - set(leftovers), key=lambda name: os.path.getmtime(os.path.join(directory, name)), reverse=True)
+    for name in versions[1:] + leftovers: #app processes not yet serving this version keep the previous one's pages
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+    logger.info("Rendered %d pages for %d types to %s", len(beertypes) + len(pair_keys), len(beertypes), path)
+    return len(beertypes) + len(pair_keys)
+
+def run_render(args):
+    """Renders the app's pages for every type and precomputed selection in the DB
+
+    Arguments:
+        args {argparse.Namespace} -- Script arguments
+    """
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from application import app, model_version, load_artifact, recommender_page, results_page
+    version = model_version()
+    pair_index = load_artifact(version)['pair_index'] #built for this version, even if the app's model store swaps
+    with app.test_request_context('/'):
+        render_static_pages(pair_index.keys(), recommender_page, lambda key: results_page(key[0], pair_index[key]),
+                            os.path.join(app.root_path, args.output), version)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(name)s - %(levelname)s - %(asctime)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Pre-render the app's pages")
+    parser.add_argument('--output', default='static_pages', help='directory to write the pages to, relative to the app')
+    args = parser.parse_args()
+
+    run_render(args)
@@ -1,17 +1,22 @@
 from surprise import Dataset, Reader, KNNBasic
-from surprise.model_selection import train_test_split, KFold
 from collections import defaultdict
-from itertools import combinations
 try:
     import train_model as tm 
+    import evaluation as ev
 except:
     import src.train_model as tm
+    import src.evaluation as ev
+import multiprocessing as mp
 import pandas as pd
 import numpy as np
 import argparse
 import logging
+import copy
+import time
 import yaml
 
+logger = logging.getLogger(__name__)
+
 def precision_recall_at_k(predictions, k=10, threshold=3):
     """Returns average precision and recall at k metrics for each user.
     
@@ -59,7 +64,194 @@ def data_model_forcrossvalidation(data, config_train):
     model = KNNBasic(**config_train['create_KNNmodel']) #create knnmodel
     return data, model
 
-def kfold_crossvalidation(data, model, folds=5, k=5, threshold=4):
+def fold_indices(n_ratings, folds=5, random_state=None):
+    """Assigns rating positions to folds the way Surprise's KFold does: shuffled, then cut into folds whose sizes differ by
+    at most one. With a random_state the folds are the same on every run.
+
+    Arguments:
+        n_ratings {int} -- number of ratings
+        folds {int} -- number of folds in cross validation (default: {5})
+        random_state {int} -- seed of the shuffle, or None for a different shuffle each run (default: {None})
+
+    Returns:
+        foldlist {list} -- array of rating positions for each fold
+    """
+    if folds < 2 or folds > n_ratings:
+        raise ValueError('Number of folds must be at least 2 and at most the number of ratings.')
+        logger.error('Re-enter number of folds.')
+    indices = np.arange(n_ratings)
+    np.random.RandomState(random_state).shuffle(indices)
+    sizes = np.full(folds, n_ratings // folds)
+    sizes[:n_ratings % folds] += 1
+    return np.split(indices, np.cumsum(sizes)[:-1])
+
+_fold = {} #state of a scoring process, set by init_fold_worker
+
+def init_fold_worker(data, model, foldlist, k=5, threshold=4, grid=None):
+    """Gives a scoring process the data, unfitted model and folds once, before it runs any fold_task or sweep_task
+
+    Arguments:
+        data {surprise.dataset.DatasetAutoFolds} -- Surprise Dataset
+        model {surprise.prediction_algorithms.knns.KNNBasic} -- Surprise KNNBasic model, copied for each fold
+        foldlist {list} -- output of fold_indices
+        k {int} -- number of metrics -- (default: {5})
+        threshold {int} -- ratings threshold -- (default {4})
+        grid {list} -- (k, min_k) neighbor settings evaluated by sweep_task (default: {None})
+    """
+    _fold.update(data=data, model=model, foldlist=foldlist, k=k, threshold=threshold, grid=grid)
+
+def fold_sets(i):
+    """Builds the trainset of every fold but fold i and the testset of fold i, as Surprise's KFold does"""
+    data, foldlist = _fold['data'], _fold['foldlist']
+    trainset = data.construct_trainset([data.raw_ratings[j] for j in np.concatenate(foldlist[:i] + foldlist[i + 1:])])
+    testset = data.construct_testset([data.raw_ratings[j] for j in foldlist[i]])
+    return trainset, testset
+
+def fold_task(i):
+    """Fits a copy of the model on every fold but fold i and scores it on fold i
+
+    Arguments:
+        i {int} -- fold number
+
+    Returns:
+        scores {dict} -- fold number, average precision, recall, NDCG and average precision of its users, see
+                         evaluation.ranking_metrics, number of test ratings and seconds taken
+    """
+    start = time.perf_counter()
+    trainset, testset = fold_sets(i)
+    model = copy.deepcopy(_fold['model']) #a model instance per fold
+    model.fit(trainset) #fit model on trainset
+    scores = ev.ranking_metrics(*ev.prediction_arrays(model.test(testset)), k=_fold['k'], threshold=_fold['threshold'])
+    return dict(scores, fold=i, ratings=len(testset), seconds=time.perf_counter() - start)
+
+def grid_estimates(model, testset, grid):
+    """Estimates a testset with a fitted KNNBasic for several (k, min_k) settings at once. Neither setting changes the
+    similarities, only how many of each rating's nearest neighbors are averaged, so each rating's neighbors are sorted
+    once and every setting reads its average off running sums. Gives the same estimates as model.test with model.k and
+    model.min_k set to each setting.
+
+    Arguments:
+        model {surprise.prediction_algorithms.knns.KNNBasic} -- fitted Surprise KNNBasic model
+        testset {list} -- list of (user, item, rating) tuples
+        grid {list} -- list of (k, min_k) tuples
+
+    Returns:
+        estimates {np.ndarray} -- estimate of each rating for each setting, one row per setting
+    """
+    ks, min_ks = np.array([k for k, _ in grid]), np.array([min_k for _, min_k in grid])
+    if (ks < 1).any():
+        raise ValueError('Number of neighbors k must be at least 1.')
+        logger.error('Re-enter k values.')
+    trainset = model.trainset
+    estimates = np.full((len(grid), len(testset)), trainset.global_mean) #default prediction when impossible
+    for t, (uid, iid, _) in enumerate(testset):
+        try:
+            x, y = model.switch(trainset.to_inner_uid(uid), trainset.to_inner_iid(iid))
+        except ValueError: #unknown user or item
+            continue
+        others, ratings = zip(*model.yr[y])
+        sims = model.sim[x, list(others)]
+        order = np.argsort(-sims, kind='stable') #the order heapq.nlargest takes neighbors in
+        sims, ratings = sims[order], np.asarray(ratings)[order]
+        positive = sims > 0 #only positive similarities are averaged
+        sum_sim = np.cumsum(np.where(positive, sims, 0))
+        sum_ratings = np.cumsum(np.where(positive, sims * ratings, 0))
+        actual_k = np.cumsum(positive)
+        last = np.minimum(ks, len(sims)) - 1
+        possible = (actual_k[last] >= min_ks) & (sum_sim[last] > 0)
+        estimates[possible, t] = sum_ratings[last][possible] / sum_sim[last][possible]
+    return np.clip(estimates, *trainset.rating_scale)
+
+def sweep_task(task):
+    """Fits a copy of the model on every fold but one, with one user_based setting, and scores it on that fold for
+    every (k, min_k) setting
+
+    Arguments:
+        task {tuple} -- (fold number, user_based)
+
+    Returns:
+        scores {list} -- dictionary of fold number, settings, output of evaluation.ranking_metrics and seconds taken for each (k, min_k)
+    """
+    start = time.perf_counter()
+    i, user_based = task
+    trainset, testset = fold_sets(i)
+    model = copy.deepcopy(_fold['model'])
+    model.sim_options = dict(model.sim_options, user_based=user_based)
+    model.fit(trainset) #similarities do not depend on k or min_k
+    estimates = grid_estimates(model, testset, _fold['grid'])
+    uids, _, ratings = ev.prediction_arrays([(uid, iid, r, None, None) for (uid, iid, r) in testset])
+    scores = []
+    for (k, min_k), row in zip(_fold['grid'], estimates):
+        metrics = ev.ranking_metrics(uids, row, ratings, _fold['k'], _fold['threshold'])
+        scores.append(dict(metrics, fold=i, user_based=user_based, k=k, min_k=min_k))
+    seconds = time.perf_counter() - start
+    logger.info('Fold %d, user_based %s: %d settings in %0.2f seconds', i, user_based, len(scores), seconds)
+    return [dict(score, seconds=seconds) for score in scores]
+
+def fold_scores(data, model, folds=5, k=5, threshold=4, random_state=None, workers=None):
+    """Scores a KNN surprise model on each fold of a K fold crossvalidation, each fold with its own copy of the model.
+    Folds are scored concurrently when workers is more than 1, with the same scores.
+
+    Arguments:
+        data {surprise.dataset.DatasetAutoFolds} -- Surprise Dataset
+        model {surprise.prediction_algorithms.knns.KNNBasic} -- Surprise KNNBasic model
+        folds {int} -- number of folds in cross validation (default: {5})
+        k {int} -- number of metrics -- (default: {5})
+        threshold {int} -- ratings threshold -- (default {4})
+        random_state {int} -- seed of the fold assignment, see fold_indices (default: {None})
+        workers {int} -- number of processes to score folds in (default: {None})
+
+    Returns:
+        scores {list} -- output of fold_task for each fold, in order
+    """
+    foldlist = fold_indices(len(data.raw_ratings), folds, random_state)
+    initargs = (data, model, foldlist, k, threshold)
+    if workers is not None and workers > 1:
+        with mp.Pool(min(workers, folds), initializer=init_fold_worker, initargs=initargs) as pool:
+            scores = pool.map(fold_task, range(folds))
+    else:
+        init_fold_worker(*initargs)
+        scores = list(map(fold_task, range(folds)))
+    for score in scores:
+        logger.info('Fold %d: precision %0.3f, recall %0.3f, NDCG %0.3f, MAP %0.3f on %d ratings in %0.2f seconds', score['fold'],
+                    score['precision'], score['recall'], score['ndcg'], score['map'], score['ratings'], score['seconds'])
+    return scores
+
+def sweep_scores(data, model, grid, folds=5, k=5, threshold=4, random_state=None, workers=None):
+    """Cross validates every combination of user_based, k and min_k settings of a KNN surprise model, fitting it once
+    per fold and user_based setting, see grid_estimates. Tasks are run concurrently when workers is more than 1.
+
+    Arguments:
+        data {surprise.dataset.DatasetAutoFolds} -- Surprise Dataset
+        model {surprise.prediction_algorithms.knns.KNNBasic} -- Surprise KNNBasic model
+        grid {dict} -- lists of user_based, k and min_k settings
+        folds {int} -- number of folds in cross validation (default: {5})
+        k {int} -- number of metrics -- (default: {5})
+        threshold {int} -- ratings threshold -- (default {4})
+        random_state {int} -- seed of the fold assignment, see fold_indices (default: {None})
+        workers {int} -- number of processes to run tasks in (default: {None})
+
+    Returns:
+        table {pd.DataFrame} -- average precision, recall, NDCG and MAP over folds for each setting, in the order of grid
+    """
+    try:
+        settings = [(n, min_n) for n in grid['k'] for min_n in grid['min_k']]
+        tasks = [(i, user_based) for user_based in grid['user_based'] for i in range(folds)]
+    except:
+        raise KeyError('Grid must have user_based, k and min_k lists.')
+        logger.error('Re-enter grid.')
+    foldlist = fold_indices(len(data.raw_ratings), folds, random_state)
+    initargs = (data, model, foldlist, k, threshold, settings)
+    if workers is not None and workers > 1:
+        with mp.Pool(min(workers, len(tasks)), initializer=init_fold_worker, initargs=initargs) as pool:
+            scores = pool.map(sweep_task, tasks)
+    else:
+        init_fold_worker(*initargs)
+        scores = list(map(sweep_task, tasks))
+    scores = pd.DataFrame([score for taskscores in scores for score in taskscores])
+    return scores.groupby(['user_based', 'k', 'min_k'], sort=False)[['precision', 'recall', 'ndcg', 'map']].mean().reset_index()
+
+def kfold_crossvalidation(data, model, folds=5, k=5, threshold=4, random_state=None, workers=None):
     """Preforms K fold crossvalidation on a KNN surprise model and returns average precision and recall.
     
     Arguments:
@@ -68,44 +260,51 @@ def kfold_crossvalidation(data, model, folds=5, k=5, threshold=4):
         folds {int} -- number of folds in cross validation (default: {5})
         k {int} -- number of metrics -- (default: {10})
         threshold {int} -- ratings threshold -- (default {3})
+        random_state {int} -- seed of the fold assignment, see fold_indices (default: {None})
+        workers {int} -- number of processes to score folds in (default: {None})
     
     Returns:
         Tuple consisting of:
         average_precision {float} -- Average precision of the model
         average_recall {float} -- Average recall of the model
     """
-    kf = KFold(n_splits=folds)
-    preclist = []
-    reclist = []
-    for trainset, testset in kf.split(data): #cross validation splits
-        model.fit(trainset) #fit model on trainset
-        predictions = model.test(testset)
-        precisions, recalls = precision_recall_at_k(predictions, k=k, threshold=threshold)
-        total_precision = (sum(prec for prec in precisions.values()) / len(precisions))
-        total_recall = (sum(rec for rec in recalls.values()) / len(recalls))
-        preclist.append(total_precision)
-        reclist.append(total_recall)
-    average_precision = np.mean(preclist)
-    average_recall = np.mean(reclist)
-    return average_precision, average_recall
-
-def create_output(data, model, outputtxt, config):
-    """Creates model scoring output of precision and recall
+    return average_scores(fold_scores(data, model, folds, k, threshold, random_state, workers))
+
+def average_scores(scores):
+    """Averages precision and recall over folds
+
+    Arguments:
+        scores {list} -- output of fold_scores
+
+    Returns:
+        Tuple consisting of:
+        average_precision {float} -- Average precision of the model
+        average_recall {float} -- Average recall of the model
+    """
+    return np.mean([score['precision'] for score in scores]), np.mean([score['recall'] for score in scores])
+
+def create_output(data, model, outputtxt, config, workers=None):
+    """Creates model scoring output of precision and recall, on average and for each fold
     
     Arguments:
         data {surprise.dataset.DatasetAutoFolds} -- Surprise Dataset
         model {surprise.prediction_algorithms.knns.KNNBasic} -- Surprise KNNBasic model
         outputtxt {str} -- File path for output text file
         config {dict} -- Dictionary of configurations corresponding to the score_model script
+        workers {int} -- number of processes to score folds in (default: {None})
     
     Raises:
         ValueError: "Path to textfile for outputtxt data must be provided through --outputtxt
     """
-    average_precision, average_recall = kfold_crossvalidation(data, model, **config['kfold_crossvalidation'])
+    scores = fold_scores(data, model, workers=workers, **config['kfold_crossvalidation'])
+    average_precision, average_recall = average_scores(scores)
     if outputtxt is not None:
         with open(outputtxt, "w") as f:
             print('Average Precision of Model: %0.3f' % average_precision, file = f)
             print('Average Recall of Model: %0.3f' % average_recall, file = f)
+            for score in scores:
+                print('Fold %d: Precision %0.3f, Recall %0.3f, NDCG %0.3f, MAP %0.3f, %d ratings, %0.2f seconds' % (score['fold'],
+                      score['precision'], score['recall'], score['ndcg'], score['map'], score['ratings'], score['seconds']), file = f)
         logger.info('Model evaluation saved to text file.')
     else:
         raise ValueError("Path to textfile for outputtxt data must be provided through --outputtxt")
@@ -120,6 +319,10 @@ def run_scoring(args):
         ValueError: "Path to yaml config file must be provided through --config" if args.config not specified
         ValueError: "Path to CSV for input data must be provided through --input" if args.input not specified
         ValueError: "Path to textfile for outputtxt data must be provided through --outputtxt" if args.outputtxt not specified
+
+    If args.workers is more than 1, folds are scored in that many processes, with the same scores.
+    If args.output_sweep is specified, every setting under sweep in the config is cross validated instead, and the table of
+    their precision and recall is saved there.
     """
     if args.config is not None:
         with open(args.config, "r") as f:
@@ -135,8 +338,13 @@ def run_scoring(args):
         raise ValueError("Path to CSV for input data must be provided through --input")
     typedata = tm.filter_data(data, config_score['test_type'], **config_train['filter_data'])
     finaldata, model = data_model_forcrossvalidation(typedata, config_train)
-    if args.outputtxt is not None:
-        create_output(finaldata, model, args.outputtxt, config_score)
+    if getattr(args, 'output_sweep', None) is not None: #sweep mode
+        table = sweep_scores(finaldata, model, config_score['sweep'], workers=getattr(args, 'workers', None),
+                             **config_score['kfold_crossvalidation'])
+        table.to_csv(args.output_sweep, index=False)
+        logger.info('Sweep of %d settings saved to %s.', len(table), args.output_sweep)
+    elif args.outputtxt is not None:
+        create_output(finaldata, model, args.outputtxt, config_score, getattr(args, 'workers', None))
     else:
         raise ValueError("Path to textfile for outputtxt data must be provided through --outputtxt")
 
@@ -147,6 +355,8 @@ if __name__ == "__main__":
     parser.add_argument('--config', default='config.yml', help='config.yml')
     parser.add_argument('--input', default='data/cleaned_beer_reviews.csv', help='config.yml')
     parser.add_argument('--outputtxt', default='data/modelscoring.txt', help='config.yml')
+    parser.add_argument('--workers', default=None, type=int, help='number of processes to score folds in')
+    parser.add_argument('--output_sweep', default=None, help='CSV of precision and recall for each setting under sweep in config.yml')
     args = parser.parse_args()
 
     run_scoring(args)
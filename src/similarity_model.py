@@ -0,0 +1,442 @@
+from scipy import sparse
+import numpy as np
+import pandas as pd
+import logging
+import json
+import os
+
+logger = logging.getLogger(__name__)
+
+ITEM_TABLE_DIR = 'items' #subdirectory of a model version holding the item table of each category
+SIMILARITY_FORMAT = 1 #version of the layout written by save_similarity_model
+
+def rating_matrix(df, usercolname='Reviewer', idcolname='Beer_ID', reviewcolname='Mean_Review'):
+    """Creates a sparse user by item rating matrix from a reviews dataframe. Repeated reviews of an item by a user are averaged.
+
+    Arguments:
+        df {pd.DataFrame} -- Pandas DataFrame of reviews
+        usercolname {str} -- column name for users (default: {'Reviewer'})
+        idcolname {str} -- column name for item ID (default: {'Beer_ID'})
+        reviewcolname {str} -- column name for reviews (default: {'Mean_Review'})
+
+    Returns:
+        matrix {scipy.sparse.csr_matrix} -- user by item rating matrix
+        item_ids {np.ndarray} -- sorted item IDs, one per matrix column
+    """
+    try:
+        ratings = df.groupby([usercolname, idcolname])[reviewcolname].mean().reset_index() #one rating per user and item
+    except KeyError:
+        raise KeyError('Column names are incorrect.')
+    user_codes, _ = pd.factorize(ratings[usercolname], sort=True)
+    item_codes, item_ids = pd.factorize(ratings[idcolname], sort=True)
+    matrix = sparse.csr_matrix((ratings[reviewcolname].values.astype(np.float32), (user_codes, item_codes)),
+                               shape=(user_codes.max() + 1, len(item_ids)))
+    return matrix, np.asarray(item_ids)
+
+def center_items(matrix):
+    """Subtracts each item's mean rating from its ratings. Only stored ratings are centered, missing ratings stay missing.
+
+    Arguments:
+        matrix {scipy.sparse.csr_matrix} -- user by item rating matrix
+
+    Returns:
+        centered {scipy.sparse.csr_matrix} -- user by item matrix of mean-centered ratings
+    """
+    centered = matrix.tocsc(copy=True)
+    counts = np.diff(centered.indptr)
+    means = np.asarray(centered.sum(axis=0)).ravel() / np.maximum(counts, 1)
+    centered.data -= np.repeat(means, counts).astype(centered.dtype)
+    return centered.tocsr()
+
+def item_norms(matrix, method='cosine'):
+    """Prepares a rating matrix for item similarities: centers it for Pearson similarity and finds each item's norm
+
+    Arguments:
+        matrix {scipy.sparse.csr_matrix} -- user by item rating matrix
+        method {str} -- 'cosine', or 'pearson' for the cosine of ratings centered on each item's mean (default: {'cosine'})
+
+    Returns:
+        matrix {scipy.sparse.csr_matrix} -- user by item rating matrix, centered if method is 'pearson'
+        norms {np.ndarray} -- norm of each item's ratings, 1 for items without any
+    """
+    if method == 'pearson':
+        matrix = center_items(matrix)
+    elif method != 'cosine':
+        raise ValueError('Similarity method must be cosine or pearson.')
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    norms[norms == 0] = 1
+    return matrix, norms
+
+def block_similarity(matrix, norms, rows):
+    """Computes the similarity of a block of items to every item
+
+    Arguments:
+        matrix {scipy.sparse.csr_matrix} -- user by item rating matrix, output of item_norms
+        norms {np.ndarray} -- norm of each item's ratings, output of item_norms
+        rows {np.ndarray} -- positions of the items in the block
+
+    Returns:
+        similarity {np.ndarray} -- dense block by item float32 similarity matrix, zero for an item and itself
+    """
+    similarity = np.asarray((matrix[:, rows].T @ matrix).todense(), dtype=np.float32)
+    similarity /= norms[rows, None]
+    similarity /= norms[None, :]
+    similarity[np.arange(len(rows)), rows] = 0
+    return similarity
+
+def item_similarity(matrix, method='cosine'):
+    """Computes the similarity between every pair of items (columns) of a rating matrix
+
+    Arguments:
+        matrix {scipy.sparse.csr_matrix} -- user by item rating matrix
+        method {str} -- 'cosine', or 'pearson' for the cosine of ratings centered on each item's mean (default: {'cosine'})
+
+    Returns:
+        similarity {np.ndarray} -- dense item by item float32 similarity matrix with a zero diagonal
+    """
+    matrix, norms = item_norms(matrix, method)
+    return block_similarity(matrix, norms, np.arange(matrix.shape[1]))
+
+def top_k_similarity(similarity, k=50):
+    """Keeps each item's k most similar neighbors with a positive similarity
+
+    Arguments:
+        similarity {np.ndarray} -- dense item by item similarity matrix with a zero diagonal, output of item_similarity,
+                                   or some rows of it, output of block_similarity
+        k {int} -- most neighbors kept per item (default: {50})
+
+    Returns:
+        similarity {scipy.sparse.csr_matrix} -- sparse item by item similarity matrix, row i holding item i's neighbors
+    """
+    if k < 1:
+        raise ValueError('k must be at least 1.')
+    nrows, nitems = similarity.shape
+    k = min(k, nitems)
+    top = np.argpartition(-similarity, k - 1, axis=1)[:, :k] #unordered k most similar per item
+    values = np.take_along_axis(similarity, top, axis=1).ravel()
+    rows = np.repeat(np.arange(nrows), k)
+    positive = values > 0
+    return sparse.csr_matrix((values[positive], (rows[positive], top.ravel()[positive])), shape=similarity.shape)
+
+def top_k_item_similarity(matrix, k=50, method='cosine', block_size=1000):
+    """Keeps each item's k most similar neighbors with a positive similarity, computing similarities for one block of
+    items at a time. The full item by item matrix is never held in memory, only block_size rows of it and k neighbors
+    per item. Gives the same matrix as top_k_similarity(item_similarity(matrix, method), k).
+
+    Arguments:
+        matrix {scipy.sparse.csr_matrix} -- user by item rating matrix
+        k {int} -- most neighbors kept per item (default: {50})
+        method {str} -- 'cosine' or 'pearson', see item_similarity (default: {'cosine'})
+        block_size {int} -- number of items whose similarities are computed at once (default: {1000})
+
+    Returns:
+        similarity {scipy.sparse.csr_matrix} -- sparse item by item float32 similarity matrix, row i holding item i's neighbors
+    """
+    if block_size < 1:
+        raise ValueError('Block size must be at least 1.')
+    matrix, norms = item_norms(matrix, method)
+    nitems = matrix.shape[1]
+    blocks = [top_k_similarity(block_similarity(matrix, norms, np.arange(start, min(start + block_size, nitems))), k)
+              for start in range(0, nitems, block_size)]
+    if not blocks:
+        return sparse.csr_matrix((0, 0), dtype=np.float32)
+    return sparse.vstack(blocks, format='csr')
+
+def update_top_k_item_similarity(similarity, matrix, rows, k=50, method='cosine', block_size=1000):
+    """Recomputes some rows of the output of top_k_item_similarity for a new rating matrix and keeps the others. The result
+    is the same as top_k_item_similarity(matrix, k, method) if the rows kept are those whose similarities did not change.
+
+    Arguments:
+        similarity {scipy.sparse.csr_matrix} -- output of top_k_item_similarity for the old rating matrix
+        matrix {scipy.sparse.csr_matrix} -- new user by item rating matrix, with the same items
+        rows {np.ndarray} -- sorted positions of the items whose neighbors are recomputed
+        k {int} -- most neighbors kept per item (default: {50})
+        method {str} -- 'cosine' or 'pearson', see item_similarity (default: {'cosine'})
+        block_size {int} -- number of items whose similarities are computed at once (default: {1000})
+
+    Returns:
+        similarity {scipy.sparse.csr_matrix} -- sparse item by item float32 similarity matrix, row i holding item i's neighbors
+    """
+    if matrix.shape[1] != similarity.shape[0]:
+        raise ValueError('The new rating matrix must have the same items.')
+    matrix, norms = item_norms(matrix, method)
+    rows = np.asarray(rows, dtype=np.intp)
+    fresh = [top_k_similarity(block_similarity(matrix, norms, rows[start:start + block_size]), k)
+             for start in range(0, len(rows), block_size)]
+    fresh = sparse.vstack(fresh, format='csr') if fresh else None
+    pieces, previous = [], 0
+    for position, row in enumerate(rows): #unchanged rows are copied in runs, recomputed rows one by one
+        if row > previous:
+            pieces.append(similarity[previous:row])
+        pieces.append(fresh[position:position + 1])
+        previous = row + 1
+    if previous < similarity.shape[0]:
+        pieces.append(similarity[previous:])
+    return sparse.vstack(pieces, format='csr') if pieces else similarity.copy()
+
+def build_similarity_model(df, toplist=None, k=50, method='cosine', block_size=1000, similarity=None,
+                           usercolname='Reviewer', idcolname='Beer_ID', reviewcolname='Mean_Review'):
+    """Builds the item-item similarity structure used to score any selection of items online. The similarity is computed
+    block_size items at a time by top_k_item_similarity, so the full item by item matrix is never held in memory.
+    Item columns are not part of it, they are joined from the item table saved with it, see join_item_table.
+
+    Arguments:
+        df {pd.DataFrame} -- Pandas DataFrame of reviews for one category
+        toplist {list} -- IDs of top items that are shown to the user and never recommended (default: {None})
+        k {int} -- most neighbors kept per item (default: {50})
+        method {str} -- 'cosine' or 'pearson', see item_similarity (default: {'cosine'})
+        block_size {int} -- number of items whose similarities are computed at once (default: {1000})
+        similarity {scipy.sparse.csr_matrix} -- output of top_k_item_similarity with the same reviews, k and method, e.g. a
+                                                fitted knn_engine.ItemKNN's, to use instead of computing it again (default: {None})
+        usercolname {str} -- column name for users (default: {'Reviewer'})
+        idcolname {str} -- column name for item ID (default: {'Beer_ID'})
+        reviewcolname {str} -- column name for reviews (default: {'Mean_Review'})
+
+    Returns:
+        model {dict} -- dictionary of item_ids, similarity (sparse item by item matrix of each item's k nearest neighbors)
+                        and exclude
+    """
+    matrix, item_ids = rating_matrix(df, usercolname, idcolname, reviewcolname)
+    if similarity is None:
+        similarity = top_k_item_similarity(matrix, k, method, block_size)
+    elif similarity.shape != (len(item_ids), len(item_ids)):
+        raise ValueError('The similarity must be for the items reviewed.')
+    return {'item_ids': item_ids, 'similarity': similarity,
+            'exclude': np.asarray(toplist if toplist is not None else [], dtype=item_ids.dtype)}
+
+def refresh_similarity(model, df, items, k=50, method='cosine', block_size=1000, usercolname='Reviewer', idcolname='Beer_ID',
+                       reviewcolname='Mean_Review'):
+    """Recomputes the neighbors of some items of a similarity model after new reviews of the same items, see
+    update_top_k_item_similarity. Gives the similarity build_similarity_model would compute from df if the items are
+    all those whose similarities changed.
+
+    Arguments:
+        model {dict} -- output of build_similarity_model or load_similarity_model, for the reviews before the new ones
+        df {pd.DataFrame} -- Pandas DataFrame of reviews for one category, with the new reviews
+        items {list} -- IDs of the items whose neighbors are recomputed
+        k, method, block_size, usercolname, idcolname, reviewcolname -- as given to build_similarity_model
+
+    Returns:
+        similarity {scipy.sparse.csr_matrix} -- sparse item by item matrix of each item's k nearest neighbors
+    """
+    matrix, item_ids = rating_matrix(df, usercolname, idcolname, reviewcolname)
+    if not np.array_equal(item_ids, model['item_ids']):
+        raise ValueError('New reviews must be for the same items, build the similarity model instead.')
+    rows = np.unique(item_positions(model, items)) if len(items) else np.array([], dtype=np.intp)
+    return update_top_k_item_similarity(model['similarity'], matrix, rows, k, method, block_size)
+
+def join_item_table(model, itemtable):
+    """Adds the columns of an item table to a similarity model, one array per column in the order of the model's items,
+    so they are returned with recommendations
+
+    Arguments:
+        model {dict} -- output of build_similarity_model or load_similarity_model
+        itemtable {pd.DataFrame} -- item columns indexed by item ID, output of train_model.item_table or load_item_table
+
+    Returns:
+        model {dict} -- the model with one more array per item column
+    """
+    items = itemtable[~itemtable.index.duplicated()].reindex(model['item_ids'])
+    if items.isnull().all(axis=1).any():
+        raise ValueError('The item table must have every item of the model.')
+    model = dict(model)
+    for col, values in items.fillna(value=0).items():
+        model[col] = values.values.astype(str) if values.dtype == object else values.values #numpy scalars, as loaded
+    return model
+
+def save_similarity_model(model, directory):
+    """Saves a similarity model to a directory: one .npy file per array, the sparse similarity as its data, indices and
+    indptr arrays, and a model.json holding the format version. model.json is written last, so a directory without it
+    is incomplete.
+
+    Arguments:
+        model {dict} -- output of build_similarity_model
+        directory {str} -- directory to save to
+    """
+    arrays = {name: values for name, values in model.items() if name != 'similarity'}
+    similarity = model['similarity']
+    arrays.update(similarity_data=similarity.data, similarity_indices=similarity.indices, similarity_indptr=similarity.indptr)
+    os.makedirs(directory, exist_ok=True)
+    for name, values in arrays.items():
+        np.save(os.path.join(directory, name + '.npy'), np.asarray(values))
+    with open(os.path.join(directory, 'model.json'), 'w') as f:
+        json.dump({'format': SIMILARITY_FORMAT, 'arrays': sorted(arrays)}, f)
+    logger.info('Saved similarity model to %s', directory)
+
+def load_similarity_model(directory, mmap_mode='r'):
+    """Loads a similarity model saved by save_similarity_model. With mmap_mode, arrays are memory-mapped, so processes
+    loading the same model share one copy of it in memory.
+
+    Arguments:
+        directory {str} -- directory the model was saved in
+        mmap_mode {str} -- mmap_mode of np.load, or None to read the arrays into memory (default: {'r'})
+
+    Raises:
+        ValueError: if there is no model in the directory, or it was saved in another format
+
+    Returns:
+        model {dict} -- dictionary of arrays and the sparse similarity, as built by build_similarity_model
+    """
+    try:
+        with open(os.path.join(directory, 'model.json')) as f:
+            saved = json.load(f)
+    except:
+        raise ValueError('No saved similarity model in {}.'.format(directory))
+    if saved.get('format') != SIMILARITY_FORMAT:
+        raise ValueError('Saved similarity model format {} is not supported.'.format(saved.get('format')))
+    arrays = {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode, allow_pickle=False)
+              for name in saved['arrays']}
+    model = {name: values for name, values in arrays.items() if not name.startswith('similarity_')}
+    nitems = len(model['item_ids'])
+    model['similarity'] = sparse.csr_matrix((arrays['similarity_data'], arrays['similarity_indices'], arrays['similarity_indptr']),
+                                            shape=(nitems, nitems))
+    return model
+
+def load_similarity_models(directory, mmap_mode='r'):
+    """Loads every similarity model saved with a version, keyed by category, joined with the item table saved with it.
+    Each model is saved in a subdirectory named after its category.
+
+    Arguments:
+        directory {str} -- version directory the models were saved in
+        mmap_mode {str} -- mmap_mode of np.load, or None to read the arrays into memory (default: {'r'})
+
+    Returns:
+        models {dict} -- dictionary of category: model. Empty if the directory does not exist.
+    """
+    models = {}
+    if directory is None or not os.path.isdir(directory):
+        logger.warning('No similarity models found in %s', directory)
+        return models
+    itemtables = load_item_tables(directory)
+    for category in sorted(os.listdir(directory)):
+        if os.path.isfile(os.path.join(directory, category, 'model.json')):
+            models[category] = load_similarity_model(os.path.join(directory, category), mmap_mode)
+            if category in itemtables:
+                models[category] = join_item_table(models[category], itemtables[category])
+    logger.info('Loaded similarity models for %d categories', len(models))
+    return models
+
+def save_item_table(itemtable, path):
+    """Saves a table of item columns indexed by item ID to a .npz file, one array per column
+
+    Arguments:
+        itemtable {pd.DataFrame} -- output of train_model.item_table
+        path {str} -- file path to save to
+    """
+    arrays = {}
+    for name, values in [(itemtable.index.name, itemtable.index.values)] + [(col, itemtable[col].values) for col in itemtable.columns]:
+        arrays[name] = values.astype(str) if values.dtype == object else values #plain string arrays load without pickle
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez(path, **arrays)
+    logger.info('Saved item table to %s', path)
+
+def load_item_table(path):
+    """Loads an item table saved by save_item_table
+
+    Arguments:
+        path {str} -- file path of the .npz file
+
+    Returns:
+        itemtable {pd.DataFrame} -- item columns indexed by item ID
+    """
+    with np.load(path, allow_pickle=False) as f:
+        return pd.DataFrame({name: f[name] for name in f.files[1:]}, index=pd.Index(f[f.files[0]], name=f.files[0]))
+
+def load_item_tables(directory):
+    """Loads every item table saved with a version of similarity models, keyed by category
+
+    Arguments:
+        directory {str} -- directory the similarity models were saved in
+
+    Returns:
+        itemtables {dict} -- dictionary of category: item table. Empty if there are none.
+    """
+    directory = os.path.join(directory, ITEM_TABLE_DIR) if directory is not None else None
+    if directory is None or not os.path.isdir(directory):
+        return {}
+    return {filename[:-len('.npz')]: load_item_table(os.path.join(directory, filename))
+            for filename in sorted(os.listdir(directory)) if filename.endswith('.npz')}
+
+def item_positions(model, item_ids):
+    """Finds the positions of items in a similarity model
+
+    Arguments:
+        model {dict} -- output of build_similarity_model or load_similarity_model
+        item_ids {list} -- item IDs to find
+
+    Returns:
+        positions {np.ndarray} -- position of each item in the model's arrays
+    """
+    item_ids = np.asarray(item_ids, dtype=model['item_ids'].dtype)
+    positions = np.minimum(np.searchsorted(model['item_ids'], item_ids), len(model['item_ids']) - 1)
+    if len(item_ids) == 0 or not np.array_equal(model['item_ids'][positions], item_ids):
+        raise ValueError('Chosen items are not in the model.')
+    return positions
+
+def score_selections(model, selections, n=10):
+    """Scores many selections of items against a similarity model at once and returns the top n items for each.
+    An item's score is the sum of its similarities to the chosen items that have it among their k nearest neighbors,
+    so only items with a positive score, neighbors of the selection, are returned. Chosen and excluded items never are.
+
+    Arguments:
+        model {dict} -- output of build_similarity_model or load_similarity_model
+        selections {list} -- list of lists of chosen item IDs
+        n {int} -- number of recommendations per selection (default: {10})
+
+    Returns:
+        results {list} -- for each selection, a list of at most n dictionaries holding the item ID, score and item columns, best first
+    """
+    item_ids = model['item_ids']
+    rows, cols = [], []
+    for row, chosen in enumerate(selections):
+        positions = item_positions(model, chosen)
+        rows.extend([row] * len(positions))
+        cols.extend(positions)
+    chosen_matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(len(selections), len(item_ids)))
+    scores = (chosen_matrix @ model['similarity']).toarray() #sum of the chosen items' neighbor rows
+    scores[chosen_matrix.nonzero()] = -np.inf #never recommend chosen items
+    scores[:, np.isin(item_ids, model['exclude'])] = -np.inf #never recommend excluded items
+    n = min(n, len(item_ids))
+    top = np.argpartition(-scores, n - 1, axis=1)[:, :n] #unordered top n per selection
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    top = np.take_along_axis(top, order, axis=1)
+    columns = [name for name in model if name not in ('item_ids', 'similarity', 'exclude')]
+    results = []
+    for row in range(len(selections)):
+        recommendations = []
+        for position in top[row]:
+            if not scores[row, position] > 0: #not a neighbor of any chosen item, or chosen or excluded
+                continue
+            recommendation = {'Beer_ID': item_ids[position].item(), 'score': float(scores[row, position])}
+            recommendation.update({name: model[name][position].item() for name in columns})
+            recommendations.append(recommendation)
+        results.append(recommendations)
+    return results
+
+def score_selection(model, chosen, n=10):
+    """Scores one selection of items against a similarity model and returns the top n items
+
+    Arguments:
+        model {dict} -- output of build_similarity_model or load_similarity_model
+        chosen {list} -- chosen item IDs
+        n {int} -- number of recommendations (default: {10})
+
+    Returns:
+        recommendations {list} -- at most n dictionaries holding the item ID, score and item columns, best first
+    """
+    return score_selections(model, [chosen], n)[0]
+
+def item_rows(model, item_ids):
+    """Looks up the item columns stored in a similarity model for the given items
+
+    Arguments:
+        model {dict} -- output of build_similarity_model or load_similarity_model
+        item_ids {list} -- item IDs to look up
+
+    Returns:
+        rows {list} -- one dictionary per item holding the item ID and item columns
+    """
+    positions = item_positions(model, item_ids)
+    columns = [name for name in model if name not in ('item_ids', 'similarity', 'exclude')]
+    return [dict({'Beer_ID': model['item_ids'][p].item()}, **{name: model[name][p].item() for name in columns}) for p in positions]
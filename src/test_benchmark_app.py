@@ -0,0 +1,38 @@
+import src.benchmark_app as bench
+
+def test_synthetic_tables():
+    """Tests the synthetic_tables function"""
+    top10rows, combinationrows, predrows = bench.synthetic_tables(ntypes=2, topn=4, npreds=3)
+    assert len(top10rows) == 8
+    assert len(combinationrows) == 2 * 6 * 2 #two beers for each of the 6 pairs of 4 beers, per type
+    assert len(predrows) == 2 * 6 * 3
+    top10ids = set(row['Beer_ID'] for row in top10rows)
+    assert not any(row['Beer_ID'] in top10ids for row in predrows) #top beers are never recommended
+    scores = [row['score'] for row in predrows if row['ID'] == 'Type01']
+    assert scores == sorted(scores, reverse=True)
+
+def test_route_requests():
+    """Tests the route_requests function"""
+    top10rows, combinationrows, _ = bench.synthetic_tables(ntypes=2, topn=3, npreds=2)
+    requests = bench.route_requests(top10rows, combinationrows)
+    assert requests['/'] == [('GET', None)]
+    assert requests['/recommender'] == [('POST', {'beertype': 'Type0'}), ('POST', {'beertype': 'Type1'})]
+    assert len(requests['/results']) == 6
+    assert requests['/results'][0] == ('POST', {'beertype': 'Type0', 'beerchoice1': '0', 'beerchoice2': '1'})
+
+def test_latency_summary():
+    """Tests the latency_summary function"""
+    summary = bench.latency_summary([0.001] * 99 + [0.101], seconds=2, errors=1)
+    assert summary['requests'] == 100
+    assert summary['errors'] == 1
+    assert summary['throughput'] == 50
+    assert abs(summary['p50_ms'] - 1) < 1e-9
+    assert summary['p99_ms'] > 1
+
+def test_latency_summary_bad():
+    """Tests the latency_summary function for a bad path"""
+    try:
+        bench.latency_summary([], seconds=1)
+        assert False
+    except ValueError:
+        assert True
@@ -0,0 +1,94 @@
+import src.configure_db as cdb
+import src.recommendation_index as ri
+import pandas as pd
+import sqlalchemy as sql
+import numpy as np
+
+def make_session():
+    """Creates an in-memory SQLite session with a few top ten beer rows"""
+    engine = sql.create_engine('sqlite://')
+    cdb.Base.metadata.create_all(engine)
+    session = cdb.get_session(engine)
+    session.add(cdb.Top_Ten_Beers(Beer_ID=2, Beer_Name='BeerB', ABV=5.0, Type='Stout', Style='StyleA', Brewery='BreweryA'))
+    session.add(cdb.Top_Ten_Beers(Beer_ID=1, Beer_Name='BeerA', ABV=6.5, Type='Stout', Style='StyleA', Brewery='BreweryB'))
+    session.add(cdb.Top_Ten_Beers(Beer_ID=3, Beer_Name='BeerC', ABV=4.0, Type='Sour', Style='StyleB', Brewery='BreweryC'))
+    session.commit()
+    return session
+
+def test_fetch_columns():
+    """Tests the fetch_columns function"""
+    session = make_session()
+    names, rows = cdb.fetch_columns(session, cdb.Top_Ten_Beers, ['Beer_ID', 'Beer_Name'], order_by='Pkey', Type='Stout')
+    assert names == ['Beer_ID', 'Beer_Name']
+    assert rows == [(2, 'BeerB'), (1, 'BeerA')]
+    assert isinstance(rows[0], tuple)
+
+def test_fetch_columns_bad():
+    """Tests the fetch_columns function for a bad path"""
+    session = make_session()
+    try:
+        cdb.fetch_columns(session, cdb.Top_Ten_Beers, ['Beer_IDOOPS'])
+        assert False
+    except KeyError:
+        assert True
+
+def test_fetch_arrays():
+    """Tests the fetch_arrays function"""
+    session = make_session()
+    arrays = cdb.fetch_arrays(session, cdb.Top_Ten_Beers, ['Beer_ID', 'ABV'], order_by='Beer_ID')
+    assert isinstance(arrays['Beer_ID'], np.ndarray)
+    assert arrays['Beer_ID'].tolist() == [1, 2, 3]
+    assert arrays['ABV'].tolist() == [6.5, 5.0, 4.0]
+    empty = cdb.fetch_arrays(session, cdb.Top_Ten_Beers, ['Beer_ID'], Type='Porter')
+    assert len(empty['Beer_ID']) == 0
+
+def load_frames(first):
+    """Creates the top ten, combinations and predictions of one load for a Stout pseudo-user"""
+    beer = {'Beer_Name': 'Beer', 'ABV': 5.0, 'Type': 'Stout', 'Style': 'StyleA', 'Brewery': 'BreweryA'}
+    top10_data = pd.DataFrame([dict(beer, Beer_ID=10), dict(beer, Beer_ID=20)])
+    combinations_data = pd.DataFrame([dict(beer, Beer_ID=10, ID='Stout1'), dict(beer, Beer_ID=20, ID='Stout1')])
+    pred_data = pd.DataFrame([dict(beer, Beer_ID=first, score=4.0, ID='Stout1'), dict(beer, Beer_ID=40, score=3.0, ID='Stout1')])
+    return top10_data, combinations_data, pred_data
+
+def test_load_tables():
+    """Tests the load_tables function, loading twice and then reloading the recommendation index"""
+    engine = sql.create_engine('sqlite://')
+    cdb.Base.metadata.create_all(engine)
+    session = cdb.get_session(engine)
+    cdb.load_tables(session, *load_frames(30))
+    first_version = session.query(sql.func.max(cdb.Top_Ten_Beers.Pkey)).scalar()
+    cdb.load_tables(session, *load_frames(50))
+    assert session.query(sql.func.max(cdb.Top_Ten_Beers.Pkey)).scalar() > first_version
+    assert session.query(cdb.Top_Ten_Beers).count() == 2
+    combinationrows = ri.records_to_dicts(*cdb.fetch_columns(session, cdb.User_Combinations, ['Type', 'ID', 'Beer_ID']))
+    predrows = ri.records_to_dicts(*cdb.fetch_columns(session, cdb.User_Predictions, ['Pkey', 'Type', 'ID', 'Beer_ID']))
+    index = ri.build_pair_index(combinationrows, predrows)
+    assert [r['Beer_ID'] for r in ri.lookup_pair(index, 'Stout', [10, 20])] == [50, 40]
+
+def test_load_tables_bad():
+    """Tests the load_tables function for a bad path, keeping the previous load"""
+    engine = sql.create_engine('sqlite://')
+    cdb.Base.metadata.create_all(engine)
+    session = cdb.get_session(engine)
+    cdb.load_tables(session, *load_frames(30))
+    top10_data, combinations_data, pred_data = load_frames(50)
+    try:
+        cdb.load_tables(session, top10_data.drop(columns='Beer_Name'), combinations_data, pred_data)
+        assert False
+    except KeyError:
+        assert True
+    assert [r.Beer_ID for r in session.query(cdb.User_Predictions).order_by(cdb.User_Predictions.Pkey)] == [30, 40]
+
+def test_replace_user_rows():
+    """Tests the replace_user_rows function, persisting the same selection twice"""
+    session = make_session()
+    beer = {'Beer_Name': 'Beer', 'ABV': 5.0, 'Type': 'Stout', 'Style': 'StyleA', 'Brewery': 'BreweryA', 'ID': 'Stout:10-20'}
+    for _ in range(2):
+        combinations = [cdb.User_Combinations(Beer_ID=10, **beer), cdb.User_Combinations(Beer_ID=20, **beer)]
+        predictions = [cdb.User_Predictions(Beer_ID=40, score=4.0, **beer)]
+        cdb.replace_user_rows(session, 'Stout:10-20', combinations, predictions)
+    combinationrows = ri.records_to_dicts(*cdb.fetch_columns(session, cdb.User_Combinations, ['Type', 'ID', 'Beer_ID']))
+    predrows = ri.records_to_dicts(*cdb.fetch_columns(session, cdb.User_Predictions, ['Pkey', 'Type', 'ID', 'Beer_ID']))
+    assert len(combinationrows) == 2
+    index = ri.build_pair_index(combinationrows, predrows)
+    assert [r['Beer_ID'] for r in ri.lookup_pair(index, 'Stout', [10, 20])] == [40]
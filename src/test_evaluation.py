@@ -0,0 +1,55 @@
+import src.evaluation as ev
+import src.score_model as sm
+from surprise import Prediction
+import numpy as np
+
+def make_predictions():
+    """Creates predictions for three users, with tied estimates and a user with no relevant ratings"""
+    rows = [('UserA', 'BeerA', 5.0, 4.5), ('UserB', 'BeerA', 2.0, 4.0), ('UserA', 'BeerB', 2.0, 4.5), ('UserA', 'BeerC', 4.0, 3.0),
+            ('UserB', 'BeerB', 1.0, 2.0), ('UserC', 'BeerC', 4.5, 1.0), ('UserA', 'BeerD', 4.0, 5.0), ('UserC', 'BeerA', 3.5, 4.0)]
+    return [Prediction(uid, iid, true_r, est, {}) for uid, iid, true_r, est in rows]
+
+def test_prediction_arrays():
+    """Tests that the prediction_arrays function numbers users in order of first appearance"""
+    uids, estimates, ratings = ev.prediction_arrays(make_predictions())
+    assert list(uids) == [0, 1, 0, 0, 1, 2, 0, 2]
+    assert list(estimates) == [4.5, 4.0, 4.5, 3.0, 2.0, 1.0, 5.0, 4.0]
+    assert list(ratings) == [5.0, 2.0, 2.0, 4.0, 1.0, 4.5, 4.0, 3.5]
+
+def test_rank_by_user():
+    """Tests that the rank_by_user function sorts each user's predictions by value, keeping ties in order"""
+    order, starts, ranks = ev.rank_by_user(np.array([0, 1, 0, 0, 1]), np.array([4.5, 4.0, 4.5, 5.0, 2.0]))
+    assert list(order) == [3, 0, 2, 1, 4]
+    assert list(starts) == [0, 3]
+    assert list(ranks) == [0, 1, 2, 0, 1]
+    try:
+        ev.rank_by_user(np.array([]), np.array([]))
+        assert False
+    except ValueError:
+        assert True
+
+def test_precision_recall_at_k():
+    """Tests that the precision_recall_at_k function gives the same values as score_model.precision_recall_at_k"""
+    predictions = make_predictions()
+    for k, threshold in [(1, 4), (2, 3), (10, 4.5)]:
+        precisions, recalls = ev.precision_recall_at_k(*ev.prediction_arrays(predictions), k=k, threshold=threshold)
+        expected = sm.precision_recall_at_k(predictions, k, threshold)
+        assert list(precisions) == list(expected[0].values())
+        assert list(recalls) == list(expected[1].values())
+
+def test_ndcg_at_k():
+    """Tests the ndcg_at_k function against its definition"""
+    uids, estimates, ratings = ev.prediction_arrays(make_predictions())
+    ndcgs = ev.ndcg_at_k(uids, estimates, ratings, k=2)
+    assert np.isclose(ndcgs[0], (4.0 + 5.0 / np.log2(3)) / (5.0 + 4.0 / np.log2(3))) #UserA: BeerD, then BeerA before the tied BeerB
+    assert np.isclose(ndcgs[1], 1.0)
+    assert np.isclose(ndcgs[2], (3.5 + 4.5 / np.log2(3)) / (4.5 + 3.5 / np.log2(3)))
+
+def test_average_precision():
+    """Tests the average_precision function against its definition"""
+    uids, estimates, ratings = ev.prediction_arrays(make_predictions())
+    precisions = ev.average_precision(uids, estimates, ratings, threshold=4)
+    assert np.allclose(precisions, [(1 + 2 / 2 + 3 / 4) / 3, 1.0, 1 / 2])
+    metrics = ev.ranking_metrics(uids, estimates, ratings, k=2, threshold=4)
+    assert np.isclose(metrics['map'], precisions.mean())
+    assert sorted(metrics) == ['map', 'ndcg', 'precision', 'recall']
@@ -0,0 +1,115 @@
+import src.knn_engine as knn
+import src.train_model as tm
+import numpy as np
+import pandas as pd
+
+def make_ratings():
+    """Creates a small ratings dataframe, with a repeated rating, and the rows of a pseudo-user who chose two beers"""
+    inputs = {
+        'Reviewer': ['ReviewerA', 'ReviewerA', 'ReviewerB', 'ReviewerB', 'ReviewerC', 'ReviewerC', 'ReviewerD', 'ReviewerD', 'ReviewerD'],
+        'Beer_ID': [1, 2, 1, 3, 2, 3, 1, 4, 4],
+        'Mean_Review': [4.5, 3.0, 2.0, 5.0, 3.5, 1.0, 4.0, 2.5, 3.0]}
+    df = pd.DataFrame(inputs)
+    user_rows = pd.DataFrame({'Reviewer': 'User1', 'Beer_ID': [1, 2, 3, 4], 'Mean_Review': [5, 0, 5, 0]})
+    return df, user_rows
+
+def test_fold_in():
+    """Tests that folding a user into IncrementalKNN predicts the same as refitting KNNBasic with the user's rows"""
+    df, user_rows = make_ratings()
+    testset = tm.build_testset(user_rows)
+    for k, min_k in [(50, 1), (2, 1), (50, 3)]:
+        expected = tm.create_KNNmodel(tm.build_trainset(df, user_rows), k=k, min_k=min_k).test(testset)
+        predicted = knn.IncrementalKNN(k=k, min_k=min_k).fit(df).fold_in(user_rows).test(testset)
+        assert [(p.uid, p.iid, p.est, p.details) for p in predicted] == [(p.uid, p.iid, p.est, p.details) for p in expected]
+
+def test_fold_in_implicit():
+    """Tests that folding in only a user's chosen items with an implicit rating of 0 is the same as folding in every row"""
+    df, user_rows = make_ratings()
+    testset = tm.build_testset(user_rows)
+    chosen_rows = user_rows[user_rows['Mean_Review'] == 5]
+    for model in [knn.IncrementalKNN(k=2, min_k=1).fit(df), knn.ItemKNN(k=2).fit(df)]:
+        expected = model.fold_in(user_rows).test(testset)
+        predicted = model.fold_in(chosen_rows, implicit_rating=0).test(testset)
+        assert [(p.iid, p.est) for p in predicted] == [(p.iid, p.est) for p in expected]
+
+def test_fold_in_bad():
+    """Tests the fold_in method for a bad path"""
+    df, user_rows = make_ratings()
+    model = knn.IncrementalKNN().fit(df)
+    for bad_rows in [user_rows.assign(Reviewer='ReviewerA'), user_rows.assign(Beer_ID=[1, 2, 3, 99])]:
+        try:
+            model.fold_in(bad_rows)
+            assert False
+        except ValueError:
+            assert True
+
+def test_estimate_items():
+    """Tests that the estimate_items method of folded models gives the estimates of their test method"""
+    df, user_rows = make_ratings()
+    testset = tm.build_testset(user_rows) + [('User1', 99, 0)]
+    items = [iid for (_, iid, _) in testset]
+    for model in [knn.IncrementalKNN(k=2, min_k=1).fit(df), knn.IncrementalKNN(min_k=3).fit(df), knn.ItemKNN(k=2).fit(df)]:
+        folded = model.fold_in(user_rows)
+        assert folded.estimate_items(items).tolist() == [p.est for p in folded.test(testset)]
+
+def test_item_knn():
+    """Tests that ItemKNN scores each beer with the sum of the chosen beers' neighbor rows"""
+    df, user_rows = make_ratings()
+    model = knn.ItemKNN(k=2).fit(df)
+    scores = {p.iid: p.est for p in model.fold_in(user_rows).test(tm.build_testset(user_rows))}
+    similarity = model.similarity.toarray()
+    assert (similarity > 0).sum(axis=1).max() <= 2
+    for position, beer in enumerate(model.item_ids):
+        assert np.isclose(scores[beer], 5 * (similarity[0, position] + similarity[2, position]))
+    assert knn.ItemKNN(method='pearson').fit(df).similarity.shape == (4, 4)
+
+def test_item_knn_refit():
+    """Tests that refitting ItemKNN after new reviews gives the same model as fitting it"""
+    df, _ = make_ratings()
+    newdf = df.append({'Reviewer': 'ReviewerE', 'Beer_ID': 3, 'Mean_Review': 4.0}, ignore_index=True)
+    model = knn.ItemKNN(k=2).fit(df)
+    refit_ids = model.refit(newdf, df, [3])
+    assert 3 in refit_ids
+    assert np.array_equal(model.similarity.toarray(), knn.ItemKNN(k=2).fit(newdf).similarity.toarray())
+    try:
+        model.refit(newdf.append({'Reviewer': 'ReviewerE', 'Beer_ID': 5, 'Mean_Review': 4.0}, ignore_index=True), newdf, [5])
+        assert False
+    except ValueError:
+        assert True
+
+def test_base_fromdata_bad():
+    """Tests the base_fromdata function for a bad path"""
+    df, _ = make_ratings()
+    try:
+        tm.base_fromdata(df, {'engine': 'OOPS', 'build_trainset': {'colnames': None}, 'create_KNNmodel': {}})
+        assert False
+    except ValueError:
+        assert True
+
+def test_save_load_model(tmp_path):
+    """Tests that a model saved with save_model and memory-mapped by load_model predicts the same as the fitted model"""
+    df, user_rows = make_ratings()
+    testset = tm.build_testset(user_rows)
+    for name, model in [('Stout', knn.IncrementalKNN(k=2, min_k=1).fit(df)), ('Sour', knn.ItemKNN(k=2).fit(df))]:
+        knn.save_model(model, str(tmp_path / knn.MODEL_DIR / name))
+        loaded = knn.load_model(str(tmp_path / knn.MODEL_DIR / name))
+        expected = model.fold_in(user_rows).test(testset)
+        predicted = loaded.fold_in(user_rows).test(testset)
+        assert [(p.iid, p.est, p.details) for p in predicted] == [(p.iid, p.est, p.details) for p in expected]
+    assert isinstance(knn.load_model(str(tmp_path / knn.MODEL_DIR / 'Stout'))._ratings, np.memmap)
+    newdf = df.append({'Reviewer': 'ReviewerE', 'Beer_ID': 3, 'Mean_Review': 4.0}, ignore_index=True)
+    loaded = knn.load_model(str(tmp_path / knn.MODEL_DIR / 'Sour'))
+    loaded.refit(newdf, df, [3]) #refits a memory-mapped model without writing to its read-only arrays
+    assert np.array_equal(loaded.similarity.toarray(), knn.ItemKNN(k=2).fit(newdf).similarity.toarray())
+
+def test_load_model_bad(tmp_path):
+    """Tests the load_model function for a bad path"""
+    df, _ = make_ratings()
+    knn.save_model(knn.ItemKNN(k=2).fit(df), str(tmp_path))
+    (tmp_path / 'model.json').write_text('{"format": 0}')
+    for directory in [tmp_path, tmp_path / 'missing']:
+        try:
+            knn.load_model(str(directory))
+            assert False
+        except ValueError:
+            assert True
@@ -0,0 +1,40 @@
+import src.metrics as metrics
+
+def test_histogram():
+    """Tests the Histogram class"""
+    histogram = metrics.Histogram('test_seconds', 'Test metric.', ('route',), buckets=(0.1, 1))
+    histogram.observe(0.05, route='/a')
+    histogram.observe(0.1, route='/a')
+    histogram.observe(5, route='/a')
+    histogram.observe(0.5, route='/b')
+    lines = histogram.render()
+    assert lines[0] == '# HELP test_seconds Test metric.'
+    assert lines[1] == '# TYPE test_seconds histogram'
+    assert 'test_seconds_bucket{route="/a",le="0.1"} 2' in lines
+    assert 'test_seconds_bucket{route="/a",le="1.0"} 2' in lines
+    assert 'test_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 'test_seconds_sum{route="/a"} 5.15' in lines
+    assert 'test_seconds_count{route="/a"} 3' in lines
+    assert 'test_seconds_bucket{route="/b",le="1.0"} 1' in lines
+
+def test_histogram_time():
+    """Tests the Histogram time context manager and the render function"""
+    histogram = metrics.Histogram('test_seconds', 'Test metric.')
+    with histogram.time():
+        pass
+    text = metrics.render([histogram])
+    assert 'test_seconds_count 1\n' in text
+    assert text.endswith('\n')
+
+def test_histogram_bad():
+    """Tests the Histogram class for a bad path"""
+    histogram = metrics.Histogram('test_seconds', 'Test metric.', ('route',))
+    try:
+        histogram.observe(0.1)
+        assert False
+    except KeyError:
+        assert True
+
+def test_escape():
+    """Tests the escape function"""
+    assert metrics.escape('a"b\\c') == 'a\\"b\\\\c'
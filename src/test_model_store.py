@@ -0,0 +1,66 @@
+import src.model_store as ms
+import os
+
+def test_new_version():
+    """Tests the new_version function"""
+    first = ms.new_version()
+    second = ms.new_version()
+    assert isinstance(first, str)
+    assert first <= second
+
+def test_publish_latest_version(tmp_path):
+    """Tests the staging_path, publish_version and latest_version functions"""
+    directory = str(tmp_path)
+    assert ms.latest_version(directory) is None
+    assert ms.latest_version(os.path.join(directory, 'missing')) is None
+    os.makedirs(ms.staging_path(directory, '20190101T000000000000'))
+    assert ms.latest_version(directory) is None #staged versions are not visible
+    ms.publish_version(directory, '20190101T000000000000')
+    os.makedirs(ms.staging_path(directory, '20190102T000000000000'))
+    ms.publish_version(directory, '20190102T000000000000')
+    assert ms.latest_version(directory) == '20190102T000000000000'
+
+def test_model_store():
+    """Tests that the ModelStore swaps in a new artifact only when the version changes"""
+    versions = ['v1']
+    loads = []
+    def load(version):
+        loads.append(version)
+        return {'version': version}
+    store = ms.ModelStore(load, lambda: versions[-1], interval=0).start()
+    old = store.current
+    assert old == {'version': 'v1'}
+    assert store.refresh() is False
+    versions.append('v2')
+    assert store.refresh() is True
+    assert store.current == {'version': 'v2'}
+    assert store.served == ('v2', {'version': 'v2'})
+    assert old == {'version': 'v1'} #requests holding the old artifact are unaffected
+    assert loads == ['v1', 'v2']
+
+def test_model_store_bad():
+    """Tests that a failed load keeps the current artifact"""
+    versions = ['v1']
+    def load(version):
+        if version == 'v2':
+            raise IOError('Artifact is incomplete.')
+        return {'version': version}
+    store = ms.ModelStore(load, lambda: versions[-1], interval=0).start()
+    versions.append('v2')
+    try:
+        store.refresh()
+        assert False
+    except IOError:
+        assert True
+    assert store.current == {'version': 'v1'}
+    assert store.current_version == 'v1'
+
+def test_prune_versions(tmp_path):
+    """Tests that publish_version keeps the latest and previous versions only"""
+    directory = str(tmp_path)
+    for version in ['20190101T000000000000', '20190102T000000000000', '20190103T000000000000']:
+        os.makedirs(ms.staging_path(directory, version))
+        ms.publish_version(directory, version)
+    os.makedirs(ms.staging_path(directory, '20190104T000000000000'))
+    assert sorted(os.listdir(directory)) == ['.20190104T000000000000.tmp', '20190102T000000000000', '20190103T000000000000']
+    assert ms.prune_versions(directory, keep=1) == ['20190102T000000000000']
@@ -0,0 +1,68 @@
+from src.prediction_cache import PredictionCache
+import threading
+import time
+
+def test_prediction_cache():
+    """Tests that the PredictionCache computes each key once and returns cached values"""
+    calls = []
+    def compute_many(keys):
+        calls.append(list(keys))
+        return [[key[1] * 10] for key in keys]
+    cache = PredictionCache(compute_many, maxsize=10)
+    assert cache.get(('Stout', 1)) == [10]
+    assert cache.get(('Stout', 1)) == [10]
+    assert cache.get_many([('Stout', 1), ('Stout', 2), ('Stout', 2), ('Stout', 3)]) == [[10], [20], [20], [30]]
+    assert calls == [[('Stout', 1)], [('Stout', 2), ('Stout', 3)]]
+    assert cache.hits == 2
+    assert cache.misses == 3
+
+def test_prediction_cache_eviction():
+    """Tests that the PredictionCache evicts the least recently used key"""
+    cache = PredictionCache(lambda keys: [[key] for key in keys], maxsize=2)
+    cache.get(('Stout', 1))
+    cache.get(('Stout', 2))
+    cache.get(('Stout', 1))
+    cache.get(('Stout', 3))
+    assert len(cache) == 2
+    assert ('Stout', 1) in cache
+    assert ('Stout', 2) not in cache
+
+def test_prediction_cache_none():
+    """Tests that keys that cannot be computed are not cached or persisted"""
+    persisted = []
+    cache = PredictionCache(lambda keys: [None for key in keys], persist=lambda key, value: persisted.append(key))
+    assert cache.get(('Stout', 1)) is None
+    assert ('Stout', 1) not in cache
+    assert persisted == []
+
+def test_prediction_cache_coalescing():
+    """Tests that concurrent requests for the same key share one computation, which is persisted once"""
+    calls = []
+    persisted = []
+    def compute_many(keys):
+        calls.append(list(keys))
+        time.sleep(0.2)
+        return [['rec'] for key in keys]
+    cache = PredictionCache(compute_many, persist=lambda key, value: persisted.append(key))
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get(('Stout', 1)))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == [[('Stout', 1)]]
+    assert results == [['rec']] * 8
+    assert persisted == [('Stout', 1)]
+
+def test_prediction_cache_bad():
+    """Tests that an error computing a key reaches the caller and the key can be retried"""
+    def compute_many(keys):
+        raise ValueError('Chosen items are not in the model.')
+    cache = PredictionCache(compute_many)
+    try:
+        cache.get(('Stout', 1))
+        assert False
+    except ValueError:
+        assert True
+    cache.compute_many = lambda keys: [['rec'] for key in keys]
+    assert cache.get(('Stout', 1)) == ['rec']
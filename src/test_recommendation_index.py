@@ -0,0 +1,71 @@
+import src.recommendation_index as ri
+
+def test_pair_key():
+    """Tests the pair_key function"""
+    assert ri.pair_key('Stout', [12, 3]) == ('Stout', 3, 12)
+    assert ri.pair_key('Stout', [3, 12]) == ri.pair_key('Stout', [12, 3])
+    assert isinstance(ri.pair_key('Stout', [3, 12]), tuple)
+
+def test_parse_selection():
+    """Tests the parse_selection function"""
+    assert ri.parse_selection({'type': 'Stout', 'beers': [12, 3]}) == {'type': 'Stout', 'beers': [12, 3]}
+    assert ri.parse_selection({'type': 'Stout', 'beers': [12, 3, 7]})['beers'] == [12, 3, 7]
+
+def test_parse_selection_bad():
+    """Tests the parse_selection function for selections the API rejects"""
+    for selection in [{'type': 'Stout', 'beers': '12'}, {'type': 'Stout', 'beers': [12]}, {'type': 'Stout', 'beers': [12, 12]},
+                      {'type': 'Stout', 'beers': [True, 3]}, {'type': 'Stout', 'beers': ['12', '3']}, {'type': 'Stout', 'beers': [1.5, 3]},
+                      {'beers': [12, 3]}, {'type': 'Stout'}, [12, 3]]:
+        try:
+            ri.parse_selection(selection)
+            assert False
+        except ValueError:
+            assert True
+
+def test_records_to_dicts():
+    """Tests the records_to_dicts function"""
+    names = ['Beer_ID', 'Type']
+    data = [[1, 'Stout'], [2, 'Sour']]
+    answers = [{'Beer_ID': 1, 'Type': 'Stout'}, {'Beer_ID': 2, 'Type': 'Sour'}]
+    assert answers == ri.records_to_dicts(names, data)
+
+def test_build_pair_index():
+    """Tests the build_pair_index and lookup_pair functions"""
+    combinationrows = [{'Type': 'Stout', 'ID': 'Stout1', 'Beer_ID': 10}, {'Type': 'Stout', 'ID': 'Stout1', 'Beer_ID': 20},
+                       {'Type': 'Stout', 'ID': 'Stout2', 'Beer_ID': 10}, {'Type': 'Stout', 'ID': 'Stout2', 'Beer_ID': 30}]
+    predrows = [{'Pkey': 2, 'Type': 'Stout', 'ID': 'Stout1', 'Beer_ID': 50}, {'Pkey': 1, 'Type': 'Stout', 'ID': 'Stout1', 'Beer_ID': 40},
+                {'Pkey': 3, 'Type': 'Stout', 'ID': 'Stout2', 'Beer_ID': 60}]
+    index = ri.build_pair_index(combinationrows, predrows)
+    assert len(index) == 2
+    assert [r['Beer_ID'] for r in ri.lookup_pair(index, 'Stout', [20, 10])] == [40, 50]
+    assert [r['Beer_ID'] for r in ri.lookup_pair(index, 'Stout', [10, 20])] == [40, 50]
+    assert [r['Beer_ID'] for r in ri.lookup_pair(index, 'Stout', [30, 10])] == [60]
+
+def test_lookup_pair_bad():
+    """Tests the lookup_pair function for a pair that is not in the index"""
+    combinationrows = [{'Type': 'Stout', 'ID': 'Stout1', 'Beer_ID': 10}, {'Type': 'Stout', 'ID': 'Stout1', 'Beer_ID': 20}]
+    predrows = [{'Pkey': 1, 'Type': 'Stout', 'ID': 'Stout1', 'Beer_ID': 40}]
+    index = ri.build_pair_index(combinationrows, predrows)
+    assert ri.lookup_pair(index, 'Stout', [10, 30]) is None
+    assert ri.lookup_pair(index, 'Sour', [10, 20]) is None
+
+def test_lookup_many():
+    """Tests the lookup_many function"""
+    combinationrows = [{'Type': 'Stout', 'ID': 'Stout1', 'Beer_ID': 10}, {'Type': 'Stout', 'ID': 'Stout1', 'Beer_ID': 20},
+                       {'Type': 'Sour', 'ID': 'Sour1', 'Beer_ID': 70}, {'Type': 'Sour', 'ID': 'Sour1', 'Beer_ID': 80}]
+    predrows = [{'Pkey': 1, 'Type': 'Stout', 'ID': 'Stout1', 'Beer_ID': 40}, {'Pkey': 2, 'Type': 'Sour', 'ID': 'Sour1', 'Beer_ID': 90}]
+    index = ri.build_pair_index(combinationrows, predrows)
+    selections = [{'type': 'Sour', 'beers': [80, 70]}, {'type': 'Stout', 'beers': [10, 30]}, {'type': 'Stout', 'beers': [20, 10]}]
+    results = ri.lookup_many(index, selections)
+    assert len(results) == 3
+    assert [r['Beer_ID'] for r in results[0]] == [90]
+    assert results[1] is None
+    assert [r['Beer_ID'] for r in results[2]] == [40]
+
+def test_lookup_many_bad():
+    """Tests the lookup_many function for a bad path"""
+    try:
+        ri.lookup_many({}, [{'typeOOPS': 'Stout', 'beers': [10, 20]}])
+        assert False
+    except KeyError:
+        assert True
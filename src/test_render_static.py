@@ -0,0 +1,52 @@
+import src.render_static as rs
+import os
+
+def test_static_page_path():
+    """Tests the static_page_path function"""
+    assert rs.static_page_path('Stout') == 'recommender/Stout.html'
+    assert rs.static_page_path('Pale Ale', [12, 3]) == 'results/Pale%20Ale/3-12.html'
+    assert rs.static_page_path('Pale Ale', ['3', '12']) == rs.static_page_path('Pale Ale', [12, 3])
+    assert '/' not in rs.static_page_path('../x')[len('recommender/'):]
+
+def test_static_version_dir():
+    """Tests the static_version_dir function"""
+    assert rs.static_version_dir(('20200101T000000000000', 40)) == '20200101T000000000000-40'
+    assert rs.static_version_dir((None, None)) == 'None-None'
+    assert '/' not in rs.static_version_dir(('../x', 1))
+
+def test_render_static_pages(tmp_path):
+    """Tests the render_static_pages function"""
+    directory = os.path.join(str(tmp_path), 'pages')
+    os.makedirs(os.path.join(directory, 'v-1', 'results'))
+    open(os.path.join(directory, 'v-1', 'results', 'stale.html'), 'w').close()
+    keys = [('Stout', 1, 2), ('Stout', 1, 3), ('Sour', 4, 5)]
+    npages = rs.render_static_pages(keys, lambda beertype: 'top ' + beertype, lambda key: 'results {}'.format(key), directory, ('v', 1))
+    assert npages == 5
+    with open(os.path.join(directory, 'v-1', 'recommender', 'Sour.html')) as f:
+        assert f.read() == 'top Sour'
+    with open(os.path.join(directory, 'v-1', 'results', 'Stout', '1-3.html')) as f:
+        assert f.read() == "results ('Stout', 1, 3)"
+    assert not os.path.exists(os.path.join(directory, 'v-1', 'results', 'stale.html'))
+    assert sorted(os.listdir(str(tmp_path))) == ['pages']
+
+def test_render_static_pages_new_version(tmp_path):
+    """Tests the render_static_pages function, rendering a second model version"""
+    directory = os.path.join(str(tmp_path), 'pages')
+    keys = [('Stout', 1, 2)]
+    rs.render_static_pages(keys, lambda beertype: 'old', lambda key: 'old', directory, ('v', 1))
+    os.utime(os.path.join(directory, 'v-1'), (1, 1))
+    rs.render_static_pages(keys, lambda beertype: 'new', lambda key: 'new', directory, ('v', 2))
+    assert sorted(os.listdir(directory)) == ['v-1', 'v-2'] #previous version kept for processes still serving it
+    with open(os.path.join(directory, 'v-2', rs.static_page_path('Stout', [2, 1]))) as f:
+        assert f.read() == 'new'
+    os.utime(os.path.join(directory, 'v-2'), (2, 2))
+    rs.render_static_pages(keys, lambda beertype: 'newer', lambda key: 'newer', directory, ('v', 3))
+    assert sorted(os.listdir(directory)) == ['v-2', 'v-3']
+
+def test_static_page_path_bad():
+    """Tests the static_page_path function for a bad path"""
+    try:
+        rs.static_page_path('Stout', ['one', 'two'])
+        assert False
+    except ValueError:
+        assert True
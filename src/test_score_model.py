@@ -2,6 +2,7 @@ import src.score_model as sm
 import src.train_model as tm
 import surprise
 import pandas as pd 
+import numpy as np
 
 
 def test_precision_recall_at_k():
@@ -75,3 +76,82 @@ def test_kfold_crossvalidation():
     assert answers == sm.kfold_crossvalidation(data, model, folds, k, threshold)
     assert isinstance(sm.kfold_crossvalidation(data, model, folds, k, threshold), tuple)
 
+def test_average_scores():
+    """Tests the average_scores function"""
+    scores = [{'precision': 1.0, 'recall': 0.5}, {'precision': 0.5, 'recall': 0.0}]
+    assert sm.average_scores(scores) == (0.75, 0.25)
+
+def test_fold_indices():
+    """Tests that the fold_indices function assigns every rating to one fold, the same way for a seed"""
+    foldlist = sm.fold_indices(23, 10, random_state=7)
+    assert len(foldlist) == 10
+    assert sorted(len(fold) for fold in foldlist) == [2] * 7 + [3] * 3
+    assert sorted(np.concatenate(foldlist)) == list(range(23))
+    assert all(np.array_equal(a, b) for a, b in zip(foldlist, sm.fold_indices(23, 10, random_state=7)))
+
+def test_fold_indices_bad():
+    """Tests the fold_indices function for a bad path"""
+    try:
+        sm.fold_indices(6, 7)
+        assert False
+    except ValueError:
+        assert True
+
+def test_fold_scores():
+    """Tests that the fold_scores function gives the scores of Surprise's seeded KFold, in a process pool as in one process"""
+    inputs = {'Beer_ID': ['BeerA', 'BeerB', 'BeerC'] * 8,
+        'Mean_Review': [1.5, 3.0, 4.5, 5.0, 2.0, 4.0] * 4,
+        'Reviewer': ['Reviewer' + str(r) for r in range(8) for _ in range(3)]}
+    data = surprise.Dataset.load_from_df(pd.DataFrame(inputs)[['Reviewer', 'Beer_ID', 'Mean_Review']], surprise.Reader())
+    model = surprise.KNNBasic(k=50, min_k=1, verbose=False)
+    scores = sm.fold_scores(data, model, folds=12, k=5, threshold=4, random_state=7)
+    assert [score['fold'] for score in scores] == list(range(12))
+    assert sum(score['ratings'] for score in scores) == 24
+    expected = []
+    for trainset, testset in surprise.model_selection.KFold(12, random_state=7).split(data):
+        precisions, recalls = sm.precision_recall_at_k(surprise.KNNBasic(k=50, min_k=1, verbose=False).fit(trainset).test(testset), 5, 4)
+        expected.append((sum(precisions.values()) / len(precisions), sum(recalls.values()) / len(recalls)))
+    assert [(score['precision'], score['recall']) for score in scores] == expected
+    poolscores = sm.fold_scores(data, model, folds=12, k=5, threshold=4, random_state=7, workers=2)
+    assert [(score['precision'], score['recall']) for score in poolscores] == expected
+
+def test_grid_estimates():
+    """Tests that the grid_estimates function gives the estimates of KNNBasic for each (k, min_k) setting"""
+    inputs = {'Beer_ID': ['BeerA', 'BeerB', 'BeerC', 'BeerD'] * 6,
+        'Mean_Review': [1.5, 3.0, 4.5, 5.0, 2.0, 4.0, 2.5, 1.0] * 3,
+        'Reviewer': ['Reviewer' + str(r) for r in range(6) for _ in range(4)]}
+    data = surprise.Dataset.load_from_df(pd.DataFrame(inputs)[['Reviewer', 'Beer_ID', 'Mean_Review']], surprise.Reader())
+    trainset = data.construct_trainset(data.raw_ratings[:20])
+    testset = data.construct_testset(data.raw_ratings[20:]) + [('ReviewerNew', 'BeerA', 3.0)]
+    grid = [(1, 1), (2, 1), (2, 3), (50, 1)]
+    for user_based in [True, False]:
+        model = surprise.KNNBasic(sim_options={'user_based': user_based}, verbose=False).fit(trainset)
+        estimates = sm.grid_estimates(model, testset, grid)
+        for (k, min_k), row in zip(grid, estimates):
+            model.k, model.min_k = k, min_k
+            assert list(row) == [prediction.est for prediction in model.test(testset)]
+    try:
+        sm.grid_estimates(model, testset, [(0, 1)])
+        assert False
+    except ValueError:
+        assert True
+
+def test_sweep_scores():
+    """Tests that the sweep_scores function gives the scores of cross validating each setting on its own"""
+    inputs = {'Beer_ID': ['BeerA', 'BeerB', 'BeerC'] * 8,
+        'Mean_Review': [1.5, 3.0, 4.5, 5.0, 2.0, 4.0] * 4,
+        'Reviewer': ['Reviewer' + str(r) for r in range(8) for _ in range(3)]}
+    data = surprise.Dataset.load_from_df(pd.DataFrame(inputs)[['Reviewer', 'Beer_ID', 'Mean_Review']], surprise.Reader())
+    grid = {'user_based': [True, False], 'k': [1, 50], 'min_k': [1, 2]}
+    table = sm.sweep_scores(data, surprise.KNNBasic(verbose=False), grid, folds=3, k=5, threshold=4, random_state=7)
+    assert list(table.columns) == ['user_based', 'k', 'min_k', 'precision', 'recall', 'ndcg', 'map']
+    assert len(table) == 8
+    for row in table.itertuples():
+        model = surprise.KNNBasic(k=row.k, min_k=row.min_k, sim_options={'user_based': row.user_based}, verbose=False)
+        precision, recall = sm.kfold_crossvalidation(data, model, 3, 5, 4, random_state=7)
+        assert np.isclose(precision, row.precision) and np.isclose(recall, row.recall)
+    try:
+        sm.sweep_scores(data, surprise.KNNBasic(verbose=False), {'k': [1]})
+        assert False
+    except KeyError:
+        assert True
@@ -0,0 +1,189 @@
+import src.similarity_model as smod
+import numpy as np
+import pandas as pd
+
+def item_table():
+    """Creates the item table of review_data"""
+    return review_data()[['Beer_ID', 'Beer_Name']].drop_duplicates().set_index('Beer_ID')
+
+def review_data():
+    """Creates a small reviews dataframe"""
+    inputs = {'Beer_ID': [1, 2, 3, 1, 2, 3, 4, 4],
+        'Beer_Name': ['BeerA', 'BeerB', 'BeerC', 'BeerA', 'BeerB', 'BeerC', 'BeerD', 'BeerD'],
+        'Mean_Review': [5.0, 4.0, 1.0, 4.0, 5.0, 2.0, 1.0, 5.0],
+        'Reviewer': ['ReviewerA', 'ReviewerA', 'ReviewerA', 'ReviewerB', 'ReviewerB', 'ReviewerB', 'ReviewerA', 'ReviewerC']}
+    return pd.DataFrame(inputs)
+
+def test_rating_matrix():
+    """Tests the rating_matrix function"""
+    matrix, item_ids = smod.rating_matrix(review_data())
+    assert matrix.shape == (3, 4)
+    assert item_ids.tolist() == [1, 2, 3, 4]
+    assert matrix[0, 0] == 5.0
+    assert matrix[2, 3] == 5.0
+
+def test_rating_matrix_bad():
+    """Tests the rating_matrix function for a bad path"""
+    try:
+        smod.rating_matrix(review_data(), usercolname='ReviewerOOPS')
+        assert False
+    except KeyError:
+        assert True
+
+def test_item_similarity():
+    """Tests the item_similarity function"""
+    matrix, _ = smod.rating_matrix(review_data())
+    similarity = smod.item_similarity(matrix)
+    dense = matrix.toarray()
+    expected = dense[:, 0] @ dense[:, 1] / (np.linalg.norm(dense[:, 0]) * np.linalg.norm(dense[:, 1]))
+    assert similarity.shape == (4, 4)
+    assert np.isclose(similarity[0, 1], expected)
+    assert np.allclose(similarity, similarity.T)
+    assert np.all(np.diag(similarity) == 0)
+
+def test_item_similarity_pearson():
+    """Tests the item_similarity function with Pearson similarity"""
+    matrix, _ = smod.rating_matrix(review_data())
+    similarity = smod.item_similarity(matrix, method='pearson')
+    dense = matrix.toarray()
+    centered = [np.where(dense[:, i] != 0, dense[:, i] - dense[:, i][dense[:, i] != 0].mean(), 0) for i in range(2)]
+    expected = centered[0] @ centered[1] / (np.linalg.norm(centered[0]) * np.linalg.norm(centered[1]))
+    assert np.isclose(similarity[0, 1], expected)
+    assert np.all(np.diag(similarity) == 0)
+
+def test_item_similarity_bad():
+    """Tests the item_similarity function for a bad path"""
+    matrix, _ = smod.rating_matrix(review_data())
+    try:
+        smod.item_similarity(matrix, method='OOPS')
+        assert False
+    except ValueError:
+        assert True
+
+def test_top_k_similarity():
+    """Tests the top_k_similarity function"""
+    similarity = np.array([[0, .5, .2, .9], [.5, 0, -.3, .1], [.2, -.3, 0, .4], [.9, .1, .4, 0]], dtype=np.float32)
+    top = smod.top_k_similarity(similarity, k=2).toarray()
+    assert np.array_equal(top[0], np.array([0, .5, 0, .9], dtype=np.float32))
+    assert np.array_equal(top[1], np.array([.5, 0, 0, .1], dtype=np.float32))
+    assert np.array_equal(smod.top_k_similarity(similarity, k=10).toarray(), np.maximum(similarity, 0))
+
+def test_top_k_item_similarity():
+    """Tests that the top_k_item_similarity function gives the same matrix for any block size as the full similarity"""
+    matrix, _ = smod.rating_matrix(review_data())
+    for method in ['cosine', 'pearson']:
+        expected = smod.top_k_similarity(smod.item_similarity(matrix, method), k=2)
+        for block_size in [1, 3, 10]:
+            top = smod.top_k_item_similarity(matrix, k=2, method=method, block_size=block_size)
+            assert top.dtype == np.float32
+            assert np.array_equal(top.toarray(), expected.toarray())
+    try:
+        smod.top_k_item_similarity(matrix, block_size=0)
+        assert False
+    except ValueError:
+        assert True
+
+def test_update_top_k_item_similarity():
+    """Tests that update_top_k_item_similarity gives the same matrix as top_k_item_similarity after a new review"""
+    matrix, _ = smod.rating_matrix(review_data())
+    newdata = review_data().append({'Beer_ID': 4, 'Beer_Name': 'BeerD', 'Mean_Review': 2.0, 'Reviewer': 'ReviewerB'}, ignore_index=True)
+    newmatrix, _ = smod.rating_matrix(newdata)
+    for method in ['cosine', 'pearson']:
+        top = smod.top_k_item_similarity(matrix, k=2, method=method)
+        expected = smod.top_k_item_similarity(newmatrix, k=2, method=method)
+        updated = smod.update_top_k_item_similarity(top, newmatrix, np.arange(4), k=2, method=method, block_size=3)
+        assert np.array_equal(updated.toarray(), expected.toarray())
+    try:
+        smod.update_top_k_item_similarity(top, newmatrix[:, :3], np.arange(3))
+        assert False
+    except ValueError:
+        assert True
+
+def test_score_selection():
+    """Tests the build_similarity_model and score_selection functions"""
+    model = smod.join_item_table(smod.build_similarity_model(review_data(), toplist=[4]), item_table())
+    recommendations = smod.score_selection(model, [1], n=2)
+    assert [r['Beer_ID'] for r in recommendations] == [2, 3]
+    assert recommendations[0]['Beer_Name'] == 'BeerB'
+    assert recommendations[0]['score'] >= recommendations[1]['score']
+    many = smod.score_selections(model, [[1], [1, 2]], n=10)
+    assert many[0] == recommendations
+    assert [r['Beer_ID'] for r in many[1]] == [3]
+
+def test_score_selection_top_k():
+    """Tests that a similarity model keeps each item's k nearest neighbors and scores selections with them only"""
+    matrix, _ = smod.rating_matrix(review_data())
+    model = smod.build_similarity_model(review_data(), k=1)
+    assert np.array_equal(model['similarity'].toarray(), smod.top_k_similarity(smod.item_similarity(matrix), k=1).toarray())
+    assert np.all(np.diff(model['similarity'].indptr) <= 1)
+    for block_size in [1, 3]:
+        blocked = smod.build_similarity_model(review_data(), k=1, block_size=block_size)
+        assert np.array_equal(blocked['similarity'].toarray(), model['similarity'].toarray())
+    shared = smod.build_similarity_model(review_data(), similarity=model['similarity'])
+    assert shared['similarity'] is model['similarity']
+    try:
+        smod.build_similarity_model(review_data(), similarity=model['similarity'][:3, :3])
+        assert False
+    except ValueError:
+        assert True
+    scores = model['similarity'][[0, 2]].sum(axis=0).A.ravel() #neighbor rows of beers 1 and 3
+    recommendations = smod.score_selection(model, [1, 3])
+    for recommendation in recommendations:
+        assert np.isclose(recommendation['score'], scores[recommendation['Beer_ID'] - 1])
+    assert [r['Beer_ID'] for r in recommendations] == [2] #beer 4 is not a neighbor of beer 1 or 3
+
+def test_score_selection_bad():
+    """Tests the score_selection function for a bad path"""
+    model = smod.build_similarity_model(review_data())
+    try:
+        smod.score_selection(model, [1, 99])
+        assert False
+    except ValueError:
+        assert True
+
+def test_item_rows():
+    """Tests the item_rows function"""
+    model = smod.join_item_table(smod.build_similarity_model(review_data()), item_table())
+    assert smod.item_rows(model, [3, 1]) == [{'Beer_ID': 3, 'Beer_Name': 'BeerC'}, {'Beer_ID': 1, 'Beer_Name': 'BeerA'}]
+    try:
+        smod.item_rows(model, [99])
+        assert False
+    except ValueError:
+        assert True
+
+def test_save_load_similarity_model(tmp_path):
+    """Tests the save_similarity_model and load_similarity_models functions"""
+    model = smod.build_similarity_model(review_data(), toplist=[4])
+    smod.save_similarity_model(model, str(tmp_path / 'Stout'))
+    assert 'Beer_Name' not in smod.load_similarity_models(str(tmp_path))['Stout']
+    loaded = smod.load_similarity_model(str(tmp_path / 'Stout'))
+    assert isinstance(loaded['item_ids'], np.memmap) and not loaded['similarity'].data.flags.writeable #read-only maps of the files
+    smod.save_item_table(item_table(), str(tmp_path / smod.ITEM_TABLE_DIR / 'Stout.npz'))
+    models = smod.load_similarity_models(str(tmp_path))
+    assert list(models) == ['Stout']
+    assert np.array_equal(models['Stout']['similarity'].toarray(), model['similarity'].toarray())
+    assert smod.score_selection(models['Stout'], [1, 2]) == smod.score_selection(smod.join_item_table(model, item_table()), [1, 2])
+    assert smod.item_rows(models['Stout'], [3]) == [{'Beer_ID': 3, 'Beer_Name': 'BeerC'}]
+    assert smod.load_similarity_models(str(tmp_path / 'missing')) == {}
+    try:
+        smod.load_similarity_model(str(tmp_path / 'missing'))
+        assert False
+    except ValueError:
+        assert True
+
+def test_join_item_table_bad():
+    """Tests the join_item_table function for an item table missing some of the model's items"""
+    try:
+        smod.join_item_table(smod.build_similarity_model(review_data()), item_table().drop(4))
+        assert False
+    except ValueError:
+        assert True
+
+def test_save_load_item_table(tmp_path):
+    """Tests the save_item_table and load_item_tables functions"""
+    itemtable = item_table()
+    smod.save_item_table(itemtable, str(tmp_path / smod.ITEM_TABLE_DIR / 'Stout.npz'))
+    itemtables = smod.load_item_tables(str(tmp_path))
+    assert list(itemtables) == ['Stout']
+    assert itemtables['Stout'].equals(itemtable)
+    assert smod.load_item_tables(str(tmp_path / 'missing')) == {}
@@ -0,0 +1,67 @@
+import src.train_cache as tc
+import src.train_model as tm
+import os
+import pandas as pd
+
+def make_type():
+    """Creates the reviews and outputs of one type"""
+    typedata = pd.DataFrame({'Beer_ID': [1, 2, 1], 'Reviewer': ['ReviewerA', 'ReviewerA', 'ReviewerB'],
+                             'Mean_Review': [4.0, 3.5, 2.0], 'Type': 'Stout'})
+    topdf = typedata[['Beer_ID', 'Type']].drop_duplicates().reset_index(drop=True)
+    preds = [pd.DataFrame({'Beer_ID': [2], 'score': [3.5], 'ID': ['Stout1']})]
+    return typedata, (topdf, topdf.assign(ID='Stout1'), preds)
+
+def test_type_key():
+    """Tests that the type_key function changes with the data and config of a type, but not with the other types"""
+    typedata, _ = make_type()
+    config = {'types': ['Stout', 'Sour'], 'create_KNNmodel': {'k': 50}}
+    key = tc.type_key(typedata, 'Stout', config)
+    assert key == tc.type_key(typedata.copy(), 'Stout', dict(config, types=['Stout']))
+    assert key != tc.type_key(typedata.assign(Mean_Review=[4.0, 3.5, 2.5]), 'Stout', config)
+    assert key != tc.type_key(typedata, 'Stout', dict(config, create_KNNmodel={'k': 40}))
+    assert key != tc.type_key(typedata, 'Sour', config)
+
+def test_save_load_type(tmp_path):
+    """Tests that the save_type and load_type functions give back the outputs and the models train_model saves for a type"""
+    _, outputs = make_type()
+    artifacts = tm.type_artifacts('Stout')
+    simpath = tmp_path / 'run1'
+    for relpath in artifacts:
+        (simpath / relpath).parent.mkdir(parents=True, exist_ok=True)
+    (simpath / artifacts[0]).mkdir()
+    (simpath / artifacts[0] / 'model.json').write_text('similarity')
+    (simpath / artifacts[1]).write_text('items')
+    (simpath / artifacts[2]).mkdir()
+    (simpath / artifacts[2] / 'model.json').write_text('knn')
+    cache_dir = str(tmp_path / 'cache')
+    assert tc.load_type(cache_dir, 'key', None) is None
+    tc.save_type(cache_dir, 'key', outputs, artifacts, str(simpath))
+    for relpath in artifacts:
+        assert tc.saved_path(cache_dir, 'key', relpath) is not None
+    (tmp_path / 'run2' / 'Sour').mkdir(parents=True) #models another type already saved to the run
+    (tmp_path / 'run2' / 'Sour' / 'model.json').write_text('sour')
+    topdf, combrows, preds = tc.load_type(cache_dir, 'key', str(tmp_path / 'run2'))
+    assert topdf.equals(outputs[0]) and combrows.equals(outputs[1]) and preds[0].equals(outputs[2][0])
+    assert (tmp_path / 'run2' / artifacts[0] / 'model.json').read_text() == 'similarity'
+    assert (tmp_path / 'run2' / artifacts[1]).read_text() == 'items'
+    assert (tmp_path / 'run2' / artifacts[2] / 'model.json').read_text() == 'knn'
+    assert (tmp_path / 'run2' / 'Sour' / 'model.json').read_text() == 'sour'
+
+def test_load_type_without_models(tmp_path):
+    """Tests that a type cached without models is not loaded for a run that saves models"""
+    _, outputs = make_type()
+    tc.save_type(str(tmp_path), 'key', outputs)
+    assert tc.load_type(str(tmp_path), 'key') is not None
+    assert tc.load_type(str(tmp_path), 'key', str(tmp_path / 'run')) is None
+
+def test_prune_cache(tmp_path):
+    """Tests that the prune_cache function keeps the most recently used entries"""
+    _, outputs = make_type()
+    cache_dir = str(tmp_path)
+    for n, key in enumerate(['old', 'used', 'new']):
+        tc.save_type(cache_dir, key, outputs)
+        os.utime(os.path.join(cache_dir, key), (n, n))
+    tc.load_type(cache_dir, 'used')
+    assert tc.prune_cache(cache_dir, keep=2) == ['old']
+    assert sorted(os.listdir(cache_dir)) == ['new', 'used']
+    assert tc.prune_cache(str(tmp_path / 'missing')) == []
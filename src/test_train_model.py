@@ -3,6 +3,7 @@ from collections import defaultdict
 import src.train_model as tm
 import surprise
 import pandas as pd
+import numpy as np
 
 def test_filter_data():
     """Tests the filter_data function"""
@@ -108,6 +109,39 @@ def test_top_n_popular_bad():
     except KeyError:
         assert True
 
+def test_partition_data():
+    """Tests that the partition_data function gives the same data frames as filter_data"""
+    inputs = {
+        'Type': ['Stout', 'Sour', 'Stout', 'IPA', 'Sour'],
+        'Beer_ID': [1, 2, 3, 4, 5],
+        'Mean_Review': [4.0, 3.5, 2.0, 5.0, 1.0]}
+    the_input = pd.DataFrame(inputs)
+    parts = tm.partition_data(the_input, 'Type')
+    assert sorted(parts) == ['IPA', 'Sour', 'Stout']
+    for value, part in parts.items():
+        assert part.equals(tm.filter_data(the_input, value, 'Type'))
+
+def test_partition_data_bad():
+    """Tests the partition_data function for a bad path"""
+    the_input = pd.DataFrame({'Type': ['Stout', 'Sour'], 'Beer_ID': [1, 2]})
+    try:
+        tm.partition_data(the_input, 'TypeOOPS')
+        assert False
+    except KeyError:
+        assert True
+
+def test_types_fromdata():
+    """Tests that the types_fromdata function gives the same outputs as top_fromdata for each type"""
+    data, config = make_training()
+    data = data.sample(frac=1, random_state=0) #types interleaved
+    typeparts = tm.types_fromdata(data, ['Stout', 'Sour'], config)
+    for i in ['Stout', 'Sour']:
+        typedata, itemlist, topdf, toplist = tm.top_fromdata(data, i, config)
+        assert typeparts[i][0].equals(typedata)
+        assert typeparts[i][1] == itemlist
+        assert typeparts[i][2].equals(topdf)
+        assert typeparts[i][3] == toplist
+
 def test_create_combinations():
     """Tests the create_combinations function"""
     inputs = {
@@ -140,6 +174,29 @@ def test_create_combinations_bad():
     except ValueError:
         assert True
 
+def test_combination_positions():
+    """Tests the combination_positions function"""
+    positions = tm.combination_positions(4, 3)
+    assert positions.tolist() == [[0, 1, 2], [0, 1, 3], [0, 2, 3], [1, 2, 3]]
+    assert tm.combination_positions(10, 2).shape == (45, 2)
+    try:
+        tm.combination_positions(4, 'OOPS')
+        assert False
+    except ValueError:
+        assert True
+
+def test_combinations_triples():
+    """Tests the create_combinations and user_rows_combination_df functions for combinations of three rows"""
+    the_input = pd.DataFrame({'Beer_ID': ['BeerA', 'BeerB', 'BeerC', 'BeerD']})
+    combdf = tm.create_combinations(the_input, 'Test', 3)
+    assert list(combdf['ID']) == ['Test1'] * 3 + ['Test2'] * 3 + ['Test3'] * 3 + ['Test4'] * 3
+    assert list(combdf['Beer_ID'][3:6]) == ['BeerA', 'BeerB', 'BeerD']
+    user_rows, user_idlist = tm.user_rows_combination_df(combdf, ['BeerA', 'BeerB', 'BeerC', 'BeerD', 'BeerE'], 'Review', n=3)
+    assert user_idlist == ['Test1', 'Test2', 'Test3', 'Test4']
+    assert list(user_rows['Review'][5:10]) == [5, 5, 0, 5, 0]
+    sparse_rows, _ = tm.user_rows_combination_df(combdf, ['BeerA', 'BeerB', 'BeerC', 'BeerD', 'BeerE'], 'Review', n=3, dense=False)
+    assert sparse_rows.equals(user_rows[user_rows['Review'] == 5].reset_index(drop=True))
+
 def test_create_user_rows():
     """Tests the create_user_rows function"""
     user_choices = ['BeerA', 'BeerB']
@@ -155,6 +212,19 @@ def test_create_user_rows():
     assert isinstance(tm.create_user_rows(user_choices, user_id, idlist, reviewcolname, idcolname, usercolname), pd.DataFrame)
     assert output.equals(tm.create_user_rows(user_choices, user_id, idlist, reviewcolname, idcolname, usercolname))
 
+def test_create_user_rows_sparse():
+    """Tests the create_user_rows function when only chosen items are stored"""
+    idlist = ['BeerA', 'BeerB', 'BeerC', 'BeerD', 'BeerE', 'BeerF']
+    answers = {'Reviewer': ['Test1', 'Test1'], 'Beer_ID': ['BeerB', 'BeerD'], 'Mean_Review': [5, 5]}
+    output = pd.DataFrame(answers)
+    assert output.equals(tm.create_user_rows(['BeerD', 'BeerB'], 'Test1', idlist, dense=False))
+
+def test_build_candidates():
+    """Tests the build_candidates function"""
+    idlist = ['BeerA', 'BeerB', 'BeerC', 'BeerD']
+    assert tm.build_candidates('Test1', idlist, ['BeerA', 'BeerC']) == [('Test1', 'BeerB', 0), ('Test1', 'BeerD', 0)]
+    assert len(tm.build_candidates('Test1', idlist)) == 4
+
 def test_create_user_rows_bad():
     """Tests the create_user_rows function for a bad path"""
     user_choices = ['BeerG', 'BeerH']
@@ -241,6 +311,16 @@ def test_create_KNNmodel():
     random_state = 12345
     assert isinstance(tm.create_KNNmodel(trainset, k, min_k, user_based, random_state), surprise.prediction_algorithms.knns.KNNBasic)
 
+def test_create_incremental_model_bad():
+    """Tests that the create_incremental_model function refuses an item based configuration"""
+    df = pd.DataFrame({'Reviewer': ['ReviewerA', 'ReviewerB'], 'Beer_ID': ['BeerA', 'BeerA'], 'Mean_Review': [3.0, 4.0]})
+    assert tm.create_incremental_model(df, user_based=True) is not None
+    try:
+        tm.create_incremental_model(df, user_based=False)
+        assert False
+    except ValueError:
+        assert True
+
 def test_get_top_n():
     """Tests the get_top_n function"""
     inputs = {'Beer_ID': ['BeerA', 'BeerA', 'BeerA', 'BeerB', 'BeerA', 'BeerB'],
@@ -272,6 +352,18 @@ def test_get_top_n():
     assert answers == (tm.get_top_n(predictions, toplist, n))
     assert isinstance(tm.get_top_n(predictions, toplist, n), collections.defaultdict)
 
+def test_get_top_n_ties():
+    """Tests that the get_top_n and top_n_items functions keep ties in order, like a stable sort"""
+    items = ['BeerA', 'BeerB', 'BeerC', 'BeerD', 'BeerE', 'BeerF', 'BeerG']
+    estimates = [3.0, 4.0, 3.0, 5.0, 4.0, 3.0, 1.0]
+    predictions = [('User1', iid, 0, est, {}) for iid, est in zip(items, estimates)]
+    expected = sorted(zip(items, estimates), key=lambda x: x[1], reverse=True)
+    for n in [0, 1, 3, 4, 10]:
+        assert tm.get_top_n(predictions, None, n)['User1'] == expected[:n]
+        assert tm.top_n_items(items, np.array(estimates), None, n) == expected[:n]
+    assert tm.get_top_n(predictions, ['BeerD', 'BeerB'], 3)['User1'] == [('BeerE', 4.0), ('BeerA', 3.0), ('BeerC', 3.0)]
+    assert tm.top_n_items(items, estimates, ['BeerD', 'BeerB'], 3) == [('BeerE', 4.0), ('BeerA', 3.0), ('BeerC', 3.0)]
+
 def test_predictions():
     """Tests the predictions function"""
     inputs = {'Beer_ID': ['BeerA', 'BeerA', 'BeerA', 'BeerB', 'BeerA', 'BeerB'],
@@ -302,7 +394,94 @@ def test_predictions():
     output = pd.DataFrame(answers)
     assert output.equals(tm.predictions(the_input, model, user_id, testset, toplist, colnames, idcolname, n))
     assert isinstance(tm.predictions(the_input, model, user_id, testset, toplist, colnames, idcolname, n), pd.DataFrame)
+    itemtable = tm.item_table(the_input, colnames, idcolname)
+    assert output.equals(tm.predictions(the_input, model, user_id, testset, toplist, colnames, idcolname, n, itemtable))
+
+def test_item_table():
+    """Tests the item_table function"""
+    inputs = {'Beer_ID': [1, 2, 1, 3],
+        'Beer_Name': ['BeerA', 'BeerB', 'BeerA', 'BeerC'],
+        'Reviewer': ['ReviewerA', 'ReviewerA', 'ReviewerB', 'ReviewerB']}
+    the_input = pd.DataFrame(inputs)
+    itemtable = tm.item_table(the_input, ['Beer_ID', 'Beer_Name'])
+    assert list(itemtable.index) == [1, 2, 3]
+    assert list(itemtable.loc[[3, 1], 'Beer_Name']) == ['BeerC', 'BeerA']
+
+def test_item_table_bad():
+    """Tests the item_table function for a bad path"""
+    the_input = pd.DataFrame({'Beer_ID': [1, 2], 'Beer_Name': ['BeerA', 'BeerB']})
+    try:
+        tm.item_table(the_input, ['Beer_ID', 'Beer_Name'], 'Beer_IDOOPS')
+        assert False
+    except KeyError:
+        assert True
     
 
 
 
+
+def make_training():
+    """Creates reviews of two types and a training configuration"""
+    rows = []
+    for t, base in [('Stout', 100), ('Sour', 200)]:
+        for r in range(8):
+            for b in range(6):
+                if (r + b) % 3 != 0:
+                    rows.append((base + b, 'Beer' + str(base + b), 5.0, t, 'Style', 'Brewery', 'Reviewer' + str(r), 1 + (r * b) % 5))
+    data = pd.DataFrame(rows, columns=['Beer_ID', 'Beer_Name', 'ABV', 'Type', 'Style', 'Brewery', 'Reviewer', 'Mean_Review'])
+    colnames = ['Beer_ID', 'Beer_Name', 'ABV', 'Type', 'Style', 'Brewery']
+    config = {'idcolname': 'Beer_ID', 'engine': 'incremental', 'filter_data': {'col': 'Type'}, 'get_unique_items': {'col': 'Beer_ID'},
+              'top_n_popular': {'colnames': colnames, 'n': 3}, 'create_combinations': {'n': 2}, 'user_rows_combination_df': {},
+              'filter_data_user': {'col': 'Reviewer'}, 'build_trainset': {'colnames': ['Reviewer', 'Beer_ID', 'Mean_Review']},
+              'build_testset': {}, 'create_KNNmodel': {'k': 50, 'min_k': 1}, 'predictions': {'colnames': colnames, 'n': 2}}
+    return data, config
+
+def test_outputs_fromtypes():
+    """Tests that the outputs_fromtypes function gives the same outputs in a process pool as in one process"""
+    data, config = make_training()
+    typeparts = tm.types_fromdata(data, ['Stout', 'Sour'], config)
+    typeoutput, predoutput = tm.outputs_fromtypes(typeparts, ['Stout', 'Sour'], config)
+    assert [user_idlist for _, _, user_idlist in typeoutput] == [['Stout1', 'Stout2', 'Stout3'], ['Sour1', 'Sour2', 'Sour3']]
+    assert [preds['ID'][0] for preds in predoutput] == ['Stout1', 'Stout2', 'Stout3', 'Sour1', 'Sour2', 'Sour3']
+    pooltypeoutput, poolpredoutput = tm.outputs_fromtypes(typeparts, ['Stout', 'Sour'], config, workers=2)
+    for (topdf, combrows, _), (pooltopdf, poolcombrows, _) in zip(typeoutput, pooltypeoutput):
+        assert topdf.equals(pooltopdf)
+        assert combrows.equals(poolcombrows)
+    for preds, poolpreds in zip(predoutput, poolpredoutput):
+        assert preds.equals(poolpreds)
+
+def test_outputs_fromtypes_saves_once(tmp_path, monkeypatch):
+    """Tests that the outputs_fromtypes function saves each type's models once in a process pool, whichever processes
+    predict its pseudo-users"""
+    data, config = make_training()
+    config = dict(config, build_similarity_model={})
+    simpath, log = tmp_path / 'run', tmp_path / 'saved.txt'
+    simpath.mkdir()
+    def save_model(model, directory): #records each save, from whichever process makes it
+        with open(str(log), 'a') as f:
+            f.write(directory + '\n')
+    monkeypatch.setattr(tm.knn, 'save_model', save_model)
+    tm.outputs_fromtypes(tm.types_fromdata(data, ['Stout', 'Sour'], config), ['Stout', 'Sour'], config, str(simpath), workers=2)
+    assert sorted(log.read_text().split()) == sorted(str(simpath / 'knn' / i) for i in ['Stout', 'Sour'])
+    assert sorted(p.name for p in simpath.iterdir()) == ['Sour', 'Stout', 'items']
+
+def test_shared_similarity():
+    """Tests that the shared_similarity function reuses an item model's similarity only if it is the one the serving model needs"""
+    data, config = make_training()
+    config = dict(config, build_similarity_model={'k': 3})
+    model = tm.create_item_model(data, config['build_trainset']['colnames'], k=3)
+    assert tm.shared_similarity(model, config) is model.similarity
+    assert tm.shared_similarity(model, dict(config, build_similarity_model={'k': 3, 'method': 'pearson'})) is None
+    assert tm.shared_similarity(model, dict(config, build_similarity_model={'k': 50})) is None
+    assert tm.shared_similarity(tm.create_incremental_model(data, config['build_trainset']['colnames']), config) is None
+
+def test_outputs_fromtypes_sparse():
+    """Tests that sparse user rows give the same predictions as dense user rows, for every engine"""
+    data, config = make_training()
+    for engine in ['surprise', 'incremental', 'item']:
+        outputs = []
+        for dense in [True, False]:
+            engineconfig = dict(config, engine=engine, create_item_model={'k': 3}, user_rows_combination_df={'dense': dense})
+            outputs.append(tm.outputs_fromtypes(tm.types_fromdata(data, ['Stout', 'Sour'], config), ['Stout', 'Sour'], engineconfig)[1])
+        for densepreds, sparsepreds in zip(*outputs):
+            assert densepreds.equals(sparsepreds)
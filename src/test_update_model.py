@@ -0,0 +1,106 @@
+import src.update_model as um
+import src.train_model as tm
+import src.similarity_model as smod
+import numpy as np
+import pandas as pd
+
+def make_reviews():
+    """Creates cleaned reviews, pending reviews of a beer with too few reviews and new reviews"""
+    data = pd.DataFrame({'Beer_ID': [1, 2, 1, 2], 'Type': 'Stout', 'Reviewer': ['ReviewerA', 'ReviewerA', 'ReviewerB', 'ReviewerB'],
+                         'Mean_Review': [4.0, 3.0, 2.0, 5.0]})
+    pending = pd.DataFrame({'Beer_ID': [3], 'Type': 'Stout', 'Reviewer': ['ReviewerA'], 'Mean_Review': [1.0]})
+    delta = pd.DataFrame({'Beer_ID': [4, 3, 1], 'Type': 'Stout', 'Reviewer': ['ReviewerC', 'ReviewerC', 'ReviewerC'],
+                          'Mean_Review': [2.0, 3.0, 5.0]})
+    return data, pending, delta
+
+def test_refine_delta():
+    """Tests that the refine_delta function admits reviews of known beers and of beers that reach the threshold"""
+    data, pending, delta = make_reviews()
+    admitted, pending = um.refine_delta(data, pending, delta, n=2)
+    assert list(admitted['Beer_ID']) == [3, 3, 1]
+    assert list(admitted['Mean_Review']) == [1.0, 3.0, 5.0]
+    assert list(pending['Beer_ID']) == [4]
+
+def test_refine_delta_bad():
+    """Tests the refine_delta function for a bad path"""
+    data, pending, delta = make_reviews()
+    try:
+        um.refine_delta(data, pending, delta, idcolname='Beer_IDOOPS')
+        assert False
+    except KeyError:
+        assert True
+
+def make_training():
+    """Creates reviews of one type and a training configuration for the item engine"""
+    rows = []
+    for r in range(8):
+        for b in range(6):
+            if (r + b) % 3 != 0:
+                rows.append((100 + b, 'Beer' + str(100 + b), 5.0, 'Stout', 'Style', 'Brewery', 'Reviewer' + str(r), 1 + (r * b) % 5))
+    data = pd.DataFrame(rows, columns=['Beer_ID', 'Beer_Name', 'ABV', 'Type', 'Style', 'Brewery', 'Reviewer', 'Mean_Review'])
+    colnames = ['Beer_ID', 'Beer_Name', 'ABV', 'Type', 'Style', 'Brewery']
+    config = {'idcolname': 'Beer_ID', 'engine': 'item', 'filter_data': {'col': 'Type'}, 'get_unique_items': {'col': 'Beer_ID'},
+              'top_n_popular': {'colnames': colnames, 'n': 3}, 'create_combinations': {'n': 2},
+              'user_rows_combination_df': {'dense': False}, 'filter_data_user': {'col': 'Reviewer'},
+              'build_trainset': {'colnames': ['Reviewer', 'Beer_ID', 'Mean_Review']}, 'build_testset': {},
+              'create_item_model': {'k': 3}, 'predictions': {'colnames': colnames, 'n': 2},
+              'build_similarity_model': {}}
+    return data, config
+
+def test_update_type(tmp_path):
+    """Tests that the update_type function refits a saved model and gives the same outputs as training from scratch"""
+    data, config = make_training()
+    typepart = tm.types_fromdata(data, ['Stout'], config)['Stout']
+    typestate = tm.type_fromdata(typepart, 'Stout', config, str(tmp_path))
+    cached = (typestate['topdf'], typestate['combrows'],
+              [tm.onepred_fromdata(j, typestate['user_rows'], typestate['toplist'], typestate['typedata'], config,
+                                   typestate['basemodel'], typestate['itemlist'], typestate['itemtable']) for j in typestate['user_idlist']])
+    updated = data.append(data.iloc[-1].copy().replace({'Reviewer7': 'ReviewerNew'}), ignore_index=True)
+    newpart = tm.types_fromdata(updated, ['Stout'], config)['Stout']
+    assert newpart[3] == typepart[3] #top beers unchanged
+    topdf, combrows, preds = um.update_type(newpart, typepart[0], 'Stout', config, [updated['Beer_ID'].iloc[-1]], cached,
+                                            str(tmp_path / 'knn' / 'Stout'))
+    expected = um.update_type(newpart, None, 'Stout', config, [updated['Beer_ID'].iloc[-1]])
+    assert topdf.equals(expected[0]) and combrows.equals(expected[1])
+    for pred, expectedpred in zip(preds, expected[2]):
+        assert pred.equals(expectedpred)
+
+def test_update_type_similarity(tmp_path, monkeypatch):
+    """Tests that the update_type function refreshes the saved similarity model for the refit beers only, giving the same
+    similarity as building it from scratch"""
+    data, config = make_training()
+    config = dict(config, build_similarity_model={'k': 2}) #not the item engine's k, so the similarity is not shared
+    typepart = tm.types_fromdata(data, ['Stout'], config)['Stout']
+    typestate = tm.type_fromdata(typepart, 'Stout', config, str(tmp_path / 'old'))
+    cached = (typestate['topdf'], typestate['combrows'], [None] * len(typestate['user_idlist']))
+    updated = data.append(data.iloc[-1].copy().replace({'Reviewer7': 'ReviewerNew'}), ignore_index=True)
+    newpart = tm.types_fromdata(updated, ['Stout'], config)['Stout']
+    def top_k_item_similarity(*args, **kwargs):
+        raise AssertionError('The similarity model must not be built again.')
+    monkeypatch.setattr(smod, 'top_k_item_similarity', top_k_item_similarity)
+    um.update_type(newpart, typepart[0], 'Stout', config, [updated['Beer_ID'].iloc[-1]], cached, str(tmp_path / 'old' / 'knn' / 'Stout'),
+                   str(tmp_path / 'new'), str(tmp_path / 'old' / 'Stout'))
+    monkeypatch.undo()
+    refreshed = smod.load_similarity_model(str(tmp_path / 'new' / 'Stout'))
+    expected = smod.build_similarity_model(newpart[0], newpart[3], k=2)
+    assert np.array_equal(refreshed['similarity'].toarray(), expected['similarity'].toarray())
+    assert np.array_equal(refreshed['exclude'], expected['exclude'])
+
+def test_update_types_after_retrain(tmp_path):
+    """Tests that the update_types function, run right after a retrain on changed data, gives the same outputs as
+    training the updated data from scratch"""
+    data, config = make_training()
+    config = dict(config, types=['Stout'])
+    cache_dir = str(tmp_path / 'cache')
+    tm.train_types(data, config, str(tmp_path / 'run1'), cache_dir=cache_dir)
+    retrained = data.assign(Mean_Review=6 - data['Mean_Review']) #cleaned again with different reviews
+    tm.train_types(retrained, config, str(tmp_path / 'run2'), cache_dir=cache_dir)
+    admitted = retrained.iloc[[-1]].replace({'Reviewer7': 'ReviewerNew'}).reset_index(drop=True)
+    updated = pd.concat([retrained, admitted], ignore_index=True)
+    outputs = um.update_types(retrained, updated, admitted, config, cache_dir, str(tmp_path / 'run3'))
+    expected = tm.train_types(updated, config)
+    topdf, combrows, preds = outputs['Stout']
+    assert topdf.equals(expected['Stout'][0]) and combrows.equals(expected['Stout'][1])
+    assert len(preds) == len(expected['Stout'][2])
+    for pred, expectedpred in zip(preds, expected['Stout'][2]):
+        assert pred.equals(expectedpred)
@@ -0,0 +1,135 @@
+import pandas as pd
+import hashlib
+import logging
+import shutil
+import json
+import os
+
+logger = logging.getLogger(__name__)
+
+CACHE_FORMAT = 1 #version of the layout written by save_type
+
+def type_key(typedata, i, config, code_files=()):
+    """Computes the content hash that addresses a category's training outputs in the cache. It changes with the
+    category's data, any train_model config section other than the list of types, or the training code.
+
+    Arguments:
+        typedata {pd.DataFrame} -- data filtered by category value i
+        i {str} -- category value
+        config {dict} -- train_model configuration dictionary
+        code_files {list} -- paths of the source files training runs (default: {()})
+
+    Returns:
+        key {str} -- hex digest naming the category's cache entry
+    """
+    digest = hashlib.sha256()
+    settings = {name: section for name, section in config.items() if name != 'types'}
+    digest.update(json.dumps([CACHE_FORMAT, i, settings], sort_keys=True, default=str).encode())
+    digest.update(json.dumps([[str(col), str(dtype)] for col, dtype in typedata.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(typedata, index=False).values.tobytes())
+    for path in code_files:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def load_type(cache_dir, key, simpath=None):
+    """Loads a category's training outputs from the cache, copying its saved models into simpath if one is given
+
+    Arguments:
+        cache_dir {str} -- cache directory
+        key {str} -- output of type_key
+        simpath {str} -- directory the run saves models to (default: {None})
+
+    Returns:
+        outputs {tuple} -- (topdf, combrows, preds), as given to save_type, or None if the category is not cached,
+                           or its models are not and simpath is given
+    """
+    entry = os.path.join(cache_dir, key)
+    if not os.path.isdir(entry) or (simpath is not None and not os.path.isdir(os.path.join(entry, 'models'))):
+        return None
+    outputs = pd.read_pickle(os.path.join(entry, 'outputs.pkl'))
+    if simpath is not None:
+        copy_files(os.path.join(entry, 'models'), simpath)
+    os.utime(entry) #used now, see prune_cache
+    return outputs
+
+def copy_files(source, target):
+    """Copies every file under a directory into another, which may already exist and hold other files
+
+    Arguments:
+        source {str} -- directory to copy from
+        target {str} -- directory to copy into, created if missing
+    """
+    for dirpath, _, filenames in os.walk(source):
+        directory = os.path.join(target, os.path.relpath(dirpath, source))
+        os.makedirs(directory, exist_ok=True)
+        for filename in filenames:
+            shutil.copy2(os.path.join(dirpath, filename), os.path.join(directory, filename))
+
+def saved_path(cache_dir, key, relpath):
+    """Path of a file or directory saved with a category's cache entry, see save_type
+
+    Arguments:
+        cache_dir {str} -- cache directory
+        key {str} -- output of type_key
+        relpath {str} -- path of the file or directory relative to the directory models were saved to
+
+    Returns:
+        path {str} -- path in the cache entry, or None if the entry does not have it
+    """
+    path = os.path.join(cache_dir, key, 'models', relpath)
+    return path if os.path.exists(path) else None
+
+def save_type(cache_dir, key, outputs, artifacts=(), simpath=None):
+    """Saves a category's training outputs to the cache. The entry is written to a hidden directory, then renamed, so
+    an entry is either complete or absent.
+
+    Arguments:
+        cache_dir {str} -- cache directory
+        key {str} -- output of type_key
+        outputs {tuple} -- (topdf, combrows, preds) of the category: its top rows, combination rows and list of
+                           predictions for each pseudo-user
+        artifacts {list} -- paths relative to simpath of the files and directories saved for the category (default: {()})
+        simpath {str} -- directory the run saved models to, or None if it saved none (default: {None})
+    """
+    entry = os.path.join(cache_dir, key)
+    staging = os.path.join(cache_dir, '.' + key + '.tmp')
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    pd.to_pickle(outputs, os.path.join(staging, 'outputs.pkl'))
+    if simpath is not None:
+        for relpath in artifacts:
+            source, target = os.path.join(simpath, relpath), os.path.join(staging, 'models', relpath)
+            if os.path.isdir(source):
+                shutil.copytree(source, target)
+            elif os.path.isfile(source):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.copy2(source, target)
+        os.makedirs(os.path.join(staging, 'models'), exist_ok=True)
+    shutil.rmtree(entry, ignore_errors=True) #an entry without models is replaced by one with them
+    os.rename(staging, entry)
+    os.utime(entry)
+    logger.debug('Cached training outputs in %s', entry)
+
+def prune_cache(cache_dir, keep=50):
+    """Removes all but the most recently used entries of the cache, so it does not grow with every change of the data,
+    config or code. Entries are used when save_type writes them or load_type reads them.
+
+    Arguments:
+        cache_dir {str} -- cache directory
+        keep {int} -- number of entries to keep (default: {50})
+
+    Returns:
+        removed {list} -- keys of the removed entries
+    """
+    if not os.path.isdir(cache_dir):
+        return []
+    entries = [name for name in os.listdir(cache_dir)
+               if not name.startswith('.') and os.path.isdir(os.path.join(cache_dir, name))] #not entries being written
+    entries.sort(key=lambda name: os.path.getmtime(os.path.join(cache_dir, name)), reverse=True)
+    removed = entries[keep:]
+    for name in removed:
+        shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+    if removed:
+        logger.info('Removed %d of %d entries from %s', len(removed), len(entries), cache_dir)
+    return removed
@@ -1,10 +1,27 @@
 from surprise import Dataset, Reader, KNNBasic
 from collections import defaultdict
-from itertools import combinations
+from itertools import combinations, chain
+from operator import itemgetter
+try:
+    import similarity_model as sim
+    import model_store as ms
+    import knn_engine as knn
+    import train_cache as tc
+except:
+    import src.similarity_model as sim
+    import src.model_store as ms
+    import src.knn_engine as knn
+    import src.train_cache as tc
+import multiprocessing as mp
+import heapq
+import numpy as np
 import pandas as pd
 import argparse
 import logging
 import yaml
+import os
+
+logger = logging.getLogger(__name__)
 
 def filter_data(df, value, col):
     """Given a data frame, column name, and value, outputs filtered data frame with rows that have that column value.
@@ -50,41 +67,106 @@ def get_unique_items(df, col):
             logger.error('Please re-enter column names.')
     return itemlist
 
-def top_n_popular(df, colnames, idcolname='Beer_ID', reviewcolname='Mean_Review', n=10):
-    """Returns the top n most popular items in a dataset
+def partition_data(df, col):
+    """Given a data frame and column name, outputs one filtered data frame per value of that column, in a single pass.
+    Each keeps its rows in order and is a slice of one sorted copy of df, so the filtered frames share its memory.
 
-    Args:
-        df {pd.DataFrame} -- Full dataframe 
-        colnames {list} -- list of column names needed to in the topdf
+    Arguments:
+    df {pd.DataFrame} -- Pandas DataFrame
+    col {str} -- Name of column to filter on
+
+    Returns:
+    parts {dict} -- dictionary of value: filtered DataFrame, as filter_data outputs for that value
+    """
+    try:
+        groups = df.groupby(col, sort=False).indices #positions of each value's rows, in row order
+    except:
+        raise KeyError('Column name is incorrect.')
+        logger.error('Please re-enter column name.')
+    sorteddf = df.take(np.concatenate(list(groups.values())) if groups else [])
+    parts, start = {}, 0
+    for value, positions in groups.items():
+        part = sorteddf.iloc[start:start + len(positions)] #a view, not a copy
+        part.index = pd.RangeIndex(len(part)) #remove old dataframe indices
+        parts[value] = part
+        start += len(positions)
+    return parts
+
+def mean_reviews(df, col, idcolname='Beer_ID', reviewcolname='Mean_Review'):
+    """Averages the reviews of each item within each category of a dataset, for all categories at once
+
+    Arguments:
+        df {pd.DataFrame} -- Full dataframe
+        col {str} -- column name for category
         idcolname {str} -- column name for item id (default: {'Beer_ID'})
         reviewcolname {str} -- column name for reviews (default: {'Mean_Review'})
-        n {int} -- number of most popular items to return
+
     Returns:
-        topdf {pd.DataFrame} -- DF showing the rows corresponding to the top n items, with review and profile name dropped.
+        means {pd.Series} -- mean review indexed by category and item id, sorted
     """
     try:
-        df_groupedbyID = df.groupby([idcolname]).mean() #df grouped by item id, averaging reviews
+        grouped = df.groupby([col, idcolname])
     except:
-        raise KeyError('Incorrect ID column name')
-        logger.error('Please re-enter ID column name.')
+        raise KeyError('Incorrect category or ID column name')
+        logger.error('Please re-enter category and ID column names.')
     try:
-        df_groupedbyID = df_groupedbyID.sort_values(reviewcolname, ascending=False) #sort df by review, descending
+        means = grouped[reviewcolname].mean()
     except:
         raise KeyError('Incorrect review column name')
         logger.error('Please re-enter review column name.')
-    top = df_groupedbyID.index[0:n].values.tolist() #find index of top n items
-    rank_index = pd.DataFrame(top) #store rank
-    rank_index.columns = ['Beer_ID'] #store rank
+    return means
+
+def top_n_popular(df, colnames, idcolname='Beer_ID', reviewcolname='Mean_Review', n=10, means=None):
+    """Returns the top n most popular items in a dataset
+
+    Args:
+        df {pd.DataFrame} -- Full dataframe 
+        colnames {list} -- list of column names needed to in the topdf
+        idcolname {str} -- column name for item id (default: {'Beer_ID'})
+        reviewcolname {str} -- column name for reviews (default: {'Mean_Review'})
+        n {int} -- number of most popular items to return
+        means {pd.Series} -- mean review of each item in df indexed by sorted item id, e.g. one category of the output of
+                             mean_reviews. Computed from df if not given (default: {None})
+    Returns:
+        topdf {pd.DataFrame} -- DF showing the rows corresponding to the top n items, with review and profile name dropped.
+    """
+    if means is None:
+        try:
+            grouped = df.groupby([idcolname]) #df grouped by item id
+        except:
+            raise KeyError('Incorrect ID column name')
+            logger.error('Please re-enter ID column name.')
+        try:
+            means = grouped[reviewcolname].mean() #averaging reviews
+        except:
+            raise KeyError('Incorrect review column name')
+            logger.error('Please re-enter review column name.')
+    means = means.sort_values(ascending=False) #sort by review, descending
+    top = means.index[0:n].values.tolist() #find index of top n items
     try:
         topdf = get_unique_items(df[df[idcolname].isin(top)], colnames) #df containing the top n items, unordered
     except:
         raise KeyError('Column names are incorrect.')
         logger.error('Please re-enter column names.')
-    rank_index = pd.DataFrame(top)
+    rank_index = pd.DataFrame(top) #store rank
     rank_index.columns = ['Beer_ID']
     finaldf = pd.merge(rank_index, topdf, on='Beer_ID')
     return finaldf
 
+def combination_positions(m, n=2):
+    """Lists every combination of n out of m positions, in the order of itertools.combinations
+
+    Arguments:
+        m {int} -- number of positions
+        n {int} -- number of positions in each combination (default: {2})
+
+    Returns:
+        positions {np.ndarray} -- array with one combination per row and n columns
+    """
+    if not isinstance(n, (int, np.integer)) or n < 1:
+        raise ValueError('N must be a positive integer.')
+    flat = np.fromiter(chain.from_iterable(combinations(range(m), n)), dtype=np.intp)
+    return flat.reshape(-1, n)
 
 def create_combinations(df, typename, n=2):
     """Creates dataframe of all possible row combinations of n rows, given a dataframe. 
@@ -99,22 +181,17 @@ def create_combinations(df, typename, n=2):
         combdf {pd.DataFrame} -- DF of all possible row combinations of n rows with ID column added. Total number of rows will be
                                 nrow(df) choose n.
     """
-    combolist = []
-    index = 1
     try:
-        list(combinations(df.index,n))
+        positions = combination_positions(len(df.index), n) #all possible combinations of n rows, one per array row
     except:
         raise ValueError('N must be an integer.')
         logger.error('Re enter n for combinations.')
-    for i in list(combinations(df.index,n)): #all possible combinations of n rows
-        minidf = df.loc[i,:] #specific combination
-        minidf['ID'] = typename + str(index) #ID column value
-        combolist.append(minidf)
-        index=index+1
-    combodf = pd.concat(combolist, ignore_index=True) #all combinations
+    combodf = df.take(positions.ravel()).reset_index(drop=True) #all combinations
+    ids = np.char.add(typename, np.arange(1, len(positions) + 1).astype(str)) #ID column values
+    combodf['ID'] = np.repeat(ids, n).astype(object)
     return combodf
  
-def create_user_rows(user_choices, user_id, idlist, reviewcolname='Mean_Review', idcolname='Beer_ID', usercolname='Reviewer'):
+def create_user_rows(user_choices, user_id, idlist, reviewcolname='Mean_Review', idcolname='Beer_ID', usercolname='Reviewer', dense=True):
     """Creates new dataframe containing rows for a new user who is interested in items in user_choices
     
     Arguments:
@@ -124,6 +201,8 @@ def create_user_rows(user_choices, user_id, idlist, reviewcolname='Mean_Review',
         reviewcolname {str} -- column name for reviews (default: {'Mean_Review'})
         idcolname {str} -- column name for item ID (default: {'Beer_ID'})
         usercolname {str} -- column name for users (default: {'Reviewer'})
+        dense {bool} -- if True, every other item gets a row with review 0. If False, only the chosen items get rows, and every
+                        other item is implicitly reviewed 0 (default: {True})
     
     Returns:
         user_rows {pd.DataFrame} -- dataframe containing rows for a new user who is interested in items in user_choices
@@ -134,9 +213,11 @@ def create_user_rows(user_choices, user_id, idlist, reviewcolname='Mean_Review',
         raise ValueError('User choices are not in dataset.')
         logger.error('Re-enter user choices.')
     user_rows.loc[choiceitems, reviewcolname] = 5 #sets user choice review to 5 for user
+    if not dense:
+        user_rows = user_rows[choiceitems].reset_index(drop=True) #only chosen items are stored
     return user_rows
 
-def user_rows_combination_df(combdf, idlist, reviewcolname='Mean_Review', idcolname='Beer_ID', usercolname='Reviewer', n=2):
+def user_rows_combination_df(combdf, idlist, reviewcolname='Mean_Review', idcolname='Beer_ID', usercolname='Reviewer', n=2, dense=True):
     """
     Arguments:
         combdf {pd.DataFrame} -- DF of all possible row combinations of n rows with ID column added (output of create_combinations)
@@ -144,22 +225,29 @@ def user_rows_combination_df(combdf, idlist, reviewcolname='Mean_Review', idcoln
         reviewcolname {str} -- column name for reviews (default: {'Mean_Review'})
         idcolname {str} -- column name for item ID (default: {'Beer_ID'})
         usercolname {str} -- column name for users (default: {'Reviewer'})
+        n {int} -- number of rows in each combination; rows are grouped into users by their ID, so any n works (default: {2})
+        dense {bool} -- if False, users only get rows for their chosen items, see create_user_rows (default: {True})
     
     Returns:
         final_user_rows {pd.DataFrame} -- dataframe containing rows for users in combdf 
         user_idlist -- list of users
     """
-    thelist = []
-    index = 1
-    for i in list(range(0, len(combdf.index), n)): #iterating through combinations
-        j=i+1
-        pair = combdf.loc[i:j,] #specific pair
-        user_id = pair['ID'][i]
-        user_rows = create_user_rows(pair[idcolname], user_id, idlist, reviewcolname, idcolname, usercolname)
-        thelist.append(user_rows) #created user rows
-        index=index+1
-    final_user_rows = pd.concat(thelist, ignore_index=True)
-    user_idlist = get_unique_items(final_user_rows, usercolname)
+    user_codes, user_idlist = pd.factorize(combdf['ID']) #users in order, one per combination
+    positions = pd.Index(idlist).get_indexer(combdf[idcolname]) #position of each chosen item in idlist
+    found = positions >= 0
+    chosen = np.zeros((len(user_idlist), len(idlist)), dtype=bool)
+    chosen[user_codes[found], positions[found]] = True #users by items, True where the user chose the item
+    if not chosen.any(axis=1).all():
+        raise ValueError('User choices are not in dataset.')
+        logger.error('Re-enter user choices.')
+    if dense: #a row for every item
+        users, items = np.divmod(np.arange(chosen.size), len(idlist))
+    else: #rows for chosen items only
+        users, items = np.nonzero(chosen)
+    final_user_rows = pd.DataFrame({usercolname: np.asarray(user_idlist, dtype=object)[users],
+                                    idcolname: np.asarray(idlist)[items],
+                                    reviewcolname: np.where(chosen[users, items], 5, 0)})
+    user_idlist = list(user_idlist)
     return final_user_rows, user_idlist
 
 def build_trainset(df, user_rows=None, colnames=None):
@@ -202,6 +290,21 @@ def build_testset(df, reviewcolname='Mean_Review', idcolname='Beer_ID', usercoln
     #testset formatted in proper surprise format
     return testset
 
+def build_candidates(user_id, idlist, toplist=None):
+    """Builds the test set of items to score for a user whose rows only hold their chosen items: every item that has not
+    already been shown to them, with review 0
+
+    Arguments:
+        user_id {str} -- User name provided by user
+        idlist {list} -- List of unique items in dataset
+        toplist {list} -- IDs of top items that have been already shown to user (default: {None})
+
+    Returns:
+        testset {list} -- list in test format that Surprise requires
+    """
+    shown = set(toplist) if toplist is not None else set()
+    return [(user_id, iid, 0) for iid in idlist if iid not in shown]
+
 def create_KNNmodel(trainset, k=50, min_k=5, user_based=True, random_state=12345):
     """Train the KNN model given a training set and model parameters
     
@@ -221,8 +324,57 @@ def create_KNNmodel(trainset, k=50, min_k=5, user_based=True, random_state=12345
 
     return model
 
+def create_incremental_model(df, colnames=None, k=50, min_k=5, user_based=True, random_state=12345):
+    """Fit the incremental KNN engine once on a dataset, so that users can then be folded in without refitting.
+    Folded in users get the same predictions as from create_KNNmodel trained on the dataset plus their rows.
+
+    Arguments:
+        df {pd.DataFrame} -- dataframe
+        colnames {list} -- list of column names for userID, itemID, review, in that order. (default: {None})
+        k {int} -- number of neighbors, parameter for algorithm (default: {50})
+        min_k {int} -- minimum neighbors, parameter for algorithm (default: {5})
+        user_based {bool} -- must be True, the engine only compares users (default: {True})
+        random_state {int} -- not used; KNNBasic is deterministic (default: {12345})
+
+    Raises:
+        ValueError: "The incremental engine is user based only" if user_based is False
+
+    Returns:
+        model {knn_engine.IncrementalKNN} -- fitted model object
+    """
+    if not user_based:
+        raise ValueError('The incremental engine is user based only, use the item engine for item-based similarity.')
+        logger.error('Please set create_KNNmodel user_based to True.')
+    if colnames is not None:
+        try:
+            df = df[colnames]
+        except:
+            raise KeyError('Column names are incorrect.')
+    return knn.IncrementalKNN(k=k, min_k=min_k).fit(df)
+
+def create_item_model(df, colnames=None, k=50, method='cosine', block_size=1000):
+    """Fit the item-item KNN engine once on a dataset: a sparse similarity matrix of each item's k nearest neighbors
+
+    Arguments:
+        df {pd.DataFrame} -- dataframe
+        colnames {list} -- list of column names for userID, itemID, review, in that order. (default: {None})
+        k {int} -- number of neighbors kept per item (default: {50})
+        method {str} -- similarity, 'cosine' or 'pearson' (default: {'cosine'})
+        block_size {int} -- number of items whose similarities are computed at once (default: {1000})
+
+    Returns:
+        model {knn_engine.ItemKNN} -- fitted model object
+    """
+    if colnames is not None:
+        try:
+            df = df[colnames]
+        except:
+            raise KeyError('Column names are incorrect.')
+    return knn.ItemKNN(k=k, method=method, block_size=block_size).fit(df)
+
 def get_top_n(predictions, toplist=None, n=10):
     """Return the top-N recommendation for each user from a set of predictions.
+    Predictions are streamed through a heap of n per user; ties keep the order of the predictions.
 
     Arguments:
         predictions {list of Prediction objects} -- The list of predictions, as returned by the test method of an algorithm.
@@ -233,45 +385,90 @@ def get_top_n(predictions, toplist=None, n=10):
         top_n {collections.defaultdict} -- A dict where keys are user (raw) ids and values are lists of tuples:
         [(raw item id, rating estimation), ...] of size n.
     """
-    # First map the predictions to each user.
+    exclude = set(toplist) if toplist is not None else set()
+    heaps = defaultdict(list) #per user, the n best so far with the worst on top
+    skipped = 0
+    for position, (uid, iid, true_r, est, _) in enumerate(predictions):
+        if iid in exclude:
+            skipped += 1
+            continue
+        heap = heaps[uid]
+        entry = (est, -position, iid) #earlier predictions win ties
+        if len(heap) < n:
+            heapq.heappush(heap, entry)
+        elif n > 0 and entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+    if skipped:
+        logger.debug('Skipped %d items due to presence in toplist.', skipped)
     top_n = defaultdict(list)
-    if toplist is not None:
-        for uid, iid, true_r, est, _ in predictions:
-            if iid in toplist:
-                logger.info('Skipped item due to presence in toplist.')
-            else:
-                top_n[uid].append((iid, est))
-    else:
-        for uid, iid, true_r, est, _ in predictions:
-            top_n[uid].append((iid, est))
-    # Then sort the predictions for each user and retrieve the k highest ones.
-    for uid, user_ratings in top_n.items():
-        user_ratings.sort(key=lambda x: x[1], reverse=True)
-        top_n[uid] = user_ratings[:n]
+    for uid, heap in heaps.items():
+        top_n[uid] = [(iid, est) for est, _, iid in sorted(heap, reverse=True)]
     return top_n
 
+def top_n_items(items, estimates, toplist=None, n=10):
+    """Return the top-N recommendation for one user from an array of estimates, as get_top_n does for that user
+
+    Arguments:
+        items {list} -- raw item ids
+        estimates {np.ndarray} -- rating estimation of each item, output of the estimate_items method of a knn_engine model
+        toplist {list} -- IDs of top items that have been already shown to user (default: {None})
+        n {int}: The number of recommendations to output. (default: {10})
+
+    Returns:
+        top_list {list} -- list of tuples [(raw item id, rating estimation), ...] of size n
+    """
+    exclude = set(toplist) if toplist is not None else set()
+    return heapq.nlargest(n, ((iid, est) for iid, est in zip(items, estimates) if iid not in exclude), key=itemgetter(1))
+
+def item_table(df, colnames, idcolname='Beer_ID'):
+    """Gets the item columns of a dataset once, indexed by item ID, to join onto the predictions of many users
+
+    Arguments:
+        df {pd.DataFrame} -- Original dataset
+        colnames {list} -- item columns of the original dataset, including idcolname
+        idcolname {str} -- name of item id column (default: {'Beer_ID'})
 
-def predictions(df, model, user_id, testset, toplist, colnames, idcolname='Beer_ID', n=10):
+    Returns:
+        itemtable {pd.DataFrame} -- unique combinations of colnames, indexed by idcolname
+    """
+    itemtable = get_unique_items(df, colnames)
+    try:
+        itemtable = itemtable.set_index(idcolname)
+    except:
+        raise KeyError('ID column name is incorrect.')
+        logger.error('Please re-enter ID column name.')
+    return itemtable
+
+def predictions(df, model, user_id, testset, toplist, colnames, idcolname='Beer_ID', n=10, itemtable=None):
     """Gets the top-n item predictions for a given user and produces those rows of the original dataset
 
     Arguments:
         df {pd.DataFrame} -- Original dataset
-        model {model} -- a trained object from the Surprise package, output of build_KNNmodel
+        model {model} -- a trained object from the Surprise package, output of build_KNNmodel, or a model folded in by
+                         knn_engine, whose estimate_items method is used instead of test
         user_id {str} -- User name provided by user
         testset {list} -- list in test format that Surprise requires, output of build_testset
         toplist {list} -- IDs of top items that have been already shown to user (default: {None})
         colnames -- columns of original dataset you wish to return (default: {None})
         idcolname -- name of item id column (default: {Beer_ID})
         n {int}: The number of recommendations to output for each user. (default: {10})
+        itemtable {pd.DataFrame} -- output of item_table for df and colnames, built once for many users.
+                                    Built from df if not given (default: {None})
 
     Returns:
         user_recommend {pd.DataFrame} - colname columns of the original data for the top-n item predictions for a given user
     """
-    predictions = model.test(testset) #test model on test set
-    top_n = get_top_n(predictions, toplist, n) #get top n recommendations
-    top_list = top_n[user_id] #targeting one user
+    testset = [row for row in testset if row[0] == user_id] #targeting one user
+    if hasattr(model, 'estimate_items'): #knn_engine models score all of the user's items at once
+        items = [iid for (_, iid, _) in testset]
+        top_list = top_n_items(items, model.estimate_items(items), toplist, n) #get top n recommendations
+    else:
+        predictions = model.test(testset) #test model on test set
+        top_list = get_top_n(predictions, toplist, n)[user_id] #get top n recommendations
     user_score = pd.DataFrame(top_list).rename(columns={0: idcolname, 1: 'score'}) #formatting score
-    user_recommend = pd.merge(user_score, get_unique_items(df, colnames), on=idcolname, how='left')
+    if itemtable is None:
+        itemtable = item_table(df, colnames, idcolname)
+    user_recommend = user_score.join(itemtable, on=idcolname).reset_index(drop=True)
     return user_recommend #final df
 
 def top_fromdata(data, i, config):
@@ -295,7 +492,58 @@ def top_fromdata(data, i, config):
 
     return typedata, itemlist, topdf, toplist
 
-def onepred_fromdata(j, user_rows, toplist, typedata, config):
+def types_fromdata(data, types, config, means=None):
+    """Gets the outputs of top_fromdata for several categories from one partition of the data, with the mean reviews
+    of every category's items computed in one pass
+
+    Arguments:
+        data {pd.DataFrame} -- Pandas DataFrame
+        types {list} -- category values to filter the data on
+        config {dict} -- configuration dictionary
+        means {pd.Series} -- output of mean_reviews for data, computed if not given (default: {None})
+
+    Returns:
+        typeparts {dict} -- dictionary of category: (typedata, itemlist, topdf, toplist), see top_fromdata
+    """
+    parts = partition_data(data, **config['filter_data']) #filter by every type at once
+    topconfig = config['top_n_popular']
+    if means is None:
+        means = mean_reviews(data, config['filter_data']['col'], topconfig.get('idcolname', 'Beer_ID'),
+                             topconfig.get('reviewcolname', 'Mean_Review'))
+    typeparts = {}
+    for i in types:
+        if i not in parts: #no rows of this type
+            typeparts[i] = top_fromdata(data, i, config)
+            continue
+        typedata = parts[i]
+        itemlist = get_unique_items(typedata, **config['get_unique_items']) #get unique items
+        topdf = top_n_popular(typedata, means=means.loc[i], **topconfig) #find top n popular items
+        toplist = get_unique_items(topdf, config['idcolname']) #get itemlist from top n popular
+        typeparts[i] = (typedata, itemlist, topdf, toplist)
+    logger.info('Partitioned %d rows into %d types.', len(data), len(parts))
+    return typeparts
+
+def base_fromdata(typedata, config):
+    """Fits the model that all pseudo-users of a category are folded into, if the configured engine has one
+
+    Arguments:
+        typedata {pd.DataFrame} -- data filtered by category value i (category column specified by config)
+        config {dict} -- configuration dictionary
+
+    Returns:
+        basemodel -- knn_engine.IncrementalKNN for the 'incremental' engine, knn_engine.ItemKNN for the 'item' engine,
+                     None for the 'surprise' engine, which fits a model per pseudo-user
+    """
+    engine = config.get('engine', 'surprise')
+    if engine == 'surprise':
+        return None
+    if engine == 'incremental':
+        return create_incremental_model(typedata, config['build_trainset']['colnames'], **config['create_KNNmodel'])
+    if engine == 'item':
+        return create_item_model(typedata, config['build_trainset']['colnames'], **config['create_item_model'])
+    raise ValueError('Engine must be surprise, incremental or item.')
+
+def onepred_fromdata(j, user_rows, toplist, typedata, config, basemodel=None, itemlist=None, itemtable=None):
     """Produces predictions for a single user
     
     Arguments:
@@ -304,21 +552,190 @@ def onepred_fromdata(j, user_rows, toplist, typedata, config):
         toplist {list} -- list of unique values of a column, specified by config, in topdf
         typedata {pd.DataFrame} -- data filtered by category value i (category column specified by config)
         config {dict} -- configuration dictionary
+        basemodel -- model fit on typedata to fold the user into, output of base_fromdata.
+                     If None, a KNNBasic model is fit on typedata plus the user's rows (default: {None})
+        itemlist {list} -- list of unique items in typedata, given when user_rows only hold chosen items, which are
+                           then scored against every other item as if it was reviewed 0 (default: {None})
+        itemtable {pd.DataFrame} -- item columns of typedata, output of item_table (default: {None})
     
     Returns:
         preds {pd.DataFrame} -- colname columns of the original data for the top-n item predictions for a given user
     """
     userdata = filter_data(user_rows, j, **config['filter_data_user']) #filter by user
-    trainset = build_trainset(typedata, userdata, **config['build_trainset']) #build trainset
-    logger.info('Trainset built.')
-    testset = build_testset(userdata, **config['build_testset']) #build testset
-    logger.info('Testset built')
-    model = create_KNNmodel(trainset, **config['create_KNNmodel']) #make model
-    logger.info('Model built.')
-    preds = predictions(typedata, model, j, testset, toplist, **config['predictions']) #predict for single user
+    if itemlist is not None:
+        testset = build_candidates(j, itemlist, toplist) #items not already shown, generated for this user only
+    else:
+        testset = build_testset(userdata, **config['build_testset']) #build testset
+    if basemodel is not None:
+        userdata = userdata[config['build_trainset']['colnames']]
+        if itemlist is not None:
+            model = basemodel.fold_in(userdata, implicit_rating=0) #unrated items count as reviewed 0
+        else:
+            model = basemodel.fold_in(userdata) #fold user into model fit once per category
+    else:
+        if itemlist is not None: #KNNBasic needs a row for every item the user reviews
+            rowconfig = dict(config['user_rows_combination_df'], dense=True)
+            userdata = create_user_rows(userdata[rowconfig.get('idcolname', 'Beer_ID')], j, itemlist, **rowconfig)
+        trainset = build_trainset(typedata, userdata, **config['build_trainset']) #build trainset
+        logger.info('Trainset built.')
+        model = create_KNNmodel(trainset, **config['create_KNNmodel']) #make model
+        logger.info('Model built.')
+    preds = predictions(typedata, model, j, testset, toplist, itemtable=itemtable, **config['predictions']) #predict for single user
     preds['ID'] = j #add unique user id
     return preds
 
+def shared_similarity(basemodel, config):
+    """Finds the similarity an 'item' engine model was fit with, if the serving similarity model would compute the same one
+
+    Arguments:
+        basemodel -- output of base_fromdata
+        config {dict} -- configuration dictionary
+
+    Returns:
+        similarity {scipy.sparse.csr_matrix} -- the model's top-k similarity, or None if it is not the same
+    """
+    simconfig = config['build_similarity_model']
+    columns = [simconfig.get('usercolname', 'Reviewer'), simconfig.get('idcolname', 'Beer_ID'), simconfig.get('reviewcolname', 'Mean_Review')]
+    if isinstance(basemodel, knn.ItemKNN) and basemodel.k == simconfig.get('k', 50) and basemodel.method == simconfig.get('method', 'cosine') \
+            and list(config['build_trainset']['colnames'][:3]) == columns:
+        return basemodel.similarity
+    return None
+
+def type_fromdata(typepart, i, config, simpath=None, basemodel=None, similarity=None):
+    """Prepares everything the pseudo-users of one category are predicted from
+
+    Arguments:
+        typepart {tuple} -- (typedata, itemlist, topdf, toplist) of the category, output of top_fromdata
+        i {str} -- category value
+        config {dict} -- configuration dictionary
+        simpath {str} -- directory to save the category's item-item similarity model, item table and fitted base model to
+                         (default: {None})
+        basemodel -- model already fit on the category's data, output of base_fromdata, fit if not given (default: {None})
+        similarity {scipy.sparse.csr_matrix} -- similarity of the category's similarity model, already computed for its data,
+                                                see similarity_model.build_similarity_model (default: {None})
+
+    Returns:
+        typestate {dict} -- typedata, topdf, toplist, combrows, user_rows, user_idlist, basemodel, itemtable and, if user rows
+                            are sparse, itemlist of the category
+    """
+    typedata, itemlist, topdf, toplist = typepart
+    itemtable = item_table(typedata, config['predictions']['colnames'], config['predictions'].get('idcolname', 'Beer_ID'))
+    combrows = create_combinations(topdf, i, **config['create_combinations'])
+    user_rows, user_idlist = user_rows_combination_df(combrows, itemlist, **config['user_rows_combination_df'])
+    if basemodel is None:
+        basemodel = base_fromdata(typedata, config)
+    if simpath is not None:
+        simconfig = config['build_similarity_model']
+        if similarity is None:
+            similarity = shared_similarity(basemodel, config)
+        simmodel = sim.build_similarity_model(typedata, toplist, similarity=similarity, **simconfig)
+        sim.save_similarity_model(simmodel, os.path.join(simpath, i))
+        sim.save_item_table(itemtable, os.path.join(simpath, sim.ITEM_TABLE_DIR, i + '.npz'))
+        if basemodel is not None:
+            knn.save_model(basemodel, os.path.join(simpath, knn.MODEL_DIR, i))
+    sparse_rows = not config['user_rows_combination_df'].get('dense', True)
+    return {'typedata': typedata, 'topdf': topdf, 'toplist': toplist, 'combrows': combrows, 'user_rows': user_rows,
+            'user_idlist': user_idlist, 'basemodel': basemodel, 'itemtable': itemtable, 'itemlist': itemlist if sparse_rows else None}
+
+def training_code():
+    """Paths of the source files whose code determines the outputs of training, for train_cache.type_key"""
+    return [os.path.abspath(__file__), os.path.abspath(sim.__file__), os.path.abspath(knn.__file__)]
+
+def type_artifacts(i):
+    """Paths, relative to the directory models are saved to, of everything type_fromdata saves for a category"""
+    return [i, os.path.join(sim.ITEM_TABLE_DIR, i + '.npz'), os.path.join(knn.MODEL_DIR, i)]
+
+_worker = {} #state of a training process, set by init_worker
+
+def init_worker(typeparts, config, simpath=None, typestates=None):
+    """Gives a training process the partitioned data and configuration once, before it runs any type_task or pred_task
+
+    Arguments:
+        typeparts {dict} -- output of types_fromdata
+        config {dict} -- configuration dictionary
+        simpath {str} -- directory type_task saves models to (default: {None})
+        typestates {dict} -- output of type_task for each category, needed by pred_task (default: {None})
+    """
+    _worker.update(typeparts=typeparts, config=config, simpath=simpath, types=typestates if typestates is not None else {})
+
+def type_task(i):
+    """Prepares a category and saves its models, see type_fromdata. Returns everything pred_task needs except the
+    category's data, which every process already has."""
+    typestate = type_fromdata(_worker['typeparts'][i], i, _worker['config'], _worker['simpath'])
+    return {name: value for name, value in typestate.items() if name != 'typedata'}
+
+def pred_task(task):
+    """Produces predictions for a (category, pseudo-user ID) task from the category's prepared state, see onepred_fromdata"""
+    i, j = task
+    typestate = _worker['types'][i]
+    return onepred_fromdata(j, typestate['user_rows'], typestate['toplist'], _worker['typeparts'][i][0], _worker['config'],
+                            typestate['basemodel'], typestate['itemlist'], typestate['itemtable'])
+
+def map_tasks(task, items, initargs, workers=None):
+    """Runs a task over items, in a pool of processes if workers is more than 1, after init_worker(*initargs) in each process.
+    Results keep the order of items, whichever process produced them."""
+    if workers is not None and workers > 1:
+        with mp.Pool(workers, initializer=init_worker, initargs=initargs) as pool:
+            return pool.map(task, items)
+    init_worker(*initargs)
+    return list(map(task, items))
+
+def outputs_fromtypes(typeparts, types, config, simpath=None, workers=None):
+    """Runs the per-category then the per-pseudo-user work of training. Each category is prepared and its models saved once,
+    then its prepared state is handed to the processes that predict its pseudo-users, which never save anything.
+
+    Arguments:
+        typeparts {dict} -- output of types_fromdata
+        types {list} -- categories to train
+        config {dict} -- configuration dictionary
+        simpath {str} -- directory to save item-item similarity models to (default: {None})
+        workers {int} -- number of processes to train in, one if not more than 1 (default: {None})
+
+    Returns:
+        typeoutput {list} -- top rows, combination rows and pseudo-user IDs of each category, in order
+        predoutput {list} -- predictions for each pseudo-user, in order
+    """
+    typestates = dict(zip(types, map_tasks(type_task, types, (typeparts, config, simpath), workers)))
+    tasks = [(i, j) for i in types for j in typestates[i]['user_idlist']]
+    predoutput = map_tasks(pred_task, tasks, (typeparts, config, None, typestates), workers)
+    typeoutput = [(typestates[i]['topdf'], typestates[i]['combrows'], typestates[i]['user_idlist']) for i in types]
+    return typeoutput, predoutput
+
+def train_types(data, config, simpath=None, workers=None, cache_dir=None):
+    """Trains every category of a dataset, reusing the outputs of categories found in the cache
+
+    Arguments:
+        data {pd.DataFrame} -- cleaned data
+        config {dict} -- configuration dictionary
+        simpath {str} -- directory to save models to (default: {None})
+        workers {int} -- number of processes to train in, see outputs_fromtypes (default: {None})
+        cache_dir {str} -- directory to cache each category's outputs in, under a hash of its data, the config and
+                           the training code (default: {None})
+
+    Returns:
+        outputs {dict} -- dictionary of category: (topdf, combrows, preds), preds being the list of predictions for
+                          each pseudo-user
+    """
+    typeparts = types_fromdata(data, config['types'], config)
+    keys, outputs = {}, {}
+    if cache_dir is not None: #types whose data, config and code are unchanged are not retrained
+        code_files = training_code()
+        for i in config['types']:
+            keys[i] = tc.type_key(typeparts[i][0], i, config, code_files)
+            cached = tc.load_type(cache_dir, keys[i], simpath)
+            if cached is not None:
+                outputs[i] = cached
+        logger.info('Reusing %d of %d types from %s', len(outputs), len(config['types']), cache_dir)
+    types = [i for i in config['types'] if i not in outputs]
+    typeparts = {i: typeparts[i] for i in types}
+    typeoutput, predoutput = outputs_fromtypes(typeparts, types, config, simpath, workers)
+    predoutput = iter(predoutput)
+    for i, (topdf, combrows, user_idlist) in zip(types, typeoutput):
+        outputs[i] = (topdf, combrows, [next(predoutput) for _ in user_idlist])
+        if cache_dir is not None:
+            tc.save_type(cache_dir, keys[i], outputs[i], type_artifacts(i), simpath)
+    return outputs
+
 def run_train(args):
     """Runs script to run training
     
@@ -331,6 +748,12 @@ def run_train(args):
         ValueError: "Path to CSV for output preds data must be provided through --output_preds" if args.output_preds not specified
         ValueError: "Path to CSV for output top10 data must be provided through --output_top10rows" if args.output_top10rows not specified
         ValueError: "Path to CSV for output combinations data must be provided through --output_combinations" if args.output_combinations not specified
+
+    If args.output_similarity is specified, an item-item similarity model for each type is also saved there for online scoring,
+    with the type's item table and fitted base model, in a new version subdirectory that is published once every type has been written.
+    If args.workers is more than 1, types and pseudo-users are trained in that many processes, with the same outputs.
+    If args.cache_dir is specified, each type's outputs are cached there under a hash of its data, the config and the training
+    code, and types found in the cache are not retrained. All but the args.cache_keep most recently used entries are then removed.
     """
     if args.config is not None:
         with open(args.config, "r") as f:
@@ -342,18 +765,19 @@ def run_train(args):
         data = pd.read_csv(args.input)
     else:
         raise ValueError("Path to CSV for input data must be provided through --input")
-    predoutput = []
-    top10output = []
-    combinationoutput = []
-    for i in config['types']:
-        typedata, itemlist, topdf, toplist = top_fromdata(data, i, config)
-        top10output.append(topdf)
-        combrows = create_combinations(topdf, i, **config['create_combinations'])
-        combinationoutput.append(combrows)
-        user_rows, user_idlist = user_rows_combination_df(combrows, itemlist, **config['user_rows_combination_df'])
-        for j in user_idlist:
-            preds = onepred_fromdata(j, user_rows, toplist, typedata, config)
-            predoutput.append(preds)
+    simpath = None
+    if args.output_similarity is not None:
+        version = ms.new_version()
+        simpath = ms.staging_path(args.output_similarity, version)
+        os.makedirs(simpath)
+    outputs = train_types(data, config, simpath, getattr(args, 'workers', None), getattr(args, 'cache_dir', None))
+    if getattr(args, 'cache_dir', None) is not None:
+        tc.prune_cache(args.cache_dir, max(getattr(args, 'cache_keep', 50), len(config['types']))) #keep this run's entries
+    top10output = [outputs[i][0] for i in config['types']]
+    combinationoutput = [outputs[i][1] for i in config['types']]
+    predoutput = [preds for i in config['types'] for preds in outputs[i][2]]
+    if args.output_similarity is not None:
+        ms.publish_version(args.output_similarity, version)
     output_preds_df = pd.concat(predoutput, ignore_index=True)
     output_top10_df = pd.concat(top10output, ignore_index=True)
     output_combination_df = pd.concat(combinationoutput, ignore_index=True)
@@ -379,6 +803,10 @@ if __name__ == "__main__":
     parser.add_argument('--output_preds', default='data/preds.csv', help='config.yml')
     parser.add_argument('--output_top10rows', default='data/top10.csv', help='config.yml')
     parser.add_argument('--output_combinations', default='data/combinations.csv', help='config.yml')
+    parser.add_argument('--output_similarity', default=None, help='directory for item-item similarity models')
+    parser.add_argument('--workers', default=None, type=int, help='number of processes to train in')
+    parser.add_argument('--cache_dir', default=None, help='directory to cache the outputs of each type in')
+    parser.add_argument('--cache_keep', default=50, type=int, help='number of most recently used cache entries to keep')
     args = parser.parse_args()
 
     run_train(args)
@@ -0,0 +1,233 @@
+try:
+    import train_model as tm
+    import clean_data as cd
+    import train_cache as tc
+    import model_store as ms
+    import knn_engine as knn
+    import similarity_model as sim
+except:
+    import src.train_model as tm
+    import src.clean_data as cd
+    import src.train_cache as tc
+    import src.model_store as ms
+    import src.knn_engine as knn
+    import src.similarity_model as sim
+import pandas as pd
+import argparse
+import logging
+import yaml
+import os
+
+logger = logging.getLogger(__name__)
+
+def clean_delta(delta, config):
+    """Cleans new reviews the way clean_data.py cleans the full dataset, except for the review count filter,
+    which refine_delta applies together with the reviews already cleaned
+
+    Arguments:
+        delta {pd.DataFrame} -- new reviews, with the columns of the raw data
+        config {dict} -- clean_data configuration dictionary
+
+    Returns:
+        delta {pd.DataFrame} -- cleaned new reviews
+    """
+    delta = cd.create_mean_column(delta, **config['create_mean_column'])
+    delta = cd.omit_values(delta, **config['omit_values'])
+    delta = cd.aggregated_category_column(delta, **config['aggregated_category_column'])
+    return cd.select_rename_features(delta, **config['select_rename_features'])
+
+def refine_delta(data, pending, delta, idcolname='Beer_ID', usercolname='Reviewer', n=15):
+    """Applies the review count filter of clean_data.refine_data to new reviews. Reviews of items already in the
+    cleaned data are admitted. Other items are admitted with all their reviews, old and new, once they have n of them.
+
+    Arguments:
+        data {pd.DataFrame} -- cleaned data, output of clean_data.py
+        pending {pd.DataFrame} -- cleaned reviews of items with fewer than n reviews, output of clean_data.py --output_pending
+        delta {pd.DataFrame} -- cleaned new reviews, output of clean_delta
+        idcolname {str} -- name of item id column (Default: {'Beer_ID'})
+        usercolname {str} -- name of user id column (Default: {'Reviewer'})
+        n {int} -- Review threshold (Default: {15})
+
+    Returns:
+        admitted {pd.DataFrame} -- reviews to append to the cleaned data
+        pending {pd.DataFrame} -- reviews of items that still have fewer than n reviews
+    """
+    try:
+        known = delta[idcolname].isin(data[idcolname])
+    except:
+        raise KeyError('Incorrect ID column name')
+        logger.error('Please re-enter ID column name.')
+    waiting = pd.concat([pending, delta[~known]], ignore_index=True)
+    try:
+        counts = waiting.groupby(idcolname)[usercolname].count() #reviews of each item not in the cleaned data
+    except:
+        raise KeyError('Incorrect User Column Name')
+        logger.error("Please re-enter user column name.")
+    promoted = counts.index[counts >= n] #items that now have enough reviews
+    admitted = pd.concat([pending[pending[idcolname].isin(promoted)], delta[known | delta[idcolname].isin(promoted)]],
+                         ignore_index=True).astype(delta.dtypes.to_dict()) #an empty pending CSV reads as object columns
+    logger.info('Admitted %d reviews, with %d new items', len(admitted), len(promoted))
+    return admitted, waiting[~waiting[idcolname].isin(promoted)].reset_index(drop=True)
+
+def update_type(typepart, previous, i, config, changed, cached=None, modelpath=None, simpath=None, simmodelpath=None):
+    """Produces a category's training outputs after new reviews, reusing what they do not change. With the 'item' engine,
+    if the top items and the set of items are unchanged, the saved model is refit on the neighbors of the reviewed items only,
+    and only pseudo-users who chose an item whose neighbors moved are predicted again. The saved similarity model, if any, is
+    refreshed for the same items. Otherwise, and with the user-based engines, whose pseudo-users are compared with every
+    reviewer, the category is trained from scratch.
+
+    Arguments:
+        typepart {tuple} -- (typedata, itemlist, topdf, toplist) of the category after the new reviews, see train_model.top_fromdata
+        previous {pd.DataFrame} -- data of the category before the new reviews, or None if it had none
+        i {str} -- category value
+        config {dict} -- train_model configuration dictionary
+        changed {list} -- IDs of the category's items that have new reviews
+        cached {tuple} -- (topdf, combrows, preds) of the category before the new reviews, see train_cache.load_type (default: {None})
+        modelpath {str} -- directory the category's model was saved to before the new reviews (default: {None})
+        simpath {str} -- directory to save the category's models to (default: {None})
+        simmodelpath {str} -- directory the category's similarity model was saved to before the new reviews (default: {None})
+
+    Returns:
+        outputs {tuple} -- (topdf, combrows, preds) of the category, the same as training it from scratch
+    """
+    typedata, itemlist, topdf, toplist = typepart
+    idcolname = config['idcolname']
+    basemodel, refit_ids, similarity = None, None, None
+    if config.get('engine', 'surprise') == 'item' and cached is not None and modelpath is not None and previous is not None \
+            and list(cached[0][idcolname]) == list(toplist) and pd.Index(changed).isin(previous[idcolname]).all():
+        basemodel = knn.load_model(modelpath) #memory-mapped; refit builds a new similarity rather than changing it
+        colnames = config['build_trainset']['colnames']
+        refit_ids = basemodel.refit(typedata[colnames], previous[colnames], changed)
+        if simpath is not None and simmodelpath is not None and tm.shared_similarity(basemodel, config) is None:
+            similarity = sim.refresh_similarity(sim.load_similarity_model(simmodelpath), typedata, refit_ids,
+                                                **config['build_similarity_model']) #same items share raters with the changed ones
+    typestate = tm.type_fromdata(typepart, i, config, simpath, basemodel, similarity)
+    user_rows, usercolname = typestate['user_rows'], config['user_rows_combination_df'].get('usercolname', 'Reviewer')
+    stale = set(user_rows.loc[user_rows[idcolname].isin(refit_ids), usercolname]) if refit_ids is not None else None
+    preds = []
+    for position, j in enumerate(typestate['user_idlist']):
+        if stale is not None and j not in stale: #none of the user's chosen items has new neighbors
+            preds.append(cached[2][position])
+        else:
+            preds.append(tm.onepred_fromdata(j, user_rows, toplist, typedata, config, typestate['basemodel'],
+                                             typestate['itemlist'], typestate['itemtable']))
+    logger.info('Predicted %d of %d pseudo-users of %s again', len(preds) if stale is None else len(stale),
+                len(preds), i)
+    return typestate['topdf'], typestate['combrows'], preds
+
+def update_types(data, updated, admitted, config, cache_dir, simpath=None):
+    """Produces every category's training outputs after new reviews. Categories without new reviews are read from the
+    cache, the others are updated with update_type and cached for the next update. The mean reviews are computed again
+    from the updated data, so they always match it, even after the data was cleaned again and retrained.
+
+    Arguments:
+        data {pd.DataFrame} -- cleaned data before the new reviews
+        updated {pd.DataFrame} -- cleaned data with the new reviews appended
+        admitted {pd.DataFrame} -- new reviews appended to the cleaned data, output of refine_delta
+        config {dict} -- train_model configuration dictionary
+        cache_dir {str} -- directory train_model.py cached the outputs of each type in
+        simpath {str} -- directory to save models to (default: {None})
+
+    Returns:
+        outputs {dict} -- dictionary of category: (topdf, combrows, preds), the same as train_model.train_types of the updated data
+    """
+    col, idcolname = config['filter_data']['col'], config['idcolname']
+    typeparts = tm.types_fromdata(updated, config['types'], config)
+    previous = tm.partition_data(data, col)
+    code_files = tm.training_code()
+    outputs = {}
+    for i in config['types']:
+        key = tc.type_key(typeparts[i][0], i, config, code_files)
+        outputs[i] = tc.load_type(cache_dir, key, simpath)
+        if outputs[i] is not None: #no new reviews of this type
+            continue
+        cached, modelpath, simmodelpath = None, None, None
+        if i in previous:
+            oldkey = tc.type_key(previous[i], i, config, code_files)
+            cached = tc.load_type(cache_dir, oldkey)
+            modelpath = tc.saved_path(cache_dir, oldkey, tm.type_artifacts(i)[2])
+            simmodelpath = tc.saved_path(cache_dir, oldkey, tm.type_artifacts(i)[0])
+        outputs[i] = update_type(typeparts[i], previous.get(i), i, config, admitted.loc[admitted[col] == i, idcolname].unique(),
+                                 cached, modelpath, simpath, simmodelpath)
+        tc.save_type(cache_dir, key, outputs[i], tm.type_artifacts(i), simpath)
+    return outputs
+
+def run_update(args):
+    """Runs script to add new reviews to the cleaned data and the training outputs without rebuilding either
+
+    Arguments:
+        args {argparse.Namespace} -- Script arguments
+
+    Raises:
+        ValueError: "Path to yaml config file must be provided through --config" if args.config not specified
+        ValueError: "Path to CSV for input data must be provided through --input" if args.input not specified
+        ValueError: "Path to CSV for new reviews must be provided through --delta" if args.delta not specified
+        ValueError: "Path to CSV for pending reviews must be provided through --pending" if args.pending not specified or missing
+        ValueError: "Path to training cache must be provided through --cache_dir" if args.cache_dir not specified
+
+    The cleaned data and pending reviews are updated in place, new reviews appended to the cleaned data in the order they were
+    admitted, and the outputs are the same as running train_model.py on the updated cleaned data. The updated files are
+    written next to the originals and only replace them once every category has been trained, so a failed run can be rerun. Categories without new reviews
+    are read from the cache, and the updated categories are cached for the next update. All but the args.cache_keep most
+    recently used cache entries are then removed.
+    """
+    if args.config is not None:
+        with open(args.config, "r") as f:
+	        config = yaml.load(f)
+    else:
+        raise ValueError("Path to yaml config file must be provided through --config")
+    if args.input is not None:
+        data = pd.read_csv(args.input)
+    else:
+        raise ValueError("Path to CSV for input data must be provided through --input")
+    if args.delta is not None:
+        delta = pd.read_csv(args.delta)
+    else:
+        raise ValueError("Path to CSV for new reviews must be provided through --delta")
+    if args.pending is not None and os.path.isfile(args.pending):
+        pending = pd.read_csv(args.pending)
+    else:
+        raise ValueError("Path to CSV for pending reviews must be provided through --pending")
+    if args.cache_dir is None:
+        raise ValueError("Path to training cache must be provided through --cache_dir")
+    trainconfig = config['train_model']
+    delta = clean_delta(delta, config['clean_data'])
+    admitted, pending = refine_delta(data, pending, delta, **config['clean_data']['refine_data'])
+    staged = {path: path + '.tmp' for path in [args.input, args.pending]}
+    pd.concat([data, admitted], ignore_index=True).to_csv(staged[args.input], index=False)
+    pending.to_csv(staged[args.pending], index=False)
+    updated = pd.read_csv(staged[args.input]) #the values train_model.py would read
+    simpath = None
+    if args.output_similarity is not None:
+        version = ms.new_version()
+        simpath = ms.staging_path(args.output_similarity, version)
+        os.makedirs(simpath)
+    outputs = update_types(data, updated, admitted, trainconfig, args.cache_dir, simpath)
+    tc.prune_cache(args.cache_dir, max(args.cache_keep, len(trainconfig['types']))) #keep this run's entries
+    for path, stagedpath in staged.items(): #every type is trained, so a rerun would not append the new reviews again
+        os.replace(stagedpath, path)
+    if args.output_similarity is not None:
+        ms.publish_version(args.output_similarity, version)
+    output_preds_df = pd.concat([preds for i in trainconfig['types'] for preds in outputs[i][2]], ignore_index=True)
+    output_top10_df = pd.concat([outputs[i][0] for i in trainconfig['types']], ignore_index=True)
+    output_combination_df = pd.concat([outputs[i][1] for i in trainconfig['types']], ignore_index=True)
+    output_preds_df.to_csv(args.output_preds, index=False)
+    output_top10_df.to_csv(args.output_top10rows, index=False)
+    output_combination_df.to_csv(args.output_combinations, index=False)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG, format='%(name)s - %(levelname)s - %(asctime)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Add new reviews to the cleaned data and training outputs")
+    parser.add_argument('--config', default='config.yml', help='config.yml')
+    parser.add_argument('--input', default='data/cleaned_beer_reviews.csv', help='cleaned data, updated in place')
+    parser.add_argument('--delta', default='data/new_beer_reviews.csv', help='new reviews, with the columns of the raw data')
+    parser.add_argument('--pending', default='data/pending_beer_reviews.csv', help='reviews of beers with too few reviews, updated in place')
+    parser.add_argument('--output_preds', default='data/preds.csv')
+    parser.add_argument('--output_top10rows', default='data/top10.csv')
+    parser.add_argument('--output_combinations', default='data/combinations.csv')
+    parser.add_argument('--output_similarity', default=None, help='directory for item-item similarity models')
+    parser.add_argument('--cache_dir', default='models/train_cache', help='directory train_model.py cached the outputs of each type in')
+    parser.add_argument('--cache_keep', default=50, type=int, help='number of most recently used cache entries to keep')
+    args = parser.parse_args()
+
+    run_update(args)